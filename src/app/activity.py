@@ -0,0 +1,145 @@
+import os
+import logging
+import threading
+import subprocess
+from datetime import datetime, timedelta
+import numpy as np
+from segment_jobs import LOW_PRIORITY, SegmentJobQueue
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_FILENAME = 'activity.bin'
+SECONDS_PER_DAY = 86400
+NO_DATA = 255
+FRAME_WIDTH = 64
+FRAME_HEIGHT = 36
+
+# Serialises creation and updates of the per-day files between workers
+_store_lock = threading.Lock()
+
+def activity_path(storage_path, camera, date):
+    return os.path.join(storage_path, camera, date, ACTIVITY_FILENAME)
+
+def compute_activity(path, analysis_fps=2):
+    """Decode a segment to tiny grey frames and score motion for every second.
+
+    Scores are the mean absolute luma difference between consecutive frames,
+    taking the peak per second and scaled to 0-254.
+    """
+    cmd = LOW_PRIORITY + [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-threads', '1',
+        '-i', path,
+        '-an',
+        '-vf', f'fps={analysis_fps},scale={FRAME_WIDTH}:{FRAME_HEIGHT},format=gray',
+        '-f', 'rawvideo',
+        'pipe:1'
+    ]
+    result = subprocess.run(cmd, check=True, capture_output=True, timeout=600)
+
+    frame_size = FRAME_WIDTH * FRAME_HEIGHT
+    count = len(result.stdout) // frame_size
+    if count < 2:
+        return np.zeros(0, dtype=np.uint8)
+
+    frames = np.frombuffer(result.stdout, dtype=np.uint8, count=count * frame_size)
+    frames = frames.reshape(count, frame_size).astype(np.int16)
+    diffs = np.abs(np.diff(frames, axis=0)).mean(axis=1)
+
+    # Peak difference per second; the first frame of the segment has no predecessor
+    seconds = (np.arange(1, count) // analysis_fps).astype(np.int64)
+    scores = np.zeros(seconds[-1] + 1, dtype=np.float32)
+    np.maximum.at(scores, seconds, diffs)
+    # A mean luma change of 32 levels is already a large, full-frame change
+    return np.clip(scores * (254 / 32), 0, 254).astype(np.uint8)
+
+def open_day(storage_path, camera, date, mode='r'):
+    """Memory-map the per-second activity file of one camera day"""
+    path = activity_path(storage_path, camera, date)
+    if mode == 'r+' and not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(bytes([NO_DATA]) * SECONDS_PER_DAY)
+    if not os.path.exists(path):
+        return None
+    return np.memmap(path, dtype=np.uint8, mode=mode, shape=(SECONDS_PER_DAY,))
+
+def store_activity(storage_path, camera, start_ts, scores):
+    """Write per-second scores into the day files covering [start_ts, start_ts + len(scores))"""
+    start = datetime.fromtimestamp(start_ts)
+    written = 0
+    while written < len(scores):
+        day_start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        offset = int((start - day_start).total_seconds())
+        count = min(len(scores) - written, SECONDS_PER_DAY - offset)
+        with _store_lock:
+            day = open_day(storage_path, camera, start.strftime('%Y-%m-%d'), 'r+')
+            day[offset:offset + count] = scores[written:written + count]
+            day.flush()
+            del day
+        written += count
+        start = day_start + timedelta(days=1)
+
+def query_activity(storage_path, camera, start, end, threshold=20, min_gap=10):
+    """Return periods between start and end whose activity score exceeds threshold.
+
+    Adjacent active seconds closer than min_gap seconds are merged into one
+    period; each period reports its start, end and peak score.
+    """
+    periods = []
+    day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    while day < end:
+        scores = open_day(storage_path, camera, day.strftime('%Y-%m-%d'))
+        if scores is not None:
+            first = max(0, int((start - day).total_seconds()))
+            last = min(SECONDS_PER_DAY, int((end - day).total_seconds()))
+            window = scores[first:last]
+            active = np.flatnonzero((window >= threshold) & (window != NO_DATA))
+            if active.size:
+                # Split wherever two active seconds are further apart than min_gap
+                breaks = np.flatnonzero(np.diff(active) > min_gap)
+                for run in np.split(active, breaks + 1):
+                    periods.append({
+                        'start': (day + timedelta(seconds=first + int(run[0]))).isoformat(),
+                        'end': (day + timedelta(seconds=first + int(run[-1]) + 1)).isoformat(),
+                        'peak': int(window[run].max())
+                    })
+        day += timedelta(days=1)
+    return periods
+
+def day_profile(storage_path, camera, date, bucket_seconds=60):
+    """Peak activity per bucket for drawing a day timeline, -1 where nothing was analysed"""
+    scores = open_day(storage_path, camera, date)
+    if scores is None:
+        return []
+    buckets = np.asarray(scores, dtype=np.int16).reshape(-1, bucket_seconds)
+    peaks = np.where(buckets == NO_DATA, -1, buckets).max(axis=1)
+    return peaks.tolist()
+
+class ActivityAnalyzer(SegmentJobQueue):
+    """Score motion in every closed segment and record it in the activity index.
+
+    Runs off the recorders' segment closed events; ffmpeg decodes at idle
+    priority to 64x36 grey frames, so the cost per segment stays small.
+    """
+
+    name = 'activity-analysis'
+
+    def __init__(self, storage_path, segment_index, max_workers=1, analysis_fps=2):
+        super().__init__(max_workers)
+        self.storage_path = storage_path
+        self.segment_index = segment_index
+        self.analysis_fps = analysis_fps
+
+    def process(self, event):
+        self.analyze(event['camera'], event['path'])
+
+    def analyze(self, camera, path):
+        segment = self.segment_index.get_segment(path)
+        if segment is None:
+            return
+        scores = compute_activity(path, self.analysis_fps)
+        if not scores.size:
+            return
+        store_activity(self.storage_path, camera, segment['start_ts'], scores)
+        self.segment_index.set_activity(path, int(scores.max()))
+        logger.debug(f"Activity for {path}: peak {int(scores.max())}")
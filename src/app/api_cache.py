@@ -0,0 +1,37 @@
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+class IndexCache:
+    """Serialized JSON API responses, kept until the segment index changes.
+
+    Entries are stamped with the index version (bumped by SQLite triggers on
+    every segment insert, update or delete), so a segment closing in the
+    recorder process invalidates the cache of every web worker on its next
+    lookup. Each entry also carries an ETag derived from its body.
+    """
+
+    def __init__(self, segment_index, max_entries=256):
+        self.segment_index = segment_index
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, build):
+        """Return (body, etag) for key, calling build() for a fresh payload when stale"""
+        version = self.segment_index.version()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] == version:
+                self.entries.move_to_end(key)
+                return entry[1], entry[2]
+
+        body = json.dumps(build(), separators=(',', ':'))
+        etag = hashlib.sha1(body.encode('utf-8')).hexdigest()
+        with self.lock:
+            self.entries[key] = (version, body, etag)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return body, etag
@@ -0,0 +1,97 @@
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from metrics import ARCHIVED_SEGMENTS, ARCHIVE_BYTES_SAVED
+from segment_index import probe_segment
+from transcoding import ENCODER_CODECS, encoder_args, readrate_args, resolve_profile, transcode_segment
+
+logger = logging.getLogger(__name__)
+
+class ArchiveTranscoder:
+    """Re-encode footage older than archive_after_days with a more efficient profile.
+
+    Runs beside the VideoManager at idle CPU and I/O priority, with at most
+    archive_workers jobs of archive_threads encoder threads each and input
+    reads capped at archive_bandwidth_mb. Every result is checked against
+    the original duration before it atomically replaces the segment.
+    Progress is kept in the segment index (archived flag), so an interrupted
+    run resumes with the oldest segment still left after a restart.
+    """
+
+    def __init__(self, config, segment_index, check_interval=600, batch_size=20):
+        self.segment_index = segment_index
+        self.after_days = config['archive_after_days']
+        self.profile = resolve_profile({'name': 'archive', 'codec': 'copy', 'profile': config['archive_profile']},
+                                       config['transcode_profiles'])
+        self.max_workers = config['archive_workers']
+        self.threads = config['archive_threads']
+        self.bandwidth_limit = config['archive_bandwidth_mb'] * 1024 * 1024
+        # Inactive segments belong to the retention tier (proxy or delete), never transcode them twice
+        self.inactive_threshold = None
+        if (config['full_retention_days'] or config['retention_days']) < config['retention_days']:
+            self.inactive_threshold = config['activity_threshold']
+        self.check_interval = check_interval
+        self.batch_size = batch_size
+        self.stop_event = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, name='archive-transcoder', daemon=True).start()
+        logger.info(f"Archival transcoding started for footage older than {self.after_days} day(s) "
+                    f"({self.profile['codec']}, {self.max_workers} worker(s))")
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                # Keep going without a pause while there is a backlog
+                if self.run_once():
+                    continue
+            except Exception as e:
+                logger.error(f"Archival transcoding error: {str(e)}")
+            self.stop_event.wait(self.check_interval)
+
+    def run_once(self):
+        """Archive one batch of the oldest eligible segments, returning how many were handled"""
+        cutoff = datetime.now() - timedelta(days=self.after_days)
+        batch = self.segment_index.unarchived_segments_before(cutoff.timestamp(), self.batch_size,
+                                                              self.inactive_threshold)
+        if not batch:
+            return 0
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='archive') as pool:
+            list(pool.map(self.archive, batch))
+        return len(batch)
+
+    def archive(self, segment):
+        if self.stop_event.is_set():
+            return
+        path = segment['path']
+        codec = segment['codec'] or probe_segment(path)[1]
+        if codec == ENCODER_CODECS.get(self.profile['codec']):
+            # Already in the archive codec, e.g. a camera recording H.265 directly
+            self.segment_index.set_archived(path)
+            return
+
+        started = time.monotonic()
+        try:
+            size = transcode_segment(
+                segment,
+                ['-map', '0', '-c:a', 'copy', *encoder_args(self.profile, self.threads)],
+                self.segment_index,
+                input_args=readrate_args([segment], self.bandwidth_limit)
+            )
+        except Exception as e:
+            logger.warning(f"Could not archive {path}: {str(e)}")
+            if not self.stop_event.is_set():
+                # Do not retry a segment that cannot be transcoded on every pass
+                self.segment_index.set_archived(path)
+            return
+
+        self.segment_index.set_archived(path)
+        ARCHIVED_SEGMENTS.labels(segment['camera']).inc()
+        ARCHIVE_BYTES_SAVED.labels(segment['camera']).inc(max(0, segment['size'] - size))
+        logger.debug(f"Archived {path}: {segment['size'] / (1024 * 1024):.1f} MB -> "
+                     f"{size / (1024 * 1024):.1f} MB in {time.monotonic() - started:.0f}s")
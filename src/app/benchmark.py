@@ -0,0 +1,326 @@
+"""Measure how many cameras one box can handle, using simulated cameras.
+
+A short test clip is generated with ffmpeg's lavfi sources and replayed in
+real time, looped, as the input of every simulated camera, so the full
+NVRSystem recording path runs without any real camera or RTSP server. For
+each camera count the harness records for a while and reports:
+
+- segment write latency (segment end to segment closed event)
+- CPU and RSS of every recorder's ffmpeg process and of the NVR process
+- duration of a health check pass over all cameras
+- web listing, playlist and video range request latency
+- concatenation and retention cleanup throughput
+
+Usage (inside the container):
+
+    python /app/benchmark.py --cameras 1,4,16 --duration 120 --output report.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+import yaml
+from main import NVRSystem
+from recorder import StreamRecorder
+from segment_index import parse_segment_start
+from transcoding import CpuMeter
+from web_interface import create_web_server
+
+logger = logging.getLogger('benchmark')
+
+def generate_source(path, width, height, fps, bitrate_kbps, seconds=60):
+    """Render a looping test clip with moving video and a tone, keyframe every 2 seconds"""
+    subprocess.run([
+        'ffmpeg', '-hide_banner', '-y', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'testsrc2=size={width}x{height}:rate={fps}',
+        '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=16000',
+        '-t', str(seconds),
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p',
+        '-b:v', f'{bitrate_kbps}k', '-g', str(fps * 2),
+        '-c:a', 'aac',
+        path
+    ], check=True)
+
+def summarize(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {
+        'count': len(ordered),
+        'mean': statistics.fmean(ordered),
+        'p50': ordered[len(ordered) // 2],
+        'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        'max': ordered[-1]
+    }
+
+def process_rss_bytes(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    return None
+
+class SimulatedRecorder(StreamRecorder):
+    """Recorder whose camera is the benchmark clip replayed in real time"""
+
+    source = None
+    segment_seconds = 10
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Below the configurable minimum so a short run still closes many segments
+        self.interval = self.segment_seconds
+
+    def input_args(self):
+        return ['-re', '-stream_loop', '-1', '-i', self.source]
+
+    def check_camera_connectivity(self):
+        return True
+
+class BenchmarkNVR(NVRSystem):
+    recorder_class = SimulatedRecorder
+
+    def start_web_server(self):
+        # Web requests are timed in-process through the Flask test client
+        self.web_server = None
+
+class BenchmarkRun:
+    def __init__(self, workdir, cameras, args):
+        self.workdir = workdir
+        self.cameras = cameras
+        self.args = args
+        self.write_latencies = []
+        self.samples = {}
+
+    def setup(self):
+        config_dir = os.path.join(self.workdir, 'config')
+        os.makedirs(config_dir)
+        config = {
+            'cameras': [
+                {'name': f'cam{i:03d}', 'rtsp_url': 'rtsp://simulated', 'live': self.args.live}
+                for i in range(self.cameras)
+            ],
+            'storage_path': os.path.join(self.workdir, 'storage'),
+            'thumbnails': False,
+            'concatenation': False,
+            'web_backend': 'builtin'
+        }
+        with open(os.path.join(config_dir, 'config.yaml'), 'w') as f:
+            yaml.safe_dump(config, f)
+        self.nvr = BenchmarkNVR(config_dir)
+        for recorder in self.nvr.recorders.values():
+            recorder.add_segment_listener(self._segment_closed)
+
+    def _segment_closed(self, event):
+        start = parse_segment_start(os.path.basename(event['path']))
+        if start is not None:
+            self.write_latencies.append(event['closed_at'] - (start.timestamp() + event['duration']))
+
+    def record(self):
+        self.nvr.initial_directories()
+        started = time.monotonic()
+        for recorder in self.nvr.recorders.values():
+            recorder.start()
+        startup = time.monotonic() - started
+
+        meters = {name: CpuMeter() for name in self.nvr.recorders}
+        nvr_meter = CpuMeter()
+        self.samples = {name: {'cpu_cores': [], 'rss_bytes': []} for name in list(self.nvr.recorders) + ['nvr']}
+        deadline = time.monotonic() + self.args.duration
+        while time.monotonic() < deadline:
+            time.sleep(self.args.sample_interval)
+            pids = {name: r.process.pid for name, r in self.nvr.recorders.items() if r.process}
+            pids['nvr'] = os.getpid()
+            for name, pid in pids.items():
+                meter = nvr_meter if name == 'nvr' else meters[name]
+                try:
+                    cpu = meter.sample(pid)
+                    rss = process_rss_bytes(pid)
+                except OSError:
+                    continue
+                if cpu is not None:
+                    self.samples[name]['cpu_cores'].append(cpu)
+                if rss is not None:
+                    self.samples[name]['rss_bytes'].append(rss)
+        return startup
+
+    def health_checks(self):
+        durations = []
+        for _ in range(self.args.health_passes):
+            started = time.monotonic()
+            self.nvr.supervisor.check_all()
+            durations.append(time.monotonic() - started)
+        return summarize(durations)
+
+    def web_latency(self):
+        app = create_web_server(self.nvr.config, self.nvr.segment_index)
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['authenticated'] = True
+
+        camera = next(iter(self.nvr.recorders))
+        date = datetime.now().strftime('%Y-%m-%d')
+        segments = self.nvr.segment_index.list_segments(camera, date)
+        requests = {
+            'camera_list': ('/', {}),
+            'date_list': (f'/{camera}/', {}),
+            'segment_list': (f'/{camera}/{date}/', {}),
+            'day_playlist': (f'/playlist/{camera}/{date}.m3u8', {}),
+        }
+        if segments:
+            video = '/video/' + os.path.relpath(segments[0]['path'], self.nvr.storage_path)
+            requests['video_range'] = (video, {'Range': 'bytes=0-1048575'})
+
+        results = {}
+        for name, (url, headers) in requests.items():
+            timings = []
+            for _ in range(self.args.web_requests):
+                started = time.monotonic()
+                response = client.get(url, headers=headers)
+                response.get_data()
+                timings.append(time.monotonic() - started)
+                response.close()
+            results[name] = summarize(timings)
+        return results
+
+    def concatenation(self):
+        """Roll every camera's recorded segments into one file, copying streams like the daily job"""
+        total_bytes = 0
+        started = time.monotonic()
+        date = datetime.now().strftime('%Y-%m-%d')
+        for camera in self.nvr.recorders:
+            segments = self.nvr.segment_index.list_segments(camera, date)
+            if not segments:
+                continue
+            total_bytes += sum(s['size'] for s in segments)
+            output = os.path.join(self.nvr.storage_path, camera, date, f'{camera}_{date}.mp4')
+            self.nvr.video_manager._concatenate(camera, segments, output)
+        seconds = time.monotonic() - started
+        return {'bytes': total_bytes, 'seconds': seconds,
+                'mb_per_second': total_bytes / (1024 * 1024) / seconds if seconds else None}
+
+    def cleanup(self):
+        """Copy recorded footage into expired date directories and time the retention sweep"""
+        date = datetime.now().strftime('%Y-%m-%d')
+        for camera in self.nvr.recorders:
+            source_dir = os.path.join(self.nvr.storage_path, camera, date)
+            for copy in range(self.args.cleanup_days):
+                expired_dir = os.path.join(self.nvr.storage_path, camera, f'2000-01-{copy + 1:02d}')
+                shutil.copytree(source_dir, expired_dir)
+        self.nvr.video_manager.retention.throttle.rate = 0
+        report = self.nvr.video_manager.retention.sweep(datetime(2000, 2, 1))
+        report['files_per_second'] = report['files'] / report['seconds'] if report['seconds'] else None
+        report['mb_per_second'] = report['bytes'] / (1024 * 1024) / report['seconds'] if report['seconds'] else None
+        return report
+
+    def stop_recording(self):
+        for recorder in self.nvr.recorders.values():
+            recorder.stop()
+
+    def teardown(self):
+        self.stop_recording()
+        self.nvr.supervisor.stop()
+        self.nvr.video_manager.stop()
+
+    def run(self):
+        self.setup()
+        try:
+            startup = self.record()
+            result = {
+                'cameras': self.cameras,
+                'duration_seconds': self.args.duration,
+                'startup_seconds': startup,
+                'segments': sum(len(self.nvr.segment_index.list_segments(camera))
+                                for camera in self.nvr.recorders),
+                'segment_write_latency_seconds': summarize(self.write_latencies),
+                'recorders': {
+                    name: {'cpu_cores': summarize(samples['cpu_cores']),
+                           'rss_bytes': summarize(samples['rss_bytes'])}
+                    for name, samples in self.samples.items() if name != 'nvr'
+                },
+                'nvr_process': {'cpu_cores': summarize(self.samples['nvr']['cpu_cores']),
+                                'rss_bytes': summarize(self.samples['nvr']['rss_bytes'])},
+                'health_check_seconds': self.health_checks(),
+            }
+            cpu_means = [r['cpu_cores']['mean'] for r in result['recorders'].values() if r['cpu_cores']]
+            result['cpu_cores_per_camera'] = statistics.fmean(cpu_means) if cpu_means else None
+            result['web_latency_seconds'] = self.web_latency()
+            # Recording stops first so the throughput figures are not skewed by live writes
+            self.stop_recording()
+            result['concatenation'] = self.concatenation()
+            result['cleanup'] = self.cleanup()
+            return result
+        finally:
+            self.teardown()
+
+def ffmpeg_version():
+    try:
+        output = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True).stdout
+        return output.splitlines()[0] if output else None
+    except OSError:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description='OneNVR benchmark with simulated cameras')
+    parser.add_argument('--cameras', default='1,4,8', help='comma separated camera counts to test')
+    parser.add_argument('--duration', type=int, default=120, help='recording seconds per camera count')
+    parser.add_argument('--segment-seconds', type=int, default=10)
+    parser.add_argument('--resolution', default='1920x1080')
+    parser.add_argument('--fps', type=int, default=25)
+    parser.add_argument('--bitrate-kbps', type=int, default=4000)
+    parser.add_argument('--live', action='store_true', help='also run the live view output of every camera')
+    parser.add_argument('--sample-interval', type=float, default=2)
+    parser.add_argument('--health-passes', type=int, default=5)
+    parser.add_argument('--web-requests', type=int, default=50)
+    parser.add_argument('--cleanup-days', type=int, default=3, help='expired copies of the footage to delete')
+    parser.add_argument('--workdir', default=None, help='directory on the disk to test (default: temp dir)')
+    parser.add_argument('--output', default='benchmark-report.json')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    base = tempfile.mkdtemp(prefix='onenvr-benchmark-', dir=args.workdir)
+    report = {
+        'started_at': datetime.now().isoformat(),
+        'host': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'ffmpeg': ffmpeg_version()
+        },
+        'parameters': vars(args),
+        'runs': []
+    }
+    try:
+        width, height = args.resolution.split('x')
+        source = os.path.join(base, 'source.mp4')
+        logger.info(f"Generating {args.resolution} test source")
+        generate_source(source, width, height, args.fps, args.bitrate_kbps)
+        SimulatedRecorder.source = source
+        SimulatedRecorder.segment_seconds = args.segment_seconds
+
+        for count in [int(c) for c in args.cameras.split(',')]:
+            logger.info(f"Benchmarking {count} camera(s) for {args.duration}s")
+            workdir = os.path.join(base, f'{count}-cameras')
+            result = BenchmarkRun(workdir, count, args).run()
+            report['runs'].append(result)
+            logger.info(f"{count} camera(s): {result['segments']} segments, "
+                        f"{result['cpu_cores_per_camera'] or 0:.2f} cores per camera")
+            shutil.rmtree(workdir, ignore_errors=True)
+    finally:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        shutil.rmtree(base, ignore_errors=True)
+        logger.info(f"Report written to {args.output}")
+
+if __name__ == '__main__':
+    sys.exit(main())
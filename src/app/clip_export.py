@@ -0,0 +1,206 @@
+import os
+import sys
+import fcntl
+import logging
+import argparse
+import threading
+import subprocess
+from datetime import datetime
+from config import CONFIG_PATH, EXPORT_LOCK_DIR, load_config, setup_logging
+from segment_index import SegmentIndex, media_offset, recorded_spans
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+class ExportSlots:
+    """Cap on concurrent exports shared by every process, one flock'd file per slot.
+
+    A slot is released when its export finishes or its process dies, so a
+    crashed web worker never leaks capacity.
+    """
+
+    def __init__(self, max_concurrent, lock_dir=EXPORT_LOCK_DIR):
+        self.max_concurrent = max_concurrent
+        self.lock_dir = lock_dir
+
+    def acquire(self):
+        """Return an open slot file to pass to release(), or None when all slots are taken"""
+        os.makedirs(self.lock_dir, exist_ok=True)
+        for slot in range(self.max_concurrent):
+            f = open(os.path.join(self.lock_dir, f'export-{slot}.lock'), 'w')
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return f
+            except OSError:
+                f.close()
+        return None
+
+    def release(self, slot):
+        fcntl.flock(slot, fcntl.LOCK_UN)
+        slot.close()
+
+class ClipExporter:
+    """Cut a time range of a camera's recordings into a single fragmented MP4 stream.
+
+    The covering segments are fed to ffmpeg's concat demuxer through stdin
+    with inpoint/outpoint on the first and last file, and stream-copied to
+    fragmented MP4 on stdout. Cuts therefore land on the keyframe at or
+    before the requested start, nothing is re-encoded and no output file is
+    written; the caller sends the chunks on as ffmpeg produces them.
+    """
+
+    def __init__(self, segment_index, max_concurrent=2):
+        self.segment_index = segment_index
+        self.slots = ExportSlots(max_concurrent)
+
+    def covering_segments(self, camera, start, end):
+        """Segments overlapping [start, end), skipping sources already contained in a roll-up"""
+        segments = []
+        for segment in self.segment_index.list_segments(camera, start_ts=start.timestamp(), end_ts=end.timestamp()):
+            # A concatenation still being committed can briefly list a roll-up and its sources
+            if segments and segment['end_ts'] <= segments[-1]['end_ts']:
+                continue
+            segments.append(segment)
+        return segments
+
+    def concat_list(self, segments, start, end):
+        lines = ['ffconcat version 1.0']
+        for i, segment in enumerate(segments):
+            lines.append(f"file '{os.path.abspath(segment['path'])}'")
+            # Roll-ups join recordings without their gaps, so map wall-clock time to file time per recording
+            if i == 0:
+                inpoint = media_offset(segment, start.timestamp())
+                if inpoint > 0:
+                    lines.append(f"inpoint {inpoint:.3f}")
+            if i == len(segments) - 1:
+                outpoint = media_offset(segment, end.timestamp())
+                if outpoint < sum(duration for _, duration in recorded_spans(segment)):
+                    lines.append(f"outpoint {outpoint:.3f}")
+        return '\n'.join(lines) + '\n'
+
+    def stream(self, segments, start, end):
+        """Reserve an export slot; returns a ClipStream of MP4 bytes, or None when too many exports are running"""
+        slot = self.slots.acquire()
+        if slot is None:
+            return None
+        logger.info(f"Exporting {len(segments)} segment(s) of {segments[0]['camera']} "
+                    f"from {start.isoformat()} to {end.isoformat()}")
+        return ClipStream(self.concat_list(segments, start, end), self.slots, slot)
+
+class ClipStream:
+    """Iterable of an export's MP4 bytes; ffmpeg only starts once iteration does.
+
+    close() frees the slot and stops ffmpeg whether or not the stream was
+    read. WSGI servers call it when the response ends, including for HEAD
+    requests and clients that disconnect before the first chunk.
+    """
+
+    def __init__(self, concat_list, slots, slot):
+        self.concat_list = concat_list
+        self.slots = slots
+        self.slot = slot
+        self.process = None
+        self.lock = threading.Lock()
+
+    def __iter__(self):
+        cmd = [
+            'ionice', '-c', '2', '-n', '7',
+            'ffmpeg',
+            '-hide_banner',
+            '-loglevel', 'error',
+            '-f', 'concat', '-safe', '0',
+            '-protocol_whitelist', 'file,pipe',
+            '-i', 'pipe:0',
+            '-map', '0:v:0', '-map', '0:a?',
+            '-c', 'copy',
+            '-avoid_negative_ts', 'make_zero',
+            '-f', 'mp4',
+            '-movflags', 'frag_keyframe+empty_moov+default_base_moof',
+            'pipe:1'
+        ]
+        try:
+            with self.lock:
+                if self.slot is None:
+                    return
+                self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                                stderr=subprocess.PIPE)
+            threading.Thread(target=self._read_errors, args=(self.process,), daemon=True).start()
+            try:
+                self.process.stdin.write(self.concat_list.encode('utf-8'))
+                self.process.stdin.close()
+            except BrokenPipeError:
+                # ffmpeg exited straight away, its error is logged and the stream ends empty
+                pass
+            while True:
+                data = self.process.stdout.read1(CHUNK_SIZE)
+                if not data:
+                    break
+                yield data
+        finally:
+            self.close()
+
+    def close(self):
+        with self.lock:
+            if self.process is not None:
+                # Also reached when the client disconnects half way through
+                if self.process.poll() is None:
+                    self.process.kill()
+                self.process.wait()
+                self.process.stdout.close()
+                self.process = None
+            if self.slot is not None:
+                self.slots.release(self.slot)
+                self.slot = None
+
+    def _read_errors(self, process):
+        for raw_line in process.stderr:
+            line = raw_line.decode('utf-8', 'replace').strip()
+            if line:
+                logger.warning(f"FFmpeg [export]: {line}")
+
+def local_time(value):
+    """Naive local time of a parsed ISO datetime, so bounds with and without a UTC offset compare"""
+    if value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+def export_filename(camera, start, end):
+    return f"{camera}_{start.strftime('%Y-%m-%d_%H-%M-%S')}_{end.strftime('%H-%M-%S')}.mp4"
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a time range of a camera as a single MP4 file')
+    parser.add_argument('camera')
+    parser.add_argument('start', type=lambda value: local_time(datetime.fromisoformat(value)),
+                        help='ISO start time, e.g. 2024-01-01T02:00')
+    parser.add_argument('end', type=lambda value: local_time(datetime.fromisoformat(value)), help='ISO end time')
+    parser.add_argument('--output', '-o', help='Output file (default: standard output)')
+    parser.add_argument('--config', default=CONFIG_PATH, help='Directory containing config.yaml')
+    args = parser.parse_args()
+
+    setup_logging()
+    config = load_config(args.config)
+    exporter = ClipExporter(SegmentIndex(config['storage_path'], volumes=config['storage_volumes']),
+                            max_concurrent=config['export_max_concurrent'])
+    if args.end <= args.start:
+        parser.error('end must be after start')
+    segments = exporter.covering_segments(args.camera, args.start, args.end)
+    if not segments:
+        logger.error(f"No recordings of {args.camera} between {args.start} and {args.end}")
+        return 1
+    chunks = exporter.stream(segments, args.start, args.end)
+    if chunks is None:
+        logger.error("Too many exports running, try again later")
+        return 1
+
+    output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        with output:
+            for chunk in chunks:
+                output.write(chunk)
+    finally:
+        chunks.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
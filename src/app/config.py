@@ -3,6 +3,13 @@ import yaml
 import logging
 from schema import config_schema
 
+CONFIG_PATH = 'config'
+STORAGE_PATH = 'storage'
+# Unix socket the recorder process serves live view streams on
+LIVE_SOCKET_PATH = '/tmp/onenvr-live.sock'
+# Lock files capping concurrent clip exports across web workers
+EXPORT_LOCK_DIR = '/tmp/onenvr-exports'
+
 def setup_logging():
     level = logging.DEBUG if os.environ.get('DEBUG') == 'true' else logging.INFO
     # Clear existing handlers
@@ -32,6 +39,29 @@ def load_config(set_conf_path):
     
     # Validate config
     config = config_schema(config)
+    if config['storage_low_watermark'] >= config['storage_high_watermark']:
+        raise ValueError("storage_low_watermark must be below storage_high_watermark")
+    for camera in config['cameras']:
+        if camera['event_recording'] and not camera['live']:
+            # Event clips are cut from the live buffer, which only exists with live: true
+            raise ValueError(f"Camera {camera['name']} needs live: true for event_recording")
+    full_retention_days = config['full_retention_days']
+    if (full_retention_days and full_retention_days < config['retention_days']
+            and config['concatenation'] and config['concatenation_mode'] == 'daily'
+            and (full_retention_days > 1 or config['deletion_time'] >= config['concatenation_time'])):
+        # Tiers judge each file by its peak activity, a daily roll-up carries the peak of the whole day
+        logger.warning("Daily concatenation merges each day before retention tiers reach it, so only whole days "
+                       "without activity are thinned. Use full_retention_days: 1 with deletion_time before "
+                       "concatenation_time, concatenation_mode: hourly or concatenation: false")
+
+    # storage_path may list several volumes, the first one is the primary volume
+    volumes = config['storage_path'] if isinstance(config['storage_path'], list) else [config['storage_path']]
+    config['storage_volumes'] = volumes
+    config['storage_path'] = volumes[0]
+
+    # Isolated processes never serve the web interface from a thread of the recorder process
+    if config['process_isolation']:
+        config['web_backend'] = 'gunicorn'
 
     # Log configuration details if DEBUG is enabled
     if os.environ.get('DEBUG') == 'true':
@@ -41,11 +71,13 @@ def load_config(set_conf_path):
         if config['concatenation']:
             logger.debug(f"Daily concatenation time: {config['concatenation_time']}")
         logger.debug(f"Cleanup time: {config['deletion_time']}")
+        logger.debug(f"Storage volumes: {', '.join(config['storage_volumes'])}")
         logger.debug("Configured cameras:")
         for camera in config['cameras']:
             logger.debug(f"- {camera['name']}:")
             logger.debug(f"  RTSP URL: {camera['rtsp_url']}")
             logger.debug(f"  Codec: {camera['codec']}")
+            logger.debug(f"  Transcoding profile: {camera['profile'] or 'none'}")
             logger.debug(f"  Segment interval: {camera['interval']} seconds")
         logger.debug("======================================")
     
@@ -0,0 +1,94 @@
+import os
+import re
+import time
+import logging
+import threading
+from datetime import datetime
+from metrics import EVENT_CLIPS
+
+logger = logging.getLogger(__name__)
+
+EVENTS_DIRNAME = 'events'
+
+def event_clip_path(storage_path, camera, started, reason):
+    """Event clips live in an events/ directory inside the date directory they started in"""
+    reason = re.sub(r'[^A-Za-z0-9_-]', '', reason)[:32] or 'event'
+    return os.path.join(storage_path, camera, started.strftime('%Y-%m-%d'), EVENTS_DIRNAME,
+                        f"{started.strftime('%Y-%m-%d_%H-%M-%S')}_{reason}.mp4")
+
+class EventRecorder:
+    """Write pre-roll plus post-roll clips of a camera's live output on demand.
+
+    The clip is cut from the compressed fragments already held in the
+    recorder's LiveBuffer, starting at the last keyframe at least pre_roll
+    seconds before the trigger, so nothing is decoded and no second RTSP
+    session is opened. Triggers arriving while a clip is being written
+    extend it instead of starting another one. How much pre-roll is available
+    is bounded by the camera's live_buffer_mb.
+    """
+
+    def __init__(self, camera, live_buffer, storage_path, pre_roll=10, post_roll=20, max_length=300):
+        self.camera = camera
+        self.buffer = live_buffer
+        self.storage_path = storage_path
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.max_length = max_length
+        self.lock = threading.Lock()
+        self.active_path = None
+        self.end_time = 0
+
+    def trigger(self, reason='api'):
+        """Start a clip or extend the running one; returns the clip path"""
+        now = time.time()
+        with self.lock:
+            if self.active_path:
+                self.end_time = max(self.end_time, now + self.post_roll)
+                logger.debug(f"Extended event clip {self.active_path} ({reason})")
+                return self.active_path
+            self.active_path = event_clip_path(self.storage_path, self.camera, datetime.fromtimestamp(now), reason)
+            self.end_time = now + self.post_roll
+            path = self.active_path
+
+        threading.Thread(target=self._write_clip, args=(path, now), name=f'{self.camera}-event',
+                         daemon=True).start()
+        logger.info(f"Event ({reason}) on {self.camera}, recording {path}")
+        return path
+
+    def _write_clip(self, path, triggered_at):
+        temp_path = path + '.part'
+        written = 0
+        try:
+            opened = self.buffer.open(since=triggered_at - self.pre_roll)
+            if opened is None:
+                logger.warning(f"No live stream for {self.camera}, event clip skipped")
+                return
+
+            generation, init, next_sequence = opened
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temp_path, 'wb') as f:
+                f.write(init)
+                while time.time() < min(self.end_time, triggered_at + self.max_length):
+                    fragments, next_sequence = self.buffer.read(generation, next_sequence, timeout=1)
+                    if fragments is None:
+                        logger.warning(f"Stream of {self.camera} restarted, event clip cut short")
+                        break
+                    for data in fragments:
+                        f.write(data)
+                        written += len(data)
+
+            if written:
+                os.replace(temp_path, path)
+                EVENT_CLIPS.labels(self.camera).inc()
+                logger.info(f"Event clip ready: {path} ({written / (1024 * 1024):.1f} MB)")
+            else:
+                os.remove(temp_path)
+        except Exception as e:
+            logger.error(f"Failed to write event clip {path}: {str(e)}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+        finally:
+            with self.lock:
+                self.active_path = None
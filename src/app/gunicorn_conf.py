@@ -0,0 +1,7 @@
+from metrics import mark_process_dead
+
+# Loaded by WebServer with --config; wsgi:app is imported in the workers only
+
+def child_exit(server, worker):
+    # Recycled or crashed workers must not keep counting in live gauges
+    mark_process_dead(worker.pid)
@@ -1,11 +1,10 @@
 import os
 import sys
-import glob
 import subprocess
-from datetime import datetime, timedelta
-from config import CONFIG_PATH, STORAGE_PATH
+from config import CONFIG_PATH, STORAGE_PATH, load_config
+from segment_index import SegmentIndex, get_index_path
 
-def check_storage_access(storage_path):
+def check_storage_access(storage_path=STORAGE_PATH):
     """Check if storage directory is accessible"""
     return os.path.exists(storage_path) and os.access(storage_path, os.W_OK)
 
@@ -32,38 +31,20 @@ def check_ffmpeg_processes():
     except Exception:
         return False
 
-def check_camera_recordings(storage_path):
-    """Check if cameras are actively recording (recent files exist)"""
-    camera_dirs = glob.glob(f'/{storage_path}/*/2*')  # Date directories like 2024-01-01
-    if not camera_dirs:
+def check_camera_recordings():
+    """Check if cameras are actively recording (recent segments in the index)"""
+    try:
+        config = load_config(CONFIG_PATH)
+        # The index lives on the primary volume; never create an empty one from here
+        if not os.path.exists(get_index_path(config['storage_path'])):
+            return False
+        segment_index = SegmentIndex(config['storage_path'])
+        # Segments are indexed when they close, so allow one interval plus slack
+        return any(segment_index.has_recent_segment(camera['name'], max(600, camera['interval'] + 300))
+                   for camera in config['cameras'])
+    except Exception:
         return False
 
-    current_time = datetime.now()
-    healthy_cameras = 0
-
-    for date_dir in camera_dirs:
-        # Only check today's recordings
-        date_str = os.path.basename(date_dir)
-        try:
-            dir_date = datetime.strptime(date_str, '%Y-%m-%d')
-            if dir_date.date() != current_time.date():
-                continue
-        except ValueError:
-            continue
-
-        # Check for recent files
-        files = glob.glob(f"{date_dir}/*.mkv")
-        for file_path in files:
-            try:
-                mod_time = datetime.fromtimestamp(os.path.getmtime(file_path))
-                if current_time - mod_time < timedelta(minutes=10):
-                    healthy_cameras += 1
-                    break
-            except Exception:
-                continue
-
-    return healthy_cameras > 0
-
 def check_health():
     """Comprehensive health check"""
     checks = [
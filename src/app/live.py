@@ -0,0 +1,321 @@
+import io
+import os
+import time
+import socket
+import struct
+import logging
+import threading
+from collections import deque
+from metrics import LIVE_BUFFER_BYTES, LIVE_VIEWERS
+from playlist import find_box, read_full_box
+
+logger = logging.getLogger(__name__)
+
+# trun/tfhd sample flag marking a sample that is not a sync (key) frame
+SAMPLE_IS_NON_SYNC = 0x10000
+VIEWER_TIMEOUT = 10
+
+def fragment_starts_with_keyframe(moof):
+    """Check the first sample flags of the first track run in a moof box"""
+    f = io.BytesIO(moof)
+    traf = find_box(f, 8, len(moof), 'traf')
+    if not traf:
+        return True
+
+    default_flags = None
+    tfhd = find_box(f, *traf, 'tfhd')
+    if tfhd:
+        _, payload = read_full_box(f, tfhd)
+        f.seek(tfhd[0])
+        tfhd_flags = int.from_bytes(f.read(4)[1:], 'big')
+        offset = 4
+        for flag, size in ((0x1, 8), (0x2, 4), (0x8, 4), (0x10, 4)):
+            if tfhd_flags & flag:
+                offset += size
+        if tfhd_flags & 0x20:
+            default_flags = struct.unpack_from('>I', payload, offset)[0]
+
+    trun = find_box(f, *traf, 'trun')
+    if trun:
+        f.seek(trun[0])
+        trun_flags = int.from_bytes(f.read(4)[1:], 'big')
+        _, payload = read_full_box(f, trun)
+        offset = 4 + (4 if trun_flags & 0x1 else 0)
+        if trun_flags & 0x4:
+            return not struct.unpack_from('>I', payload, offset)[0] & SAMPLE_IS_NON_SYNC
+        if trun_flags & 0x400:
+            offset += 4
+            offset += 4 if trun_flags & 0x100 else 0
+            offset += 4 if trun_flags & 0x200 else 0
+            return not struct.unpack_from('>I', payload, offset)[0] & SAMPLE_IS_NON_SYNC
+
+    if default_flags is not None:
+        return not default_flags & SAMPLE_IS_NON_SYNC
+    return True
+
+def codec_string(init):
+    """RFC 6381 codec string for Media Source Extensions, from the init section"""
+    position = init.find(b'avcC')
+    if position != -1:
+        profile, compatibility, level = init[position + 5:position + 8]
+        return f'avc1.{profile:02x}{compatibility:02x}{level:02x}'
+    position = init.find(b'hvcC')
+    if position != -1:
+        if len(init) < position + 17:
+            return 'hvc1.1.6.L93.B0'
+        # HEVCDecoderConfigurationRecord, formatted as in ISO/IEC 14496-15 Annex E
+        record = init[position + 4:position + 17]
+        profile_space, tier, profile = record[1] >> 6, (record[1] >> 5) & 1, record[1] & 0x1f
+        compatibility = int(f"{int.from_bytes(record[2:6], 'big'):032b}"[::-1], 2)
+        constraints = bytes(record[6:12]).rstrip(b'\0')
+        sample_entry = 'hev1' if init.find(b'hev1') != -1 else 'hvc1'
+        return '.'.join([
+            f"{sample_entry}.{'' if profile_space == 0 else 'ABC'[profile_space - 1]}{profile}",
+            f"{compatibility:X}",
+            f"{'H' if tier else 'L'}{record[12]}",
+            *(f"{byte:X}" for byte in constraints)
+        ])
+    return 'avc1.640028'
+
+class LiveBuffer:
+    """Bounded in-memory ring of the most recent fMP4 fragments of one live output.
+
+    Fed with the raw byte stream of a PipeSink. Top-level boxes are cut out
+    of the stream; ftyp and moov form the init section and every moof/mdat
+    pair is one fragment. Old fragments are dropped once max_bytes is
+    exceeded, and viewers always start at the newest keyframe fragment.
+    """
+
+    def __init__(self, camera, sink, max_bytes):
+        self.camera = camera
+        self.sink = sink
+        self.max_bytes = max_bytes
+        self.pending = bytearray()
+        self.init = None
+        self.codecs = None
+        self.moof = None
+        self.fragments = deque()
+        self.buffered_bytes = 0
+        self.sequence = 0
+        # Bumped on every ffmpeg restart so viewers notice the new init section
+        self.generation = 0
+        self.condition = threading.Condition()
+
+    def on_chunk(self, chunk):
+        if chunk is None:
+            self.reset()
+            return
+        self.pending += chunk
+        while len(self.pending) >= 8:
+            size, box_type = struct.unpack_from('>I4s', self.pending)
+            if size == 1:
+                if len(self.pending) < 16:
+                    return
+                size = struct.unpack_from('>Q', self.pending, 8)[0]
+            if size < 8 or len(self.pending) < size:
+                return
+            box = bytes(self.pending[:size])
+            del self.pending[:size]
+            self._add_box(box_type, box)
+
+    def _add_box(self, box_type, box):
+        if box_type in (b'ftyp', b'moov'):
+            with self.condition:
+                self.init = box if box_type == b'ftyp' else (self.init or b'') + box
+                if box_type == b'moov':
+                    self.codecs = codec_string(self.init)
+        elif box_type == b'moof':
+            self.moof = box
+        elif box_type == b'mdat' and self.moof is not None:
+            self._add_fragment(fragment_starts_with_keyframe(self.moof), self.moof + box)
+            self.moof = None
+
+    def _add_fragment(self, keyframe, data):
+        with self.condition:
+            self.sequence += 1
+            self.fragments.append((self.sequence, keyframe, data, time.time()))
+            self.buffered_bytes += len(data)
+            while self.buffered_bytes > self.max_bytes and len(self.fragments) > 1:
+                self.buffered_bytes -= len(self.fragments.popleft()[2])
+            self.condition.notify_all()
+        LIVE_BUFFER_BYTES.labels(self.camera, self.sink).set(self.buffered_bytes)
+
+    def reset(self):
+        with self.condition:
+            self.pending.clear()
+            self.init = None
+            self.codecs = None
+            self.moof = None
+            self.fragments.clear()
+            self.buffered_bytes = 0
+            self.generation += 1
+            self.condition.notify_all()
+        LIVE_BUFFER_BYTES.labels(self.camera, self.sink).set(0)
+
+    def memory_usage(self):
+        return self.buffered_bytes + len(self.pending) + len(self.init or b'')
+
+    def _start_sequence(self, since=None):
+        """The newest keyframe fragment, or the last one received at or before since"""
+        keyframes = [(sequence, received) for sequence, keyframe, _, received in self.fragments if keyframe]
+        if not keyframes:
+            return None
+        if since is None:
+            return keyframes[-1][0]
+        before = [sequence for sequence, received in keyframes if received <= since]
+        return before[-1] if before else keyframes[0][0]
+
+    def open(self, since=None, timeout=VIEWER_TIMEOUT):
+        """Wait for a playable stream; returns (generation, init, first sequence) or None"""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.init and self._start_sequence(), timeout):
+                return None
+            return self.generation, self.init, self._start_sequence(since)
+
+    def read(self, generation, next_sequence, timeout=VIEWER_TIMEOUT):
+        """Wait for fragments from next_sequence on.
+
+        Returns (fragments, next sequence); fragments is empty when nothing
+        arrived within timeout and None once ffmpeg restarted.
+        """
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.generation != generation or self.sequence >= next_sequence, timeout
+            )
+            if self.generation != generation:
+                return None, next_sequence
+            if self.sequence < next_sequence:
+                return [], next_sequence
+            if self.fragments[0][0] > next_sequence:
+                # The reader fell behind the ring, skip ahead to the newest keyframe
+                next_sequence = self._start_sequence() or self.fragments[0][0]
+            start = next_sequence - self.fragments[0][0]
+            return [data for _, _, data, _ in list(self.fragments)[start:]], self.sequence + 1
+
+    def stream(self, stop_event=None):
+        """Yield the init section and then fragments as they arrive, from the newest keyframe on"""
+        opened = self.open()
+        if opened is None:
+            return
+        generation, init, next_sequence = opened
+        yield init
+
+        while not (stop_event and stop_event.is_set()):
+            fragments, next_sequence = self.read(generation, next_sequence)
+            if not fragments:
+                # ffmpeg restarted or the stream stalled, the viewer has to reconnect
+                return
+            yield b''.join(fragments)
+
+class LiveHub:
+    """Serve the recorders' live buffers and event triggers to web workers over a Unix socket.
+
+    The web interface may run in separate gunicorn processes, so viewers
+    connect here instead of touching recorder memory directly. A client sends
+    one command line:
+
+    - "stream <camera> <sink>" gets back one line with the MSE codec string
+      (empty if the camera has no live output) followed by the fMP4 stream.
+    - "event <camera> <reason>" gets back one line with the clip path, empty
+      if the camera does not record events.
+    """
+
+    def __init__(self, recorders, socket_path):
+        self.recorders = recorders
+        self.socket_path = socket_path
+        self.stop_event = threading.Event()
+        self.server = None
+
+    def start(self):
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.socket_path)
+        self.server.listen(64)
+        threading.Thread(target=self._accept, name='live-hub', daemon=True).start()
+        logger.info(f"Live view hub listening on {self.socket_path}")
+
+    def stop(self):
+        self.stop_event.set()
+        if self.server:
+            self.server.close()
+
+    def _accept(self):
+        while not self.stop_event.is_set():
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            try:
+                command, camera, argument = (conn.makefile('r').readline().split() + ['', '', ''])[:3]
+                recorder = self.recorders.get(camera)
+                if command == 'event':
+                    path = recorder.trigger_event(argument or 'api') if recorder else None
+                    conn.sendall(f"{path or ''}\n".encode())
+                    return
+                if command != 'stream':
+                    return
+                sink = argument
+                buffer = recorder.live_buffers.get(sink or 'live') if recorder else None
+                stream = buffer.stream(self.stop_event) if buffer else iter(())
+                first = next(stream, None)
+                conn.sendall(f"{buffer.codecs if first else ''}\n".encode())
+                if first is None:
+                    return
+                LIVE_VIEWERS.labels(camera).inc()
+                try:
+                    conn.sendall(first)
+                    for data in stream:
+                        conn.sendall(data)
+                finally:
+                    LIVE_VIEWERS.labels(camera).dec()
+            except OSError:
+                # Viewer went away
+                pass
+
+def open_live_stream(socket_path, camera, sink='live'):
+    """Connect to the LiveHub; returns (codecs, byte iterator) or (None, None)"""
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(socket_path)
+        conn.sendall(f"stream {camera} {sink}\n".encode())
+        reader = conn.makefile('rb')
+        codecs = reader.readline().decode().strip()
+    except OSError as e:
+        logger.debug(f"Live view hub unavailable: {str(e)}")
+        conn.close()
+        return None, None
+    if not codecs:
+        conn.close()
+        return None, None
+
+    def chunks():
+        try:
+            while True:
+                data = reader.read1(64 * 1024)
+                if not data:
+                    break
+                yield data
+        finally:
+            reader.close()
+            conn.close()
+
+    return codecs, chunks()
+
+def trigger_event(socket_path, camera, reason='api'):
+    """Ask the recorder process to record an event clip; returns the clip path or None"""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(5)
+            conn.connect(socket_path)
+            conn.sendall(f"event {camera} {reason}\n".encode())
+            return conn.makefile('r').readline().strip() or None
+    except OSError as e:
+        logger.warning(f"Could not trigger event on {camera}: {str(e)}")
+        return None
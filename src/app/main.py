@@ -1,12 +1,19 @@
 import os
-import schedule
+import signal
 import time
-import threading
 from datetime import datetime, timedelta
-from config import load_config, setup_logging
+from config import CONFIG_PATH, LIVE_SOCKET_PATH, load_config, setup_logging
 from recorder import StreamRecorder
-from video_manager import VideoManager
+from segment_index import SegmentIndex
 from web_interface import create_web_server
+from web_server import WebServer
+from supervisor import RecorderSupervisor
+from thumbnails import ThumbnailPipeline
+from activity import ActivityAnalyzer
+from live import LiveHub
+from transcoding import plan_transcodes
+from storage_pool import StoragePool
+from maintenance import MaintenanceJobs, MaintenanceProcess
 import logging
 
 # Configure logging
@@ -14,37 +21,63 @@ setup_logging()
 logger = logging.getLogger(__name__)
 
 class NVRSystem:
+    # Overridable so tools such as benchmark.py can record from simulated cameras
+    recorder_class = StreamRecorder
+
     def __init__(self, config_path):
         self.logger = logging.getLogger(__name__)
         self.logger.info("Initializing OneNVR system")
         self.config = load_config(config_path)
         self.storage_path = self.config['storage_path']
+        self.storage_pool = StoragePool(self.config['storage_volumes'], self.config['storage_high_watermark'])
+        self.storage_pool.measure()
         self.recorders = {}
-        self.video_manager = VideoManager(self.config)
+        self.segment_index = SegmentIndex(self.storage_path, volumes=self.storage_pool.volumes)
+        self.segment_index.rebuild()
+        self.setup_maintenance()
         self.setup_recorders()
-        self.setup_schedules()
         self.start_web_server()
 
+    def setup_maintenance(self):
+        # With process isolation, storage jobs run in their own process and only share the segment index
+        self.video_manager = None
+        if self.config['process_isolation']:
+            self.maintenance = MaintenanceProcess(self.config)
+        else:
+            self.maintenance = MaintenanceJobs(self.config, self.segment_index)
+            self.video_manager = self.maintenance.video_manager
+
     def setup_recorders(self):
         self.logger.debug(f"Setting up recorders for {len(self.config['cameras'])} cameras")
+        transcodes = plan_transcodes(self.config['cameras'], self.config['transcode_profiles'],
+                                     self.config['cpu_budget'] or os.cpu_count())
         for camera_config in self.config['cameras']:
             camera_name = camera_config['name']
-            self.recorders[camera_name] = StreamRecorder(camera_config, self.storage_path)
-        self.video_manager.set_recorders(self.recorders)
-        self.logger.debug("All recorders setup complete")
-
-    def setup_schedules(self):
-        self.logger.debug("Setting up scheduled tasks")
-        if self.config['concatenation']:
-            schedule.every().day.at(self.config['concatenation_time']).do(self.concatenate_all_cameras)
-
-        schedule.every().day.at(self.config['deletion_time']).do(
-            self.video_manager.cleanup_old_recordings
+            self.recorders[camera_name] = self.recorder_class(camera_config, self.storage_path, self.segment_index,
+                                                              transcode=transcodes[camera_name],
+                                                              storage_pool=self.storage_pool)
+        self.thumbnails = None
+        if self.config['thumbnails']:
+            self.thumbnails = ThumbnailPipeline(max_workers=self.config['thumbnail_workers'])
+            for recorder in self.recorders.values():
+                recorder.add_segment_listener(self.thumbnails.on_segment_closed)
+        self.activity = None
+        if self.config['activity_analysis']:
+            self.activity = ActivityAnalyzer(
+                self.storage_path, self.segment_index,
+                max_workers=self.config['activity_workers'],
+                analysis_fps=self.config['activity_fps']
+            )
+            for recorder in self.recorders.values():
+                recorder.add_segment_listener(self.activity.on_segment_closed)
+        self.supervisor = RecorderSupervisor(
+            self.recorders,
+            interval=self.config['health_check_interval'],
+            max_workers=self.config['health_check_workers'],
+            max_backoff=self.config['restart_max_backoff']
         )
-
-        # Health checks and maintenance
-        schedule.every(2).minutes.do(self.health_check)
-        self.logger.debug("Schedule setup complete")
+        self.live_hub = LiveHub(self.recorders, LIVE_SOCKET_PATH)
+        self.logger.debug("All recorders setup complete")
 
     def initial_directories(self):
         """Create directory for current date for all cameras"""
@@ -58,19 +91,34 @@ class NVRSystem:
 
     def start(self):
         self.logger.info("Starting OneNVR recorders")
+        started_at = time.time()
 
         # Ensure initial directories exist
         self.initial_directories()
 
-        for recorder in self.recorders.values():
-            recorder.start()
+        # Recorders start in parallel on the supervisor's pool, unreachable cameras retry in the background
+        self.supervisor.start_all(self.config['startup_jitter'], started_at)
+
+        # Health checks run on the supervisor thread, off the scheduler loop
+        self.supervisor.start()
+
+        self.live_hub.start()
+        self.maintenance.start()
+
+        if self.thumbnails:
+            self.thumbnails.start()
+        if self.activity:
+            self.activity.start()
+
+        # Treat container shutdown like Ctrl+C so recorders and web workers stop cleanly
+        signal.signal(signal.SIGTERM, self._handle_sigterm)
 
         # Main loop
         self.logger.debug("Entering main loop")
         while True:
             try:
-                schedule.run_pending()
-                time.sleep(1)
+                self.watch_processes()
+                time.sleep(5)
             except KeyboardInterrupt:
                 self.stop()
                 break
@@ -78,44 +126,44 @@ class NVRSystem:
                 self.logger.error(f"Error in main loop: {str(e)}")
                 time.sleep(5)
 
+    def _handle_sigterm(self, signum, frame):
+        raise KeyboardInterrupt
+
+    def watch_processes(self):
+        """Restart the web or maintenance process if it died, the recorders keep running regardless"""
+        if self.web_server.process is not None and not self.web_server.is_running():
+            self.logger.error("Web server process exited, restarting it")
+            self.web_server.start()
+        if isinstance(self.maintenance, MaintenanceProcess) and not self.maintenance.is_running():
+            self.logger.error("Maintenance process exited, restarting it")
+            self.maintenance.start()
+
     def stop(self):
         self.logger.info("Stopping OneNVR system")
+        self.web_server.stop()
+        self.live_hub.stop()
+        self.supervisor.stop()
+        self.maintenance.stop()
+        if self.thumbnails:
+            self.thumbnails.stop()
+        if self.activity:
+            self.activity.stop()
         for recorder in self.recorders.values():
             recorder.stop()
         self.logger.debug("All recorders stopped")
 
-    def health_check(self):
-        self.logger.debug("Starting health check for all cameras")
-        for name, recorder in self.recorders.items():
-            self.logger.debug(f"Checking health for camera: {name}")
-            if not recorder.is_healthy():
-                self.logger.warning(f"Restarting unhealthy camera: {name}")
-                recorder.restart()
-            else:
-                self.logger.debug(f"Camera {name} is healthy")
-
-    def concatenate_all_cameras(self):
-        self.logger.info("Starting daily video concatenation")
-        for camera_name in self.recorders.keys():
-            self.logger.debug(f"Starting concatenation for camera: {camera_name}")
-            self.video_manager.concatenate_daily_videos(camera_name)
-        self.logger.debug("Daily concatenation complete for all cameras")
-
     def start_web_server(self):
-        self.logger.debug("Creating web server")
-        self.web_app = create_web_server(self.config)
-        self.logger.debug("Starting web server thread")
-        server_thread = threading.Thread(
-            target=self.web_app.run,
-            kwargs={'host': '0.0.0.0', 'port': 5000, 'threaded': True},
-            daemon=True
+        self.logger.debug(f"Creating web server ({self.config['web_backend']} backend)")
+        self.web_server = WebServer(
+            self.config,
+            lambda: create_web_server(self.config, self.segment_index)
         )
-        server_thread.start()
+        self.web_server.start()
         self.logger.info("OneNVR web server started")
 
 if __name__ == "__main__":
     try:
-        nvr = NVRSystem('config')
+        nvr = NVRSystem(CONFIG_PATH)
         nvr.start()
     except Exception as e:
         logger.error(f"Failed to start OneNVR system: {str(e)}")
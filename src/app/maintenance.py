@@ -0,0 +1,130 @@
+import os
+import sys
+import signal
+import logging
+import schedule
+import threading
+import subprocess
+from config import CONFIG_PATH, load_config, setup_logging
+from segment_index import SegmentIndex
+from video_manager import VideoManager
+from storage_governor import StorageGovernor
+from archive import ArchiveTranscoder
+from metrics import mark_process_dead
+
+logger = logging.getLogger(__name__)
+
+class MaintenanceJobs:
+    """Scheduled and background storage work: concatenation, retention, eviction and archival.
+
+    None of it touches the recorders, only the segment index and the storage
+    tree, so it runs either on threads of the NVR process or on its own in a
+    separate process (see MaintenanceProcess), sharing state with the
+    recorders through the SQLite segment index.
+    """
+
+    def __init__(self, config, segment_index):
+        self.config = config
+        self.video_manager = VideoManager(config, segment_index)
+        self.storage_governor = StorageGovernor(config, segment_index)
+        self.archiver = None
+        if config['archive_after_days']:
+            self.archiver = ArchiveTranscoder(config, segment_index)
+        self.scheduler = schedule.Scheduler()
+        self.stop_event = threading.Event()
+        self.setup_schedules()
+
+    def setup_schedules(self):
+        logger.debug("Setting up scheduled tasks")
+        if self.config['concatenation'] and self.config['concatenation_mode'] == 'daily':
+            self.scheduler.every().day.at(self.config['concatenation_time']).do(
+                self.run_threaded, self.concatenate_all_cameras
+            )
+
+        self.scheduler.every().day.at(self.config['deletion_time']).do(
+            self.run_threaded, self.video_manager.cleanup_old_recordings
+        )
+        logger.debug("Schedule setup complete")
+
+    def start(self):
+        self.storage_governor.start()
+        if self.archiver:
+            self.archiver.start()
+        if self.config['concatenation'] and self.config['concatenation_mode'] == 'hourly':
+            self.video_manager.start_incremental_concatenation()
+        threading.Thread(target=self._run_schedule, name='maintenance-scheduler', daemon=True).start()
+        logger.info("Maintenance jobs started")
+
+    def _run_schedule(self):
+        while not self.stop_event.wait(1):
+            try:
+                self.scheduler.run_pending()
+            except Exception as e:
+                logger.error(f"Error in maintenance scheduler: {str(e)}")
+
+    def stop(self):
+        self.stop_event.set()
+        self.video_manager.stop()
+        self.storage_governor.stop()
+        if self.archiver:
+            self.archiver.stop()
+
+    def run_threaded(self, job):
+        """Run a long scheduled job on its own thread so the scheduler loop stays responsive"""
+        threading.Thread(target=job, name=job.__name__, daemon=True).start()
+
+    def concatenate_all_cameras(self):
+        logger.info("Starting daily video concatenation")
+        self.video_manager.resume_concatenation()
+        for camera in self.config['cameras']:
+            logger.debug(f"Starting concatenation for camera: {camera['name']}")
+            self.video_manager.concatenate_daily_videos(camera['name'])
+        logger.debug("Daily concatenation complete for all cameras")
+
+class MaintenanceProcess:
+    """Run MaintenanceJobs in a child process, restarted by the NVR process if it dies"""
+
+    def __init__(self, config):
+        self.config_path = config['config_path']
+        self.process = None
+
+    def start(self):
+        if self.process is not None:
+            # Restarting after the previous process died
+            mark_process_dead(self.process.pid)
+        env = {**os.environ, 'ONENVR_CONFIG_PATH': self.config_path}
+        self.process = subprocess.Popen([sys.executable, os.path.abspath(__file__)],
+                                        cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+        logger.info(f"Maintenance process started (PID: {self.process.pid})")
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self, timeout=30):
+        if self.process is None:
+            return
+        self.process.send_signal(signal.SIGTERM)
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning("Maintenance process did not stop in time, killing it")
+            self.process.kill()
+        mark_process_dead(self.process.pid)
+        self.process = None
+        logger.info("Maintenance process stopped")
+
+def main():
+    setup_logging()
+    config = load_config(os.environ.get('ONENVR_CONFIG_PATH', CONFIG_PATH))
+    # The NVR process reconciles the index before starting this process
+    jobs = MaintenanceJobs(config, SegmentIndex(config['storage_path'], volumes=config['storage_volumes']))
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stopped.set())
+    jobs.start()
+    stopped.wait()
+    jobs.stop()
+    logger.info("Maintenance jobs stopped")
+
+if __name__ == "__main__":
+    main()
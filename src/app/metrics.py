@@ -0,0 +1,107 @@
+import os
+from prometheus_client import (Counter, Gauge, Histogram, CollectorRegistry, REGISTRY,
+                               CONTENT_TYPE_LATEST, generate_latest, multiprocess)
+
+# When PROMETHEUS_MULTIPROC_DIR is set (see entrypoint.sh) the recorder process
+# and every web worker write their samples to shared files, so /metrics served
+# by any worker covers the whole system.
+
+SEGMENTS_WRITTEN = Counter(
+    'onenvr_segments_written_total', 'Segments closed by the recorder', ['camera']
+)
+SEGMENT_BYTES_WRITTEN = Counter(
+    'onenvr_segment_bytes_written_total', 'Bytes written in closed segments', ['camera']
+)
+FFMPEG_RESTARTS = Counter(
+    'onenvr_ffmpeg_restarts_total', 'FFmpeg recorder restarts', ['camera']
+)
+CONCATENATION_SECONDS = Histogram(
+    'onenvr_concatenation_duration_seconds', 'Time spent concatenating one camera day',
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+)
+CLEANUP_SECONDS = Histogram(
+    'onenvr_cleanup_duration_seconds', 'Time spent in retention cleanup',
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600)
+)
+HEALTH_CHECK_SECONDS = Histogram(
+    'onenvr_health_check_duration_seconds', 'Duration of one health check pass over all cameras',
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 3, 5, 10, 30, 60, 120)
+)
+REQUEST_SECONDS = Histogram(
+    'onenvr_http_request_duration_seconds', 'Web request latency', ['route', 'method', 'status']
+)
+CLEANUP_FILES_REMOVED = Counter(
+    'onenvr_cleanup_files_removed_total', 'Files deleted by retention cleanup', ['camera']
+)
+CLEANUP_BYTES_REMOVED = Counter(
+    'onenvr_cleanup_bytes_removed_total', 'Bytes deleted by retention cleanup', ['camera']
+)
+VIDEO_BYTES_SERVED = Counter(
+    'onenvr_video_bytes_served_total', 'Bytes of video sent by the web interface'
+)
+STORAGE_EVICTIONS = Counter(
+    'onenvr_storage_evictions_total', 'Segments evicted by the storage governor', ['camera']
+)
+STORAGE_FREE_BYTES = Gauge(
+    'onenvr_storage_free_bytes', 'Free space on each storage volume', ['volume'],
+    multiprocess_mode='livemostrecent'
+)
+LIVE_BUFFER_BYTES = Gauge(
+    'onenvr_live_buffer_bytes', 'Memory held by the live view ring buffer', ['camera', 'sink'],
+    multiprocess_mode='livemostrecent'
+)
+SINK_BYTES_READ = Counter(
+    'onenvr_sink_bytes_read_total', 'Bytes read from each ffmpeg output pipe', ['camera', 'sink']
+)
+LIVE_VIEWERS = Gauge(
+    'onenvr_live_viewers', 'Connected live view clients', ['camera'], multiprocess_mode='livesum'
+)
+ARCHIVED_SEGMENTS = Counter(
+    'onenvr_archived_segments_total', 'Segments re-encoded by the archival transcoder', ['camera']
+)
+ARCHIVE_BYTES_SAVED = Counter(
+    'onenvr_archive_bytes_saved_total', 'Storage saved by archival transcoding', ['camera']
+)
+EVENT_CLIPS = Counter(
+    'onenvr_event_clips_total', 'Event clips written', ['camera']
+)
+
+RECORDER_UP = Gauge(
+    'onenvr_recorder_up', 'Whether the ffmpeg process is running', ['camera'],
+    multiprocess_mode='livemostrecent'
+)
+RECORDER_STARTUP_SECONDS = Gauge(
+    'onenvr_recorder_startup_seconds', 'Time from NVR startup until the camera was recording', ['camera'],
+    multiprocess_mode='livemostrecent'
+)
+RECORDER_STATS = {
+    stat: Gauge(f'onenvr_recorder_{stat}', description, ['camera'], multiprocess_mode='livemostrecent')
+    for stat, description in {
+        'fps': 'Frames per second reported by ffmpeg',
+        'bitrate_kbps': 'Output bitrate reported by ffmpeg in kbit/s',
+        'speed': 'Processing speed relative to real time',
+        'drop_frames': 'Frames dropped since ffmpeg started',
+        'dup_frames': 'Frames duplicated since ffmpeg started',
+        'cpu_cores': 'CPU cores used by the camera ffmpeg process',
+    }.items()
+}
+
+def update_recorder_stats(camera, stats):
+    """Publish one parsed ffmpeg progress block as gauges"""
+    for stat, gauge in RECORDER_STATS.items():
+        if stats.get(stat) is not None:
+            gauge.labels(camera).set(stats[stat])
+
+def mark_process_dead(pid):
+    """Drop the live gauge samples of an exited process so they stop counting in /metrics"""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(pid)
+
+def render_metrics():
+    """Render all metrics, merging every process when running in multiprocess mode"""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
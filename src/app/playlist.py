@@ -0,0 +1,211 @@
+import math
+import struct
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Fragments are grouped into HLS segments of at least this many seconds
+TARGET_SEGMENT_SECONDS = 6
+FRAGMENT_CACHE_SIZE = 4096
+
+_fragment_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def iter_boxes(f, start, end):
+    """Yield (type, offset, header_size, size) for the ISO BMFF boxes in [start, end)"""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack('>I4s', header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size:
+            return
+        yield box_type.decode('latin-1'), offset, header_size, size
+        offset += size
+
+def find_box(f, start, end, box_type):
+    for found_type, offset, header_size, size in iter_boxes(f, start, end):
+        if found_type == box_type:
+            return offset + header_size, offset + size
+    return None
+
+def read_full_box(f, box):
+    """Return (version, payload) of a full box located by find_box()"""
+    f.seek(box[0])
+    data = f.read(box[1] - box[0])
+    return data[0], data[4:]
+
+def parse_video_track(f, moov_start, moov_end):
+    """Return (track_id, timescale) of the first video track in moov"""
+    for box_type, offset, header_size, size in iter_boxes(f, moov_start, moov_end):
+        if box_type != 'trak':
+            continue
+        trak = (offset + header_size, offset + size)
+        mdia = find_box(f, *trak, 'mdia')
+        tkhd = find_box(f, *trak, 'tkhd')
+        if not mdia or not tkhd:
+            continue
+        hdlr = find_box(f, *mdia, 'hdlr')
+        if not hdlr or read_full_box(f, hdlr)[1][4:8] != b'vide':
+            continue
+
+        version, payload = read_full_box(f, tkhd)
+        track_id = struct.unpack_from('>I', payload, 16 if version == 1 else 8)[0]
+        version, payload = read_full_box(f, find_box(f, *mdia, 'mdhd'))
+        timescale = struct.unpack_from('>I', payload, 16 if version == 1 else 8)[0]
+        return track_id, timescale
+    return None, None
+
+def parse_fragment_time(f, moof_start, moof_end, track_id):
+    """Return baseMediaDecodeTime of the given track in a moof box"""
+    for box_type, offset, header_size, size in iter_boxes(f, moof_start, moof_end):
+        if box_type != 'traf':
+            continue
+        traf = (offset + header_size, offset + size)
+        tfhd = find_box(f, *traf, 'tfhd')
+        if not tfhd or struct.unpack_from('>I', read_full_box(f, tfhd)[1])[0] != track_id:
+            continue
+        tfdt = find_box(f, *traf, 'tfdt')
+        if not tfdt:
+            return None
+        version, payload = read_full_box(f, tfdt)
+        return struct.unpack_from('>Q' if version == 1 else '>I', payload)[0]
+    return None
+
+def scan_fragments(path, size):
+    """Locate the init section and the fragments of a fragmented MP4 file.
+
+    Returns (init_size, [(offset, length, decode_time), ...], timescale) or
+    None when the file is not fragmented.
+    """
+    with open(path, 'rb') as f:
+        init_size = None
+        moov = None
+        fragments = []
+        for box_type, offset, header_size, box_size in iter_boxes(f, 0, size):
+            if box_type == 'moov':
+                moov = (offset + header_size, offset + box_size)
+            elif box_type == 'moof':
+                if init_size is None:
+                    init_size = offset
+                fragments.append([offset, box_size, (offset + header_size, offset + box_size)])
+            elif fragments:
+                # mdat and friends belong to the preceding fragment
+                fragments[-1][1] = offset + box_size - fragments[-1][0]
+
+        if moov is None or not fragments:
+            return None
+
+        track_id, timescale = parse_video_track(f, *moov)
+        if not timescale:
+            return None
+
+        return init_size, [
+            (offset, length, parse_fragment_time(f, *moof, track_id))
+            for offset, length, moof in fragments
+        ], timescale
+
+def get_fragments(path, size):
+    """Cached scan_fragments(); closed segments never change so (path, size) is a stable key"""
+    key = (path, size)
+    with _cache_lock:
+        if key in _fragment_cache:
+            _fragment_cache.move_to_end(key)
+            return _fragment_cache[key]
+
+    try:
+        result = scan_fragments(path, size)
+    except (OSError, struct.error, TypeError) as e:
+        logger.debug(f"Could not parse fragments of {path}: {str(e)}")
+        result = None
+
+    with _cache_lock:
+        _fragment_cache[key] = result
+        if len(_fragment_cache) > FRAGMENT_CACHE_SIZE:
+            _fragment_cache.popitem(last=False)
+    return result
+
+def read_init_section(segment):
+    """The init section (ftyp and moov) of a fragmented segment, or None"""
+    scanned = get_fragments(segment['path'], segment['size'])
+    if not scanned:
+        return None
+    with open(segment['path'], 'rb') as f:
+        return f.read(scanned[0])
+
+def segment_parts(segment):
+    """Split one segment file into (offset, length, duration) parts of roughly TARGET_SEGMENT_SECONDS"""
+    scanned = get_fragments(segment['path'], segment['size'])
+    if not scanned:
+        return None, []
+
+    init_size, fragments, timescale = scanned
+    total = segment['duration'] or (segment['end_ts'] - segment['start_ts'])
+    first_time = fragments[0][2] or 0
+
+    # Start time of every fragment relative to the file, closed by the file duration
+    starts = [((t if t is not None else first_time) - first_time) / timescale for _, _, t in fragments]
+    starts.append(max(total, starts[-1]))
+
+    parts = []
+    part_start, part_offset, part_length = starts[0], fragments[0][0], 0
+    for i, (offset, length, _) in enumerate(fragments):
+        part_length += length
+        if starts[i + 1] - part_start >= TARGET_SEGMENT_SECONDS or i == len(fragments) - 1:
+            parts.append((part_offset, part_length, starts[i + 1] - part_start))
+            part_start, part_offset, part_length = starts[i + 1], offset + length, 0
+
+    return init_size, parts
+
+def build_hls_playlist(segments, url_for_path, complete=True):
+    """Build an fMP4 HLS media playlist that plays the given segment files back to back.
+
+    Every file carries its own init section, so each one starts with an
+    EXT-X-DISCONTINUITY and an EXT-X-MAP byte range into the same file.
+    """
+    entries = []
+    target_duration = TARGET_SEGMENT_SECONDS
+
+    for segment in segments:
+        init_size, parts = segment_parts(segment)
+        if not parts:
+            logger.debug(f"Skipping non-fragmented segment in playlist: {segment['path']}")
+            continue
+
+        url = url_for_path(segment['path'])
+        if entries:
+            entries.append('#EXT-X-DISCONTINUITY')
+        entries.append(f'#EXT-X-PROGRAM-DATE-TIME:{format_program_date_time(segment["start_ts"])}')
+        entries.append(f'#EXT-X-MAP:URI="{url}",BYTERANGE="{init_size}@0"')
+        for offset, length, duration in parts:
+            target_duration = max(target_duration, math.ceil(duration))
+            entries.append(f'#EXTINF:{duration:.3f},')
+            entries.append(f'#EXT-X-BYTERANGE:{length}@{offset}')
+            entries.append(url)
+
+    lines = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:7',
+        f'#EXT-X-TARGETDURATION:{target_duration}',
+        '#EXT-X-MEDIA-SEQUENCE:0',
+        f'#EXT-X-PLAYLIST-TYPE:{"VOD" if complete else "EVENT"}',
+        '#EXT-X-INDEPENDENT-SEGMENTS',
+        *entries
+    ]
+    if complete:
+        lines.append('#EXT-X-ENDLIST')
+    return '\n'.join(lines) + '\n'
+
+def format_program_date_time(timestamp):
+    return datetime.fromtimestamp(timestamp).astimezone().isoformat(timespec='milliseconds')
@@ -5,23 +5,82 @@ import threading
 import time
 from datetime import datetime, timedelta
 import signal
-import glob
 import socket
 import urllib.parse
+from collections import deque
+from segment_index import probe_segment
+from stream_sinks import build_sinks
+from live import LiveBuffer
+from events import EventRecorder
+from transcoding import CpuMeter, encoder_args
+from metrics import (SEGMENTS_WRITTEN, SEGMENT_BYTES_WRITTEN, FFMPEG_RESTARTS, RECORDER_UP, RECORDER_STARTUP_SECONDS,
+                     update_recorder_stats)
 
 logger = logging.getLogger(__name__)
 
+def parse_progress(block):
+    """Convert one ffmpeg -progress block into numeric stats"""
+    def number(value, suffix=''):
+        try:
+            return float(value.rstrip(suffix))
+        except (AttributeError, ValueError):
+            return None
+
+    return {
+        'frame': number(block.get('frame')),
+        'fps': number(block.get('fps')),
+        'bitrate_kbps': number(block.get('bitrate'), 'kbits/s'),
+        'total_size': number(block.get('total_size')),
+        'out_time_seconds': (number(block.get('out_time_us')) or 0) / 1000000,
+        'dup_frames': number(block.get('dup_frames')),
+        'drop_frames': number(block.get('drop_frames')),
+        'speed': number(block.get('speed'), 'x')
+    }
+
 class StreamRecorder:
-    def __init__(self, camera_config, storage_path):
+    def __init__(self, camera_config, storage_path, segment_index=None, transcode=(None, 0), storage_pool=None):
         self.name = camera_config['name']
         self.rtsp_url = camera_config['rtsp_url']
         self.codec = camera_config['codec']
         self.interval = camera_config['interval']
+        # Transcoding profile and encoder threads granted by the CPU budget, None for copy
+        self.profile, self.encoder_threads = transcode
+        self.cpu_meter = CpuMeter()
         self.process = None
         self.recording = False
         self.last_restart = 0
         self.restart_cooldown = 30
         self.storage_path = storage_path
+        # Volume segments are written to, chosen from the pool on every start
+        self.storage_pool = storage_pool
+        self.volume = storage_path
+        self.segment_index = segment_index
+        self.segment_listeners = []
+        self.started_at = 0
+        # Set by the supervisor at boot; time_to_recording is measured until ffmpeg reports frames
+        self.startup_began = None
+        self.time_to_recording = None
+        self.last_segment_closed = 0
+        self.last_segment = None
+        self.video_codec = None
+        self.stats = {}
+        self.stats_updated = 0
+        self.recent_errors = deque(maxlen=20)
+        # Extra outputs (live copy, substream) fed by the same ffmpeg ingest
+        self.sinks = build_sinks(camera_config)
+        # In-memory ring of recent fragments per live output, capped per camera
+        self.live_buffers = {}
+        live_sinks = [name for name in ('live', 'substream') if name in self.sinks]
+        for sink in live_sinks:
+            buffer = LiveBuffer(self.name, sink, camera_config['live_buffer_mb'] * 1024 * 1024 // len(live_sinks))
+            self.live_buffers[sink] = buffer
+            self.add_sink_listener(sink, buffer.on_chunk)
+        # Event clips are cut from the full quality live copy
+        self.events = None
+        if camera_config['event_recording'] and 'live' in self.live_buffers:
+            self.events = EventRecorder(self.name, self.live_buffers['live'], storage_path,
+                                        pre_roll=camera_config['event_pre_roll'],
+                                        post_roll=camera_config['event_post_roll'])
 
     def check_camera_connectivity(self):
         logger.debug(f"Checking connectivity for camera: {self.name}")
@@ -34,10 +93,14 @@ class StreamRecorder:
             logger.debug(f"Camera {self.name} connectivity check failed: {str(e)}")
             return False
 
+    def input_args(self):
+        """ffmpeg arguments opening the camera stream"""
+        return ['-rtsp_transport', 'tcp', '-i', self.rtsp_url]
+
     def get_current_output_dir(self):
         """Get current date directory for output"""
         current_date = datetime.now().strftime('%Y-%m-%d')
-        output_dir = f"{self.storage_path}/{self.name}/{current_date}"
+        output_dir = f"{self.volume}/{self.name}/{current_date}"
         os.makedirs(output_dir, exist_ok=True)
         logger.debug(f"Output directory created/verified: {output_dir}")
         return output_dir
@@ -53,42 +116,188 @@ class StreamRecorder:
 
         logger.info(f"Starting recording for camera: {self.name}")
 
-        output_dir = self.get_current_output_dir()
-        output_pattern = f"{output_dir}/%Y-%m-%d_%H-%M-%S.mp4"
+        if self.storage_pool:
+            self.volume = self.storage_pool.select(self)
+        volume = self.volume
+
+        # The date directory is part of the strftime pattern so segments roll over
+        # into the next day's directory (created ahead of time by the monitor)
+        self.get_current_output_dir()
+        output_pattern = f"{volume}/{self.name}/%Y-%m-%d/%Y-%m-%d_%H-%M-%S.mp4"
+
+        # ffmpeg appends one CSV line per closed segment to this pipe
+        list_read_fd, list_write_fd = os.pipe()
 
         cmd = [
             'ffmpeg',
             '-hide_banner', '-y',
             '-loglevel', 'error',
-            '-rtsp_transport', 'tcp',
-            #'-use_wallclock_as_timestamps', '1',
-            '-i', self.rtsp_url,
-            #'-cv', self.codec,
-            '-c:v copy -c:a mp3 -ar 16000 -ac 1',
+            '-nostats',
+            '-progress', 'pipe:1',
+            '-stats_period', '5',
+            *self.input_args(),
+            *encoder_args(self.profile, self.encoder_threads),
+            '-c:a', 'mp3', '-ar', '16000', '-ac', '1',
             '-f', 'segment',
             '-reset_timestamps', '1',
             '-segment_time', str(self.interval),
             '-segment_format', 'mp4',
+            # Fragmented MP4 so segments can be served directly as HLS byte ranges
+            '-segment_format_options', 'movflags=+frag_keyframe+empty_moov+default_base_moof',
             '-segment_atclocktime', '1',
+            '-segment_list', f'pipe:{list_write_fd}',
+            '-segment_list_type', 'csv',
             '-strftime', '1',
             output_pattern
         ]
 
+        # Every sink is another output of the same process, so the RTSP stream
+        # is pulled and demuxed once however many consumers there are
+        sink_fds = []
+        for sink in self.sinks.values():
+            write_fd, output_args = sink.open()
+            sink_fds.append(write_fd)
+            cmd += output_args
+
         logger.info(f"FFmpeg command for {self.name}: {' '.join(cmd)}")
 
         try:
             self.process = subprocess.Popen(
                 cmd,
                 stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
+                stderr=subprocess.PIPE,
+                pass_fds=(list_write_fd, *sink_fds)
             )
             logger.debug(f"FFmpeg process started for {self.name}, PID: {self.process.pid}")
             self.recording = True
+            self.started_at = time.time()
+            RECORDER_UP.labels(self.name).set(1)
+            self._start_output_readers()
+            self._start_segment_reader(list_read_fd, volume)
+            for sink in self.sinks.values():
+                sink.start_reader()
             self._start_directory_monitor()
             logger.info(f"Recording started for camera: {self.name}")
         except Exception as e:
             logger.error(f"Failed to start recording for {self.name}: {str(e)}")
+            os.close(list_read_fd)
+            for sink in self.sinks.values():
+                sink.close()
             self.recording = False
+        finally:
+            os.close(list_write_fd)
+            for write_fd in sink_fds:
+                os.close(write_fd)
+
+    def _start_output_readers(self):
+        """Drain ffmpeg's stdout and stderr so a full pipe never blocks recording"""
+        process = self.process
+        threading.Thread(target=self._read_progress, args=(process,), daemon=True).start()
+        threading.Thread(target=self._read_errors, args=(process,), daemon=True).start()
+
+    def _read_progress(self, process):
+        """Parse -progress key=value blocks into live throughput stats"""
+        block = {}
+        for raw_line in process.stdout:
+            key, _, value = raw_line.decode('utf-8', 'replace').strip().partition('=')
+            if not key:
+                continue
+            block[key] = value.strip()
+            if key == 'progress':
+                self.stats = parse_progress(block)
+                self.stats['cpu_cores'] = self.cpu_meter.sample(process.pid)
+                self.stats_updated = time.time()
+                update_recorder_stats(self.name, self.stats)
+                if self.startup_began and self.time_to_recording is None and self.stats.get('frame'):
+                    self.time_to_recording = self.stats_updated - self.startup_began
+                    RECORDER_STARTUP_SECONDS.labels(self.name).set(self.time_to_recording)
+                    logger.info(f"Camera {self.name} recording {self.time_to_recording:.1f}s after startup")
+                block = {}
+        logger.debug(f"Progress reader stopped for camera: {self.name}")
+
+    def _read_errors(self, process):
+        """Log ffmpeg error output and keep the last few lines for diagnostics"""
+        for raw_line in process.stderr:
+            line = raw_line.decode('utf-8', 'replace').strip()
+            if line:
+                self.recent_errors.append(line)
+                logger.warning(f"FFmpeg [{self.name}]: {line}")
+        logger.debug(f"Error reader stopped for camera: {self.name}")
+
+    def get_stats(self):
+        """Latest throughput figures reported by ffmpeg for this camera"""
+        return {
+            **self.stats,
+            'age': time.time() - self.stats_updated if self.stats_updated else None,
+            'recent_errors': list(self.recent_errors),
+            'time_to_recording': self.time_to_recording,
+            'live_buffer_bytes': sum(buffer.memory_usage() for buffer in self.live_buffers.values())
+        }
+
+    def add_segment_listener(self, callback):
+        """Register a callback invoked with a segment event each time a segment closes"""
+        self.segment_listeners.append(callback)
+
+    def add_sink_listener(self, sink, callback):
+        """Register a callback receiving the byte stream of one of the camera's extra outputs"""
+        self.sinks[sink].add_listener(callback)
+
+    def trigger_event(self, reason='api'):
+        """Record a pre-roll plus post-roll clip around now; returns the clip path or None"""
+        if not self.events:
+            return None
+        return self.events.trigger(reason)
+
+    def _start_segment_reader(self, list_fd, volume):
+        """Consume ffmpeg's segment list in the background"""
+        reader_thread = threading.Thread(target=self._read_segment_list, args=(list_fd, volume), daemon=True)
+        reader_thread.start()
+
+    def _read_segment_list(self, list_fd, volume):
+        """Turn each segment list entry into a segment closed event until ffmpeg exits"""
+        logger.debug(f"Segment list reader started for camera: {self.name}")
+        with os.fdopen(list_fd, 'r') as segment_list:
+            for line in segment_list:
+                try:
+                    filename, start, end = line.strip().rsplit(',', 2)
+                    self._segment_closed(volume, filename.strip('"'), float(end) - float(start))
+                except ValueError:
+                    logger.debug(f"Ignoring malformed segment list entry for {self.name}: {line.strip()}")
+                except Exception as e:
+                    logger.error(f"Error handling closed segment for {self.name}: {str(e)}")
+        logger.debug(f"Segment list reader stopped for camera: {self.name}")
+
+    def _segment_closed(self, volume, filename, duration):
+        filename = os.path.basename(filename)
+        path = f"{volume}/{self.name}/{filename[:10]}/{filename}"
+        size = os.path.getsize(path)
+
+        # The stream codec does not change while ffmpeg runs, so probe it once
+        if self.video_codec is None:
+            _, self.video_codec = probe_segment(path)
+
+        event = {
+            'camera': self.name,
+            'path': path,
+            'size': size,
+            'duration': duration,
+            'codec': self.video_codec,
+            'closed_at': time.time()
+        }
+        logger.debug(f"Segment closed for {self.name}: {path} ({size} bytes, {duration:.1f}s)")
+
+        if self.segment_index:
+            self.segment_index.add_segment(self.name, path, size, duration, self.video_codec)
+        SEGMENTS_WRITTEN.labels(self.name).inc()
+        SEGMENT_BYTES_WRITTEN.labels(self.name).inc(size)
+        self.last_segment = event
+        self.last_segment_closed = event['closed_at']
+
+        for callback in self.segment_listeners:
+            try:
+                callback(event)
+            except Exception as e:
+                logger.error(f"Segment listener failed for {self.name}: {str(e)}")
 
     def _start_directory_monitor(self):
         """Monitor and create new date directories as needed"""
@@ -102,7 +311,7 @@ class StreamRecorder:
             try:
                 # Create directory for current date
                 current_date = datetime.now().strftime('%Y-%m-%d')
-                current_dir = f"{self.storage_path}/{self.name}/{current_date}"
+                current_dir = f"{self.volume}/{self.name}/{current_date}"
                 logger.debug(f"Creating current date directory for {self.name}: {current_dir}")
                 os.makedirs(current_dir, exist_ok=True)
 
@@ -110,7 +319,7 @@ class StreamRecorder:
                 current_time = datetime.now()
                 if current_time.hour >= 22:
                     next_date = (current_time + timedelta(days=1)).strftime('%Y-%m-%d')
-                    next_dir = f"{self.storage_path}/{self.name}/{next_date}"
+                    next_dir = f"{self.volume}/{self.name}/{next_date}"
                     logger.debug(f"Creating next day directory for {self.name}: {next_dir}")
                     os.makedirs(next_dir, exist_ok=True)
 
@@ -122,6 +331,8 @@ class StreamRecorder:
     def stop(self):
         if self.process:
             self.recording = False
+            self.video_codec = None
+            RECORDER_UP.labels(self.name).set(0)
             logger.debug(f"Sending SIGTERM to process {self.process.pid} for camera: {self.name}")
             self.process.send_signal(signal.SIGTERM)
             try:
@@ -143,6 +354,7 @@ class StreamRecorder:
             return
 
         logger.info(f"Restarting camera: {self.name}")
+        FFMPEG_RESTARTS.labels(self.name).inc()
         self.stop()
         time.sleep(3)
         self.start()
@@ -154,53 +366,36 @@ class StreamRecorder:
         if not self.process or self.process.poll() is not None:
             return False
 
-        # Check if camera is reachable
-        if not self.check_camera_connectivity():
+        # Check that ffmpeg is still making progress
+        if self.stats_updated and time.time() - self.stats_updated > 60:
+            logger.debug(f"No progress reported by ffmpeg for {self.name}, health check failed")
             return False
 
         # Check for recent files
-        current_time = datetime.now()
-        current_date = current_time.strftime('%Y-%m-%d')
-        date_dir = f"{self.storage_path}/{self.name}/{current_date}"
+        if not self.has_recent_segments():
+            logger.debug(f"No recent files found for {self.name}, health check failed")
+            return False
 
-        if not os.path.exists(date_dir):
-            logger.debug(f"Date directory does not exist for {self.name}: {date_dir}")
+        # Check if camera is reachable (the only blocking check, so it runs last)
+        if not self.check_camera_connectivity():
             return False
 
-        files = glob.glob(f"{date_dir}/*.mp4")
-        for file_path in files:
-            try:
-                mod_time = datetime.fromtimestamp(os.path.getmtime(file_path))
-                if (current_time - mod_time).total_seconds() < 300:  # 5 minutes
-                    logger.debug(f"Recent file found for {self.name}, health check passed")
-                    return True
-            except Exception as e:
-                logger.debug(f"Error checking file modification time for {self.name}: {str(e)}")
-                continue
+        logger.debug(f"Recent file found for {self.name}, health check passed")
+        return True
 
-        logger.debug(f"No recent files found for {self.name}, health check failed")
-        return False
+    def has_recent_segments(self, max_age_seconds=None):
+        """Check whether a segment closed recently, based on segment list events"""
+        if max_age_seconds is None:
+            # A segment only closes once per interval, allow some slack on top
+            max_age_seconds = max(300, self.interval + 60)
+        last_activity = max(self.last_segment_closed, self.started_at)
+        return time.time() - last_activity < max_age_seconds
 
     def get_individual_health(self):
         """Get detailed health status for this camera"""
         process_running = self.process is not None and self.process.poll() is None
         camera_reachable = self.check_camera_connectivity()
-        recent_files = False
-
-        current_time = datetime.now()
-        current_date = current_time.strftime('%Y-%m-%d')
-        date_dir = f"{self.storage_path}/{self.name}/{current_date}"
-
-        if os.path.exists(date_dir):
-            files = glob.glob(f"{date_dir}/*.mp4")
-            for file_path in files:
-                try:
-                    mod_time = datetime.fromtimestamp(os.path.getmtime(file_path))
-                    if (current_time - mod_time).total_seconds() < 300:
-                        recent_files = True
-                        break
-                except Exception:
-                    continue
+        recent_files = self.has_recent_segments()
 
         return {
             'name': self.name,
@@ -208,5 +403,6 @@ class StreamRecorder:
             'recent_files': recent_files,
             'camera_reachable': camera_reachable,
             'recording': self.recording,
+            'stats': self.get_stats(),
             'healthy': process_running and recent_files and camera_reachable
         }
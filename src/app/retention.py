@@ -0,0 +1,132 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from metrics import CLEANUP_FILES_REMOVED, CLEANUP_BYTES_REMOVED
+
+logger = logging.getLogger(__name__)
+
+class UnlinkThrottle:
+    """Spread unlinks over time so freeing large files does not starve segment writes.
+
+    Freeing extents of multi-gigabyte files on ext4/XFS is journalled work that
+    competes with the recorders' writes; the throttle is shared by all workers
+    and admits at most bytes_per_second of deleted data per second.
+    """
+
+    def __init__(self, bytes_per_second, stop_event):
+        self.rate = bytes_per_second
+        self.stop_event = stop_event
+        self.lock = threading.Lock()
+        self.next_free = time.monotonic()
+
+    def wait(self, size):
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_free)
+            self.next_free = start + size / self.rate
+        if start > now:
+            self.stop_event.wait(start - now)
+
+class RetentionEngine:
+    """Delete expired date directories of all cameras in parallel.
+
+    Each camera's directory on each storage volume is swept by one worker of a bounded pool using
+    os.scandir, so segments, roll-ups and sidecars that never made it into the
+    segment index are removed too. Removed segments are dropped from the index.
+    """
+
+    def __init__(self, volumes, segment_index, max_workers=4, unlink_rate_mb=200, stop_event=None):
+        self.volumes = volumes
+        self.segment_index = segment_index
+        self.max_workers = max_workers
+        self.stop_event = stop_event or threading.Event()
+        self.throttle = UnlinkThrottle(unlink_rate_mb * 1024 * 1024, self.stop_event)
+
+    def sweep(self, cutoff_date):
+        """Remove every date directory older than cutoff_date and report what was freed"""
+        started = time.monotonic()
+        camera_dirs = []
+        for volume in self.volumes:
+            try:
+                camera_dirs += [entry.path for entry in os.scandir(volume)
+                                if entry.is_dir() and not entry.name.startswith('.')]
+            except OSError as e:
+                # An unmounted volume must not stop the cleanup of the others
+                logger.warning(f"Cannot sweep storage volume {volume}: {str(e)}")
+
+        report = {'cameras': len({os.path.basename(path) for path in camera_dirs}), 'files': 0, 'bytes': 0}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='retention') as pool:
+            for files, freed in pool.map(lambda camera_dir: self._sweep_camera(camera_dir, cutoff_date),
+                                         camera_dirs):
+                report['files'] += files
+                report['bytes'] += freed
+
+        report['seconds'] = time.monotonic() - started
+        return report
+
+    def _sweep_camera(self, camera_dir, cutoff_date):
+        camera = os.path.basename(camera_dir)
+        files = freed = 0
+        try:
+            for entry in sorted(os.scandir(camera_dir), key=lambda e: e.name):
+                if self.stop_event.is_set():
+                    break
+                if not entry.is_dir():
+                    continue
+                try:
+                    dir_date = datetime.strptime(entry.name, '%Y-%m-%d')
+                except ValueError:
+                    continue
+                if dir_date >= cutoff_date:
+                    # Directories are sorted by date, so the rest are still retained
+                    break
+                removed, size = self._remove_date_dir(camera, entry.path)
+                files += removed
+                freed += size
+        except Exception as e:
+            logger.error(f"Retention sweep failed for {camera}: {str(e)}")
+        return files, freed
+
+    def _remove_date_dir(self, camera, date_dir):
+        removed_paths = []
+        removed = freed = 0
+        for entry in os.scandir(date_dir):
+            if self.stop_event.is_set():
+                break
+            if entry.is_dir(follow_symlinks=False):
+                # Event clips are kept in a subdirectory of the date directory
+                files, size = self._remove_date_dir(camera, entry.path)
+                removed += files
+                freed += size
+                continue
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            try:
+                size = entry.stat(follow_symlinks=False).st_size
+                self.throttle.wait(size)
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.warning(f"Could not remove {entry.path}: {str(e)}")
+                continue
+            removed_paths.append(entry.path)
+            removed += 1
+            freed += size
+            CLEANUP_FILES_REMOVED.labels(camera).inc()
+            CLEANUP_BYTES_REMOVED.labels(camera).inc(size)
+
+        # Non-segment paths are simply not found in the index
+        self.segment_index.remove_segments(removed_paths)
+
+        try:
+            os.rmdir(date_dir)
+            logger.info(f"Removed old recordings: {date_dir}")
+        except OSError as e:
+            logger.warning(f"Could not remove directory {date_dir}: {str(e)}")
+        return removed, freed
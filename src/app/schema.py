@@ -1,15 +1,66 @@
-from voluptuous import Schema, Required, Optional, All, Range, Any
+from voluptuous import Schema, Required, Optional, All, Range, Any, Length
 
 config_schema = Schema({
     Required('cameras'): [{
         Required('name'): str,
         Required('rtsp_url'): str,
         Optional('codec', default='copy'): str,
+        Optional('profile', default=None): Any(None, str),
         Optional('interval', default=300): All(int, Range(min=60)),
+        Optional('live', default=True): bool,
+        Optional('live_buffer_mb', default=8): All(int, Range(min=1)),
+        Optional('event_recording', default=False): bool,
+        Optional('event_pre_roll', default=10): All(int, Range(min=0, max=120)),
+        Optional('event_post_roll', default=20): All(int, Range(min=1, max=600)),
+        Optional('substream_width', default=None): Any(None, All(int, Range(min=160))),
+        Optional('substream_fps', default=10): All(int, Range(min=1, max=30)),
+        Optional('substream_bitrate_kbps', default=500): All(int, Range(min=50)),
+        Optional('storage_weight', default=1.0): All(Any(int, float), Range(min=0.1)),
+        Optional('storage_quota_gb', default=None): Any(None, All(Any(int, float), Range(min=1))),
     }],
+    Optional('transcode_profiles', default={}): {str: {
+        Optional('codec', default='libx264'): str,
+        Optional('preset', default='veryfast'): str,
+        Optional('width', default=None): Any(None, All(int, Range(min=160))),
+        Optional('fps', default=None): Any(None, All(int, Range(min=1, max=60))),
+        Optional('bitrate_kbps', default=None): Any(None, All(int, Range(min=50))),
+        Optional('crf', default=None): Any(None, All(int, Range(min=0, max=51))),
+        Optional('threads', default=2): All(int, Range(min=1)),
+    }},
+    Optional('cpu_budget', default=None): Any(None, All(Any(int, float), Range(min=1))),
     Optional('retention_days', default=7): All(int, Range(min=1)),
+    Optional('full_retention_days', default=None): Any(None, All(int, Range(min=1))),
+    Optional('retention_tier_mode', default='delete'): Any('delete', 'proxy'),
+    Optional('archive_after_days', default=None): Any(None, All(int, Range(min=2))),
+    Optional('archive_profile', default='h265-archive'): str,
+    Optional('archive_workers', default=1): All(int, Range(min=1)),
+    Optional('archive_threads', default=1): All(int, Range(min=1)),
+    Optional('archive_bandwidth_mb', default=0): All(Any(int, float), Range(min=0)),
+    Optional('cleanup_workers', default=4): All(int, Range(min=1)),
+    Optional('cleanup_unlink_rate_mb', default=200): All(Any(int, float), Range(min=0)),
     Optional('concatenation', default=True): bool,
     Optional('concatenation_time', default='05:00'): str,
+    Optional('concatenation_mode', default='daily'): Any('daily', 'hourly'),
+    Optional('concatenation_bandwidth_mb', default=0): All(Any(int, float), Range(min=0)),
     Optional('deletion_time', default='01:00'): str,
-    Optional('storage_path', default='storage'): str  
+    Optional('storage_path', default='storage'): Any(str, All([str], Length(min=1))),
+    Optional('storage_high_watermark', default=90): All(Any(int, float), Range(min=1, max=100)),
+    Optional('storage_low_watermark', default=85): All(Any(int, float), Range(min=1, max=100)),
+    Optional('metrics', default=True): bool,
+    Optional('startup_jitter', default=2): All(Any(int, float), Range(min=0, max=60)),
+    Optional('health_check_interval', default=120): All(int, Range(min=10)),
+    Optional('health_check_workers', default=8): All(int, Range(min=1)),
+    Optional('restart_max_backoff', default=600): All(int, Range(min=30)),
+    Optional('process_isolation', default=False): bool,
+    Optional('web_backend', default='builtin'): Any('builtin', 'gunicorn'),
+    Optional('web_workers', default=2): All(int, Range(min=1)),
+    Optional('web_threads', default=8): All(int, Range(min=1)),
+    Optional('web_max_connections', default=100): All(int, Range(min=1)),
+    Optional('export_max_concurrent', default=2): All(int, Range(min=1)),
+    Optional('thumbnails', default=True): bool,
+    Optional('thumbnail_workers', default=1): All(int, Range(min=1)),
+    Optional('activity_analysis', default=False): bool,
+    Optional('activity_workers', default=1): All(int, Range(min=1)),
+    Optional('activity_fps', default=2): All(int, Range(min=1, max=10)),
+    Optional('activity_threshold', default=20): All(int, Range(min=1, max=254))
 })
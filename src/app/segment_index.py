@@ -0,0 +1,463 @@
+import os
+import re
+import glob
+import json
+import sqlite3
+import logging
+import threading
+import subprocess
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = '.segments.db'
+# Recorder segments are named <date>_<time>.mp4, daily concatenations <camera>_<date>.mp4
+SEGMENT_NAME_RE = re.compile(r'^(?:.+_)?(\d{4}-\d{2}-\d{2})(?:_(\d{2}-\d{2}-\d{2}))?\.mp4$')
+DATE_DIR_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS segments (
+        path TEXT PRIMARY KEY,
+        camera TEXT NOT NULL,
+        date TEXT NOT NULL,
+        start_ts REAL NOT NULL,
+        end_ts REAL NOT NULL,
+        size INTEGER NOT NULL,
+        duration REAL,
+        codec TEXT,
+        mtime REAL NOT NULL,
+        activity INTEGER,
+        proxy INTEGER NOT NULL DEFAULT 0,
+        archived INTEGER NOT NULL DEFAULT 0,
+        spans TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_segments_camera_start ON segments (camera, start_ts);
+    CREATE INDEX IF NOT EXISTS idx_segments_camera_date ON segments (camera, date);
+    CREATE INDEX IF NOT EXISTS idx_segments_start ON segments (start_ts);
+    CREATE TABLE IF NOT EXISTS rollups (
+        output TEXT PRIMARY KEY,
+        camera TEXT NOT NULL,
+        sources TEXT NOT NULL
+    );
+    -- Bumped on every change to segments, so readers in any process can cheaply tell
+    -- whether cached listings are still current
+    CREATE TABLE IF NOT EXISTS index_version (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        version INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO index_version (id, version) VALUES (0, 0);
+    CREATE TRIGGER IF NOT EXISTS segments_version_insert AFTER INSERT ON segments
+        BEGIN UPDATE index_version SET version = version + 1; END;
+    CREATE TRIGGER IF NOT EXISTS segments_version_update AFTER UPDATE ON segments
+        BEGIN UPDATE index_version SET version = version + 1; END;
+    CREATE TRIGGER IF NOT EXISTS segments_version_delete AFTER DELETE ON segments
+        BEGIN UPDATE index_version SET version = version + 1; END;
+'''
+
+def get_index_path(storage_path):
+    return os.path.join(storage_path, INDEX_FILENAME)
+
+def parse_segment_start(filename):
+    """Return the wall-clock start of a segment from its strftime filename, or None"""
+    match = SEGMENT_NAME_RE.match(filename)
+    if not match:
+        return None
+    try:
+        return datetime.strptime(f"{match.group(1)}_{match.group(2) or '00-00-00'}", '%Y-%m-%d_%H-%M-%S')
+    except ValueError:
+        return None
+
+def probe_segment(path):
+    """Read duration and video codec of a finished segment with ffprobe"""
+    cmd = [
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'format=duration:stream=codec_name',
+        '-of', 'json',
+        path
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        info = json.loads(result.stdout or '{}')
+        duration = info.get('format', {}).get('duration')
+        streams = info.get('streams') or [{}]
+        return (float(duration) if duration else None), streams[0].get('codec_name')
+    except Exception as e:
+        logger.debug(f"ffprobe failed for {path}: {str(e)}")
+        return None, None
+
+def recorded_spans(segment):
+    """[start_ts, duration] of every recording in a segment file, several for roll-ups"""
+    if segment.get('spans'):
+        return json.loads(segment['spans'])
+    return [[segment['start_ts'], segment['duration'] or (segment['end_ts'] - segment['start_ts'])]]
+
+def media_offset(segment, ts):
+    """Position in the file of wall-clock time ts, snapped forward to the next recording in a gap"""
+    offset = 0
+    for start, duration in recorded_spans(segment):
+        if ts < start:
+            break
+        if ts < start + duration:
+            return offset + ts - start
+        offset += duration
+    return offset
+
+def remove_sidecars(path):
+    """Delete derived files (thumbnails, analysis) stored next to a segment as <stem>.*"""
+    stem = os.path.splitext(path)[0]
+    for sidecar in glob.glob(f"{glob.escape(stem)}.*"):
+        if sidecar != path:
+            try:
+                os.remove(sidecar)
+            except OSError as e:
+                logger.debug(f"Could not remove {sidecar}: {str(e)}")
+
+class SegmentIndex:
+    """SQLite catalog of recorded segments, one row per file.
+
+    The recorders add rows as segments close, so listings, health checks,
+    retention and concatenation never have to walk the storage tree.
+    """
+
+    def __init__(self, storage_path, db_path=None, volumes=None):
+        self.storage_path = storage_path
+        # All storage volumes of a pool, the index itself lives on the primary one
+        self.volumes = volumes or [storage_path]
+        self.db_path = db_path or get_index_path(storage_path)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with self._write_lock:
+            conn = self._conn()
+            conn.executescript(SCHEMA)
+            self._migrate(conn)
+            conn.commit()
+
+    def _migrate(self, conn):
+        """Add columns introduced after an index file was first created"""
+        columns = {row['name'] for row in conn.execute('PRAGMA table_info(segments)')}
+        if 'activity' not in columns:
+            conn.execute('ALTER TABLE segments ADD COLUMN activity INTEGER')
+        if 'proxy' not in columns:
+            conn.execute('ALTER TABLE segments ADD COLUMN proxy INTEGER NOT NULL DEFAULT 0')
+        if 'archived' not in columns:
+            conn.execute('ALTER TABLE segments ADD COLUMN archived INTEGER NOT NULL DEFAULT 0')
+        if 'spans' not in columns:
+            conn.execute('ALTER TABLE segments ADD COLUMN spans TEXT')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _write(self, sql, params=()):
+        with self._write_lock:
+            conn = self._conn()
+            cursor = conn.execute(sql, params)
+            conn.commit()
+            return cursor.rowcount
+
+    def _query(self, sql, params=()):
+        return [dict(row) for row in self._conn().execute(sql, params).fetchall()]
+
+    def add_segment(self, camera, path, size=None, duration=None, codec=None, mtime=None):
+        """Insert or refresh the row for a closed segment file"""
+        start = parse_segment_start(os.path.basename(path))
+        if start is None:
+            logger.debug(f"Skipping non-segment file in index: {path}")
+            return None
+
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            logger.debug(f"Cannot stat segment {path}: {str(e)}")
+            return None
+
+        # Listings follow the on-disk layout, so the date comes from the parent directory
+        date = os.path.basename(os.path.dirname(path))
+        if not DATE_DIR_RE.match(date):
+            date = start.strftime('%Y-%m-%d')
+        size = stat.st_size if size is None else size
+        mtime = stat.st_mtime if mtime is None else mtime
+        start_ts = start.timestamp()
+        end_ts = start_ts + duration if duration else max(mtime, start_ts)
+
+        # Upsert so analysis results (activity, proxy, archived) survive a refresh of the file details
+        self._write(
+            '''INSERT INTO segments
+               (path, camera, date, start_ts, end_ts, size, duration, codec, mtime)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(path) DO UPDATE SET
+                   camera = excluded.camera, date = excluded.date,
+                   start_ts = CASE WHEN spans IS NOT NULL THEN start_ts ELSE excluded.start_ts END,
+                   end_ts = CASE WHEN spans IS NOT NULL THEN end_ts
+                                 WHEN excluded.duration IS NULL AND duration IS NOT NULL
+                                 THEN excluded.start_ts + duration ELSE excluded.end_ts END,
+                   size = excluded.size, duration = COALESCE(excluded.duration, duration),
+                   codec = COALESCE(excluded.codec, codec), mtime = excluded.mtime''',
+            (path, camera, date, start_ts, end_ts, size, duration, codec, mtime)
+        )
+        return {
+            'path': path, 'camera': camera, 'date': date,
+            'start_ts': start_ts, 'end_ts': end_ts, 'size': size,
+            'duration': duration, 'codec': codec
+        }
+
+    def remove_segment(self, path):
+        return self._write('DELETE FROM segments WHERE path = ?', (path,))
+
+    def remove_segments(self, paths):
+        with self._write_lock:
+            conn = self._conn()
+            conn.executemany('DELETE FROM segments WHERE path = ?', [(p,) for p in paths])
+            conn.commit()
+
+    def sync_directory(self, camera, date_dir, probe=False):
+        """Index new or changed segments in a single date directory"""
+        date_dir = date_dir.rstrip('/')
+        # The same camera day can be split across storage volumes, only look at this directory
+        known = {row['path']: (row['size'], row['mtime']) for row in self._query(
+            'SELECT path, size, mtime FROM segments WHERE camera = ? AND date = ?',
+            (camera, os.path.basename(date_dir))
+        ) if os.path.dirname(row['path']) == date_dir}
+        seen = set()
+        added = 0
+
+        try:
+            entries = list(os.scandir(date_dir))
+        except OSError as e:
+            logger.debug(f"Cannot scan {date_dir}: {str(e)}")
+            return 0
+
+        for entry in entries:
+            if not entry.is_file() or not SEGMENT_NAME_RE.match(entry.name):
+                continue
+            seen.add(entry.path)
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            if known.get(entry.path) == (stat.st_size, stat.st_mtime):
+                continue
+            duration, codec = probe_segment(entry.path) if probe else (None, None)
+            if self.add_segment(camera, entry.path, stat.st_size, duration, codec, stat.st_mtime):
+                added += 1
+
+        stale = [path for path in known if path not in seen]
+        if stale:
+            self.remove_segments(stale)
+
+        return added
+
+    def rebuild(self):
+        """Incrementally reconcile the index with the storage tree at startup"""
+        logger.info(f"Reconciling segment index with {', '.join(self.volumes)}")
+        added = 0
+
+        available = []
+        for volume in self.volumes:
+            try:
+                camera_entries = [e for e in os.scandir(volume) if e.is_dir()]
+            except OSError as e:
+                logger.warning(f"Cannot scan storage path {volume}: {str(e)}")
+                continue
+            available.append(volume)
+
+            for camera_entry in camera_entries:
+                try:
+                    date_entries = list(os.scandir(camera_entry.path))
+                except OSError as e:
+                    # Removed while the rebuild was running
+                    logger.debug(f"Cannot scan {camera_entry.path}: {str(e)}")
+                    continue
+                for date_entry in date_entries:
+                    if date_entry.is_dir() and DATE_DIR_RE.match(date_entry.name):
+                        added += self.sync_directory(camera_entry.name, date_entry.path)
+
+        # Rows of an unmounted volume cannot be checked, keep them until it is back
+        if len(available) < len(self.volumes):
+            logger.warning("Not all storage volumes are available, keeping index rows of missing directories")
+        else:
+            # Drop rows for camera/date directories that vanished entirely from every volume
+            for row in self._query('SELECT DISTINCT camera, date FROM segments'):
+                if not any(os.path.isdir(os.path.join(volume, row['camera'], row['date'])) for volume in available):
+                    self._write('DELETE FROM segments WHERE camera = ? AND date = ?',
+                                (row['camera'], row['date']))
+
+        logger.info(f"Segment index ready, {added} segment(s) added or refreshed")
+
+    def list_cameras(self):
+        return [row['camera'] for row in self._query(
+            'SELECT DISTINCT camera FROM segments ORDER BY camera'
+        )]
+
+    def list_dates(self, camera):
+        return [row['date'] for row in self._query(
+            'SELECT DISTINCT date FROM segments WHERE camera = ? ORDER BY date DESC', (camera,)
+        )]
+
+    def version(self):
+        """Counter that changes whenever any segment row is added, changed or removed"""
+        return self._query('SELECT version FROM index_version')[0]['version']
+
+    def camera_summary(self):
+        """Segment count, total size and time span of the indexed footage per camera"""
+        return self._query(
+            '''SELECT camera, COUNT(*) AS segments, SUM(size) AS size, SUM(duration) AS duration,
+                      MIN(start_ts) AS start_ts, MAX(end_ts) AS end_ts
+               FROM segments GROUP BY camera ORDER BY camera'''
+        )
+
+    def date_summary(self, camera, before=None, limit=None):
+        """Per-day totals for a camera, newest first, optionally only days before a date"""
+        sql = '''SELECT date, COUNT(*) AS segments, SUM(size) AS size, SUM(duration) AS duration,
+                        MIN(start_ts) AS start_ts, MAX(end_ts) AS end_ts
+                 FROM segments WHERE camera = ?'''
+        params = [camera]
+        if before is not None:
+            sql += ' AND date < ?'
+            params.append(before)
+        sql += ' GROUP BY date ORDER BY date DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return self._query(sql, params)
+
+    def list_segments(self, camera, date=None, start_ts=None, end_ts=None, after=None, limit=None):
+        """Segments in start order; after=(start_ts, path) of the last row seen continues a listing"""
+        sql = 'SELECT * FROM segments WHERE camera = ?'
+        params = [camera]
+        if date is not None:
+            sql += ' AND date = ?'
+            params.append(date)
+        if start_ts is not None:
+            sql += ' AND end_ts > ?'
+            params.append(start_ts)
+        if end_ts is not None:
+            sql += ' AND start_ts < ?'
+            params.append(end_ts)
+        if after is not None:
+            sql += ' AND (start_ts > ? OR (start_ts = ? AND path > ?))'
+            params += [after[0], after[0], after[1]]
+        sql += ' ORDER BY start_ts, path'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return self._query(sql, params)
+
+    def get_segment(self, path):
+        rows = self._query('SELECT * FROM segments WHERE path = ?', (path,))
+        return rows[0] if rows else None
+
+    def set_activity(self, path, activity):
+        """Record the peak activity score (0-254) computed for a segment"""
+        self._write('UPDATE segments SET activity = ? WHERE path = ?', (activity, path))
+
+    def set_proxy(self, path):
+        """Mark a segment as replaced by its low-bitrate proxy"""
+        self._write('UPDATE segments SET proxy = 1 WHERE path = ?', (path,))
+
+    def set_spans(self, path, spans):
+        """Record the wall-clock spans of the recordings joined into a roll-up, in file order.
+
+        The row's time range becomes the first span's start to the last span's
+        end, which a roll-up's name and duration alone cannot tell when the
+        recording had gaps.
+        """
+        self._write('UPDATE segments SET spans = ?, start_ts = ?, end_ts = ? WHERE path = ?',
+                    (json.dumps(spans), spans[0][0], spans[-1][0] + spans[-1][1], path))
+
+    def set_archived(self, path):
+        """Mark a segment as processed by the archival transcoder"""
+        self._write('UPDATE segments SET archived = 1 WHERE path = ?', (path,))
+
+    def unarchived_segments_before(self, cutoff_ts, limit, inactive_threshold=None):
+        """Oldest full quality segments not yet archived, the transcoder's resumable work list.
+
+        With inactive_threshold, segments left to the retention tier (analysed
+        and below the threshold) are skipped.
+        """
+        sql = 'SELECT * FROM segments WHERE start_ts < ? AND archived = 0 AND proxy = 0'
+        params = [cutoff_ts]
+        if inactive_threshold is not None:
+            sql += ' AND (activity IS NULL OR activity >= ?)'
+            params.append(inactive_threshold)
+        return self._query(sql + ' ORDER BY start_ts LIMIT ?', params + [limit])
+
+    def max_activity(self, paths):
+        if not paths:
+            return None
+        placeholders = ','.join('?' * len(paths))
+        rows = self._query(f'SELECT MAX(activity) AS peak FROM segments WHERE path IN ({placeholders})', paths)
+        return rows[0]['peak']
+
+    def inactive_segments_before(self, cutoff_ts, threshold, limit=-1):
+        """Analysed full-quality segments older than cutoff_ts whose peak activity stayed below threshold"""
+        return self._query(
+            '''SELECT * FROM segments
+               WHERE start_ts < ? AND activity IS NOT NULL AND activity < ? AND proxy = 0
+               ORDER BY start_ts LIMIT ?''',
+            (cutoff_ts, threshold, limit)
+        )
+
+    def camera_usage(self):
+        """Total bytes of indexed footage per camera"""
+        return {row['camera']: row['total'] for row in self._query(
+            'SELECT camera, SUM(size) AS total FROM segments GROUP BY camera'
+        )}
+
+    def oldest_segments(self, camera, limit, volume=None):
+        if volume is None:
+            return self._query(
+                'SELECT * FROM segments WHERE camera = ? ORDER BY start_ts LIMIT ?', (camera, limit)
+            )
+        prefix = volume.rstrip('/') + '/'
+        return self._query(
+            '''SELECT * FROM segments WHERE camera = ? AND substr(path, 1, ?) = ?
+               ORDER BY start_ts LIMIT ?''',
+            (camera, len(prefix), prefix, limit)
+        )
+
+    def segments_before(self, cutoff_ts, camera=None):
+        sql = 'SELECT * FROM segments WHERE start_ts < ?'
+        params = [cutoff_ts]
+        if camera is not None:
+            sql += ' AND camera = ?'
+            params.append(camera)
+        return self._query(sql + ' ORDER BY start_ts', params)
+
+    def has_recent_segment(self, camera, max_age_seconds):
+        cutoff = (datetime.now() - timedelta(seconds=max_age_seconds)).timestamp()
+        return bool(self._query(
+            'SELECT 1 FROM segments WHERE camera = ? AND mtime >= ? LIMIT 1', (camera, cutoff)
+        ))
+
+    def total_duration(self, paths):
+        """Sum of the recorded durations of the given segments"""
+        if not paths:
+            return None
+        placeholders = ','.join('?' * len(paths))
+        rows = self._query(
+            f'SELECT SUM(COALESCE(duration, end_ts - start_ts)) AS total FROM segments WHERE path IN ({placeholders})',
+            paths
+        )
+        return rows[0]['total']
+
+    def begin_rollup(self, output, camera, sources):
+        """Journal a finished concatenation before its sources are replaced"""
+        self._write('INSERT OR REPLACE INTO rollups (output, camera, sources) VALUES (?, ?, ?)',
+                    (output, camera, json.dumps(sources)))
+
+    def finish_rollup(self, output):
+        self._write('DELETE FROM rollups WHERE output = ?', (output,))
+
+    def pending_rollups(self):
+        return [{**row, 'sources': json.loads(row['sources'])}
+                for row in self._query('SELECT * FROM rollups')]
@@ -0,0 +1,52 @@
+import queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Background ffmpeg jobs run at idle CPU and I/O priority so recording always wins
+LOW_PRIORITY = ['nice', '-n', '19', 'ionice', '-c', '3']
+
+class SegmentJobQueue:
+    """Bounded queue of closed segments processed by a small pool of worker threads.
+
+    Subclasses implement process(event); an instance's on_segment_closed is
+    registered as a StreamRecorder segment listener.
+    """
+
+    name = 'segment-jobs'
+
+    def __init__(self, max_workers=1, max_queue=500):
+        self.max_workers = max_workers
+        self.jobs = queue.Queue(maxsize=max_queue)
+        self.stop_event = threading.Event()
+
+    def start(self):
+        for i in range(self.max_workers):
+            threading.Thread(target=self._run, name=f'{self.name}-{i}', daemon=True).start()
+        logger.info(f"Started {self.name} with {self.max_workers} worker(s)")
+
+    def stop(self):
+        self.stop_event.set()
+
+    def on_segment_closed(self, event):
+        try:
+            self.jobs.put_nowait(event)
+        except queue.Full:
+            logger.warning(f"{self.name} queue full, skipping {event['path']}")
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                event = self.jobs.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                self.process(event)
+            except Exception as e:
+                logger.error(f"{self.name} failed for {event['path']}: {str(e)}")
+            finally:
+                self.jobs.task_done()
+
+    def process(self, event):
+        raise NotImplementedError
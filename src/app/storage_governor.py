@@ -0,0 +1,141 @@
+import os
+import time
+import shutil
+import logging
+import threading
+from datetime import datetime
+from segment_index import remove_sidecars
+from metrics import STORAGE_EVICTIONS, STORAGE_FREE_BYTES
+
+logger = logging.getLogger(__name__)
+
+class StorageGovernor:
+    """Keep free space on every storage volume between two watermarks.
+
+    Every check_interval seconds the usage of each volume is compared with the
+    high watermark. Once crossed, segments stored on that volume are evicted in small batches until usage
+    drops below the low watermark: first from cameras over their quota, then
+    oldest-first across all cameras, with a camera's age scaled by its weight
+    so higher-weighted cameras keep footage longer. Candidates come from the
+    segment index, so the storage tree is never walked.
+    """
+
+    def __init__(self, config, segment_index, check_interval=30, batch_size=20):
+        self.volumes = config['storage_volumes']
+        self.segment_index = segment_index
+        self.high_watermark = config['storage_high_watermark']
+        self.low_watermark = config['storage_low_watermark']
+        self.check_interval = check_interval
+        self.batch_size = batch_size
+        self.weights = {c['name']: c['storage_weight'] for c in config['cameras']}
+        self.quotas = {
+            c['name']: c['storage_quota_gb'] * 1024 ** 3
+            for c in config['cameras'] if c.get('storage_quota_gb')
+        }
+        self.stop_event = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, name='storage-governor', daemon=True).start()
+        logger.info(f"Storage governor started (high {self.high_watermark}%, low {self.low_watermark}%)")
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        while not self.stop_event.wait(self.check_interval):
+            try:
+                self.enforce()
+            except Exception as e:
+                logger.error(f"Storage governor error: {str(e)}")
+
+    def usage_percent(self, volume):
+        usage = shutil.disk_usage(volume)
+        STORAGE_FREE_BYTES.labels(volume).set(usage.free)
+        return usage.used * 100 / usage.total
+
+    def enforce(self):
+        self._enforce_quotas()
+        for volume in self.volumes:
+            try:
+                self._enforce_volume(volume)
+            except OSError as e:
+                # Keep governing the other volumes while one is unavailable
+                logger.warning(f"Cannot check storage volume {volume}: {str(e)}")
+
+    def _enforce_volume(self, volume):
+        if self.usage_percent(volume) < self.high_watermark:
+            return
+
+        logger.warning(f"Storage volume {volume} above {self.high_watermark}% used, evicting oldest segments")
+        evicted = 0
+        while not self.stop_event.is_set() and self.usage_percent(volume) > self.low_watermark:
+            batch = self._oldest_weighted(self.batch_size, volume)
+            if not batch:
+                logger.error(f"Storage volume {volume} above watermark but no segments left to evict")
+                break
+            removed = self._evict(batch)
+            if not removed:
+                # The same undeletable batch would come back on every pass
+                logger.error(f"Storage volume {volume} above watermark but no segment could be evicted")
+                break
+            evicted += removed
+            # Give live segment writes a chance between batches
+            time.sleep(0.5)
+        logger.info(f"Storage governor evicted {evicted} segment(s) from {volume}, "
+                    f"usage now {self.usage_percent(volume):.1f}%")
+
+    def _enforce_quotas(self):
+        usage = self.segment_index.camera_usage()
+        for camera, quota in self.quotas.items():
+            excess = usage.get(camera, 0) - quota
+            while excess > 0 and not self.stop_event.is_set():
+                batch = self.segment_index.oldest_segments(camera, self.batch_size)
+                if not batch:
+                    break
+                # Only take as many segments as needed to get back under quota
+                selected = []
+                for segment in batch:
+                    if excess <= 0:
+                        break
+                    selected.append(segment)
+                    excess -= segment['size']
+                logger.info(f"Camera {camera} over its storage quota, evicting {len(selected)} segment(s)")
+                if not self._evict(selected):
+                    logger.error(f"Camera {camera} over its storage quota but no segment could be evicted")
+                    break
+
+    def _oldest_weighted(self, count, volume=None):
+        """Pick the next segments to evict from a volume, oldest first with ages scaled by camera weight"""
+        now = time.time()
+        candidates = []
+        for camera in self.segment_index.list_cameras():
+            weight = self.weights.get(camera, 1.0)
+            for segment in self.segment_index.oldest_segments(camera, count, volume):
+                candidates.append(((now - segment['start_ts']) / weight, segment))
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        return [segment for _, segment in candidates[:count]]
+
+    def _evict(self, segments):
+        removed = []
+        for segment in segments:
+            try:
+                os.remove(segment['path'])
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not evict {segment['path']}: {str(e)}")
+                continue
+            remove_sidecars(segment['path'])
+            removed.append(segment['path'])
+            STORAGE_EVICTIONS.labels(segment['camera']).inc()
+            logger.debug(f"Evicted {segment['path']}")
+
+            # Drop a past date directory once its last segment is gone
+            if segment['date'] != datetime.now().strftime('%Y-%m-%d'):
+                try:
+                    os.rmdir(os.path.dirname(segment['path']))
+                except OSError:
+                    pass
+
+        self.segment_index.remove_segments(removed)
+        return len(removed)
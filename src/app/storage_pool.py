@@ -0,0 +1,128 @@
+import os
+import time
+import shutil
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+PROBE_FILENAME = '.onenvr-write-probe'
+PROBE_BYTES = 32 * 1024 * 1024
+# Assumed camera bitrate (4 Mbit/s) until ffmpeg reports the real one
+DEFAULT_CAMERA_BYTES_PER_SECOND = 500 * 1024
+
+def measure_write_throughput(volume, size=PROBE_BYTES):
+    """Sequential write speed of a volume in bytes per second, including fsync"""
+    path = os.path.join(volume, PROBE_FILENAME)
+    block = os.urandom(1024 * 1024)
+    started = time.monotonic()
+    try:
+        with open(path, 'wb') as f:
+            for _ in range(size // len(block)):
+                f.write(block)
+            f.flush()
+            os.fsync(f.fileno())
+        return size / max(time.monotonic() - started, 1e-6)
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+class StoragePool:
+    """One or more storage volumes presented as a single logical storage tree.
+
+    Every volume keeps the usual <camera>/<date>/ layout. A camera is placed
+    on a volume each time its recorder starts, preferring volumes with the
+    most spare write bandwidth (measured throughput minus the bitrate of the
+    cameras already writing there) and free space. Readers resolve a logical
+    "<camera>/<date>/<file>" path to whichever volume holds it. The first
+    volume is the primary one and holds the segment index and per-day data.
+    """
+
+    def __init__(self, volumes, high_watermark=90):
+        self.volumes = list(volumes)
+        self.primary = self.volumes[0]
+        self.high_watermark = high_watermark
+        self.throughput = {}
+        self.assignments = {}
+        self.lock = threading.Lock()
+
+    def measure(self):
+        """Probe the write throughput of every volume, only needed with more than one"""
+        if len(self.volumes) < 2:
+            return
+        for volume in self.volumes:
+            if not os.path.isdir(volume):
+                # Creating it would put recordings on the root filesystem under an unmounted mount point
+                logger.warning(f"Storage volume {volume} does not exist, not recording to it")
+                self.throughput[volume] = 0
+                continue
+            try:
+                self.throughput[volume] = measure_write_throughput(volume)
+                logger.info(f"Storage volume {volume}: {self.throughput[volume] / (1024 * 1024):.0f} MB/s write")
+            except OSError as e:
+                logger.warning(f"Could not measure storage volume {volume}: {str(e)}")
+                self.throughput[volume] = 0
+
+    def usage_percent(self, volume):
+        usage = shutil.disk_usage(volume)
+        return usage.used * 100 / usage.total
+
+    def select(self, recorder):
+        """Choose the volume a recorder writes its next segments to"""
+        if len(self.volumes) == 1:
+            return self.primary
+
+        with self.lock:
+            load = {volume: 0 for volume in self.volumes}
+            for name, (volume, bytes_per_second) in self.assignments.items():
+                if name != recorder.name:
+                    load[volume] += bytes_per_second
+
+            best, best_score = self.primary, None
+            for volume in self.volumes:
+                try:
+                    used = self.usage_percent(volume)
+                except OSError as e:
+                    logger.warning(f"Storage volume {volume} unavailable: {str(e)}")
+                    continue
+                if used >= self.high_watermark:
+                    continue
+                headroom = max(self.throughput.get(volume, 0) - load[volume], 1)
+                score = headroom * (100 - used)
+                if best_score is None or score > best_score:
+                    best, best_score = volume, score
+
+            bitrate = recorder.stats.get('bitrate_kbps')
+            self.assignments[recorder.name] = (
+                best, bitrate * 1000 / 8 if bitrate else DEFAULT_CAMERA_BYTES_PER_SECOND
+            )
+        logger.info(f"Camera {recorder.name} records to storage volume {best}")
+        return best
+
+    def volume_of(self, path):
+        for volume in self.volumes:
+            if os.path.commonpath([os.path.abspath(volume), os.path.abspath(path)]) == os.path.abspath(volume):
+                return volume
+        return None
+
+    def relative(self, path):
+        """Logical path of a file, the same whichever volume it is stored on"""
+        return os.path.relpath(path, self.volume_of(path) or self.primary)
+
+    def resolve(self, relative):
+        """Map a logical path to the volume holding it, or None if it escapes the storage tree.
+
+        Paths that exist nowhere resolve to the primary volume.
+        """
+        candidates = []
+        for volume in self.volumes:
+            base = os.path.abspath(volume)
+            path = os.path.abspath(os.path.join(base, relative))
+            if os.path.commonpath([base, path]) != base:
+                return None
+            if os.path.exists(path):
+                return path
+            candidates.append(path)
+        return candidates[0]
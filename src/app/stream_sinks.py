@@ -0,0 +1,97 @@
+import os
+import logging
+import threading
+from metrics import SINK_BYTES_READ
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 64 * 1024
+
+# Fragmented MP4 written as a continuous stream, flushed every fragment so
+# consumers see data within a fraction of a second
+LIVE_MUXER_ARGS = [
+    '-f', 'mp4',
+    '-movflags', '+frag_keyframe+empty_moov+default_base_moof',
+    '-frag_duration', '500000',
+    '-flush_packets', '1'
+]
+
+class PipeSink:
+    """An extra output of a camera's single ffmpeg ingest, streamed over a pipe.
+
+    The ffmpeg process demuxes the RTSP stream once and writes every output
+    (segments, live copy, substream) from it, so the camera sees one client no
+    matter how many sinks exist. Each sink's pipe is always drained by a reader
+    thread; listeners are called with every chunk read, and with None once the
+    stream ends so they can drop state tied to that ffmpeg run.
+    """
+
+    def __init__(self, camera, name, output_args):
+        self.camera = camera
+        self.name = name
+        self.output_args = output_args
+        self.listeners = []
+        self.read_fd = None
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def open(self):
+        """Create the pipe and return the ffmpeg output arguments writing to it"""
+        self.read_fd, write_fd = os.pipe()
+        return write_fd, self.output_args + [f'pipe:{write_fd}']
+
+    def close(self):
+        if self.read_fd is not None:
+            os.close(self.read_fd)
+            self.read_fd = None
+
+    def start_reader(self):
+        read_fd, self.read_fd = self.read_fd, None
+        threading.Thread(target=self._read, args=(read_fd,), name=f'{self.camera}-{self.name}',
+                         daemon=True).start()
+
+    def _read(self, read_fd):
+        logger.debug(f"{self.name} sink reader started for camera: {self.camera}")
+        bytes_read = SINK_BYTES_READ.labels(self.camera, self.name)
+        try:
+            while True:
+                chunk = os.read(read_fd, READ_SIZE)
+                if not chunk:
+                    break
+                bytes_read.inc(len(chunk))
+                self._notify(chunk)
+        finally:
+            os.close(read_fd)
+            self._notify(None)
+        logger.debug(f"{self.name} sink reader stopped for camera: {self.camera}")
+
+    def _notify(self, chunk):
+        for callback in self.listeners:
+            try:
+                callback(chunk)
+            except Exception as e:
+                logger.error(f"{self.name} sink listener failed for {self.camera}: {str(e)}")
+
+def build_sinks(camera_config):
+    """Create the optional outputs configured for a camera besides the segment recorder"""
+    name = camera_config['name']
+    sinks = {}
+
+    if camera_config['live']:
+        # Copy of the main video stream for live viewing, no re-encoding
+        sinks['live'] = PipeSink(name, 'live', ['-map', '0:v:0', '-c:v', 'copy', '-an'] + LIVE_MUXER_ARGS)
+
+    if camera_config.get('substream_width'):
+        fps = camera_config['substream_fps']
+        sinks['substream'] = PipeSink(name, 'substream', [
+            '-map', '0:v:0',
+            '-vf', f"scale={camera_config['substream_width']}:-2,fps={fps}",
+            '-c:v', 'libx264', '-preset', 'veryfast', '-tune', 'zerolatency',
+            '-b:v', f"{camera_config['substream_bitrate_kbps']}k",
+            '-g', str(fps * 2),
+            '-threads', '1',
+            '-an'
+        ] + LIVE_MUXER_ARGS)
+
+    return sinks
@@ -0,0 +1,89 @@
+import os
+import logging
+import mimetypes
+from datetime import datetime, timezone
+from flask import Response, abort, request
+from werkzeug.http import http_date, is_resource_modified
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 256 * 1024
+
+def make_etag(stat):
+    return f"{stat.st_ino:x}-{stat.st_size:x}-{int(stat.st_mtime):x}"
+
+def read_range(f, start, length):
+    """Fallback body iterator used when the server has no zero-copy file wrapper"""
+    try:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+def if_range_matches(etag, last_modified):
+    """A stale If-Range validator means the client must get the whole file"""
+    if 'If-Range' not in request.headers:
+        return True
+    if_range = request.if_range
+    if if_range.etag is not None:
+        return if_range.etag == etag
+    return if_range.date is not None and last_modified <= if_range.date
+
+def send_video(path, max_age=86400):
+    """Send a video file with conditional request and single byte-range support.
+
+    The body is handed to the server's wsgi.file_wrapper positioned at the
+    start of the range, so servers that implement it with sendfile (gunicorn,
+    waitress) transmit the exact Content-Length without copying through
+    Python. Other servers fall back to chunked reads.
+    """
+    try:
+        f = open(path, 'rb')
+        stat = os.fstat(f.fileno())
+    except OSError:
+        abort(404)
+
+    size = stat.st_size
+    etag = make_etag(stat)
+    last_modified = datetime.fromtimestamp(int(stat.st_mtime), tz=timezone.utc)
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': f'"{etag}"',
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': f'private, max-age={max_age}'
+    }
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        f.close()
+        return Response(status=304, headers=headers)
+
+    start, length, status = 0, size, 200
+    byte_range = request.range
+    if byte_range and len(byte_range.ranges) == 1 and if_range_matches(etag, last_modified):
+        bounds = byte_range.range_for_length(size)
+        if bounds is None:
+            f.close()
+            headers['Content-Range'] = f'bytes */{size}'
+            return Response(status=416, headers=headers)
+        start, stop = bounds
+        length = stop - start
+        status = 206
+        headers['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+
+    headers['Content-Length'] = str(length)
+
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    if file_wrapper is not None:
+        f.seek(start)
+        body = file_wrapper(f, CHUNK_SIZE)
+    else:
+        body = read_range(f, start, length)
+
+    return Response(body, status=status, headers=headers, mimetype=mimetype, direct_passthrough=True)
@@ -0,0 +1,135 @@
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from metrics import HEALTH_CHECK_SECONDS
+
+logger = logging.getLogger(__name__)
+
+class RecorderSupervisor:
+    """Check all recorders concurrently and restart failed ones with per-camera backoff.
+
+    Runs on its own thread so slow or offline cameras never hold up the
+    scheduler loop in NVRSystem. The same worker pool starts the recorders
+    at boot, staggered by a random delay, and keeps retrying cameras that
+    are unreachable in the background until they record.
+    """
+
+    def __init__(self, recorders, interval=120, max_workers=8, base_backoff=30, max_backoff=600,
+                 startup_backoff=5):
+        self.recorders = recorders
+        self.interval = interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.startup_backoff = startup_backoff
+        self.startup_timers = {}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='supervisor')
+        self.failures = {name: 0 for name in recorders}
+        self.next_attempt = {name: 0 for name in recorders}
+        self.in_progress = set()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='recorder-supervisor', daemon=True)
+        self.thread.start()
+        logger.info(f"Recorder supervisor started, checking every {self.interval} seconds")
+
+    def start_all(self, jitter=2, started_at=None):
+        """Start every recorder concurrently, each after a random delay of up to jitter seconds"""
+        started_at = started_at or time.time()
+        for name, recorder in self.recorders.items():
+            recorder.startup_began = started_at
+            with self.lock:
+                # Health checks leave a camera alone until its first start succeeded
+                self.in_progress.add(name)
+            self._schedule_start(name, random.uniform(0, jitter), attempt=1)
+        logger.info(f"Starting {len(self.recorders)} recorder(s) with up to {jitter}s jitter")
+
+    def _schedule_start(self, name, delay, attempt):
+        timer = threading.Timer(delay, self._submit_start, (name, attempt))
+        timer.daemon = True
+        self.startup_timers[name] = timer
+        timer.start()
+
+    def _submit_start(self, name, attempt):
+        if not self.stop_event.is_set():
+            self.executor.submit(self._start_camera, name, attempt)
+
+    def _start_camera(self, name, attempt):
+        recorder = self.recorders[name]
+        try:
+            recorder.start()
+        except Exception as e:
+            logger.error(f"Failed to start camera {name}: {str(e)}")
+        if recorder.recording:
+            self.startup_timers.pop(name, None)
+            with self.lock:
+                self.in_progress.discard(name)
+            return
+
+        backoff = min(self.startup_backoff * 2 ** (attempt - 1), self.max_backoff)
+        logger.info(f"Camera {name} not started (attempt {attempt}), retrying in {backoff}s")
+        self._schedule_start(name, backoff, attempt + 1)
+
+    def stop(self):
+        self.stop_event.set()
+        for timer in list(self.startup_timers.values()):
+            timer.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        logger.debug("Recorder supervisor stopped")
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.check_all()
+            except Exception as e:
+                logger.error(f"Error in recorder supervisor: {str(e)}")
+
+    @HEALTH_CHECK_SECONDS.time()
+    def check_all(self):
+        """Run one health check pass over every camera in parallel"""
+        logger.debug("Starting health check for all cameras")
+        futures = []
+        for name in self.recorders:
+            with self.lock:
+                # A camera still being restarted from the previous pass is skipped
+                if name in self.in_progress:
+                    continue
+                self.in_progress.add(name)
+            futures.append(self.executor.submit(self._check_camera, name))
+
+        for future in futures:
+            future.result()
+        logger.debug("Health check pass complete")
+
+    def _check_camera(self, name):
+        recorder = self.recorders[name]
+        try:
+            logger.debug(f"Checking health for camera: {name}")
+            if recorder.is_healthy():
+                if self.failures[name]:
+                    logger.info(f"Camera {name} recovered after {self.failures[name]} failed check(s)")
+                self.failures[name] = 0
+                self.next_attempt[name] = 0
+                logger.debug(f"Camera {name} is healthy")
+                return
+
+            now = time.time()
+            if now < self.next_attempt[name]:
+                logger.debug(f"Camera {name} unhealthy, next restart in {self.next_attempt[name] - now:.0f}s")
+                return
+
+            self.failures[name] += 1
+            backoff = min(self.base_backoff * 2 ** (self.failures[name] - 1), self.max_backoff)
+            self.next_attempt[name] = now + backoff
+            logger.warning(f"Restarting unhealthy camera: {name} (attempt {self.failures[name]}, "
+                           f"next retry in {backoff}s)")
+            recorder.restart()
+        except Exception as e:
+            logger.error(f"Health check failed for {name}: {str(e)}")
+        finally:
+            with self.lock:
+                self.in_progress.discard(name)
@@ -0,0 +1,64 @@
+import os
+import logging
+import subprocess
+from segment_jobs import LOW_PRIORITY, SegmentJobQueue
+
+logger = logging.getLogger(__name__)
+
+POSTER_SUFFIX = '.poster.jpg'
+SPRITE_SUFFIX = '.sprite.jpg'
+SPRITE_TILES = 10
+POSTER_WIDTH = 320
+SPRITE_TILE_WIDTH = 160
+
+def poster_path(segment_path):
+    return os.path.splitext(segment_path)[0] + POSTER_SUFFIX
+
+def sprite_path(segment_path):
+    return os.path.splitext(segment_path)[0] + SPRITE_SUFFIX
+
+class ThumbnailPipeline(SegmentJobQueue):
+    """Extract a poster frame and a keyframe sprite sheet for every closed segment.
+
+    Segments are queued from the recorders' segment closed events and
+    processed by a small pool of worker threads. Only keyframes are decoded,
+    and the images are cached next to the segment file.
+    """
+
+    name = 'thumbnails'
+
+    def process(self, event):
+        self.generate(event['path'], event.get('duration'))
+
+    def generate(self, path, duration=None):
+        if not os.path.exists(path):
+            return
+
+        if not os.path.exists(poster_path(path)):
+            self._run_ffmpeg([
+                '-ss', str((duration or 0) / 2),
+                '-skip_frame', 'nokey',
+                '-i', path,
+                '-frames:v', '1',
+                '-vf', f'scale={POSTER_WIDTH}:-2',
+                '-q:v', '5',
+                poster_path(path)
+            ])
+
+        if duration and not os.path.exists(sprite_path(path)):
+            # Sample SPRITE_TILES keyframes evenly across the segment into one row
+            self._run_ffmpeg([
+                '-skip_frame', 'nokey',
+                '-i', path,
+                '-vf', f'fps={SPRITE_TILES}/{duration:.3f},scale={SPRITE_TILE_WIDTH}:-2,tile={SPRITE_TILES}x1',
+                '-frames:v', '1',
+                '-fps_mode', 'vfr',
+                '-q:v', '7',
+                sprite_path(path)
+            ])
+
+        logger.debug(f"Thumbnails ready for {path}")
+
+    def _run_ffmpeg(self, args):
+        cmd = LOW_PRIORITY + ['ffmpeg', '-hide_banner', '-y', '-loglevel', 'error', '-threads', '1'] + args
+        subprocess.run(cmd, check=True, capture_output=True, timeout=120)
@@ -0,0 +1,171 @@
+import os
+import time
+import tempfile
+import logging
+import subprocess
+from segment_index import probe_segment
+from segment_jobs import LOW_PRIORITY
+
+logger = logging.getLogger(__name__)
+
+# Profiles available without any configuration, overridable by transcode_profiles
+DEFAULT_PROFILES = {
+    'h264-720p': {'codec': 'libx264', 'preset': 'veryfast', 'width': 1280, 'bitrate_kbps': 2000, 'threads': 2},
+    'h264-1080p': {'codec': 'libx264', 'preset': 'veryfast', 'width': 1920, 'bitrate_kbps': 4000, 'threads': 4},
+    'h265-1080p': {'codec': 'libx265', 'preset': 'fast', 'width': 1920, 'bitrate_kbps': 2500, 'threads': 4},
+    # Quality-based, for re-encoding archived footage where size matters more than speed
+    'h265-archive': {'codec': 'libx265', 'preset': 'medium', 'crf': 28, 'threads': 1},
+}
+# Stream names reported by ffprobe for the encoders profiles usually use
+ENCODER_CODECS = {'libx264': 'h264', 'libx265': 'hevc', 'libsvtav1': 'av1', 'libaom-av1': 'av1',
+                  'libvpx-vp9': 'vp9'}
+PROFILE_DEFAULTS = {'codec': 'libx264', 'preset': 'veryfast', 'width': None, 'fps': None,
+                    'bitrate_kbps': None, 'crf': None, 'threads': 2}
+# Lowest -readrate passed to ffmpeg, so a tiny cap never rounds down to 0 (unthrottled)
+MIN_READRATE = 0.01
+# Seconds between forced keyframes, so transcoded segments still fragment regularly
+KEYFRAME_INTERVAL = 2
+
+def resolve_profile(camera_config, profiles):
+    """Return the transcoding profile of a camera, or None when it records in copy mode"""
+    name = camera_config.get('profile')
+    if name:
+        available = {**DEFAULT_PROFILES, **profiles}
+        if name not in available:
+            raise ValueError(f"Camera {camera_config['name']} uses unknown transcoding profile {name}")
+        return {**PROFILE_DEFAULTS, **available[name]}
+    if camera_config['codec'] != 'copy':
+        # Bare codec setting from older configs
+        return {**PROFILE_DEFAULTS, 'codec': camera_config['codec']}
+    return None
+
+def encoder_args(profile, threads):
+    """ffmpeg video encoding arguments for a profile, or stream copy without one"""
+    if profile is None:
+        return ['-c:v', 'copy']
+
+    args = ['-c:v', profile['codec'], '-preset', profile['preset'], '-threads', str(threads)]
+    filters = []
+    if profile['width']:
+        filters.append(f"scale='min({profile['width']},iw)':-2")
+    if profile['fps']:
+        filters.append(f"fps={profile['fps']}")
+    if filters:
+        args += ['-vf', ','.join(filters)]
+    if profile['crf'] is not None:
+        args += ['-crf', str(profile['crf'])]
+    if profile['bitrate_kbps']:
+        bitrate = profile['bitrate_kbps']
+        args += ['-b:v', f'{bitrate}k', '-maxrate', f'{bitrate}k', '-bufsize', f'{bitrate * 2}k']
+    return args + ['-force_key_frames', f'expr:gte(t,n_forced*{KEYFRAME_INTERVAL})']
+
+def readrate_args(segments, bytes_per_second):
+    """Throttle ffmpeg's input reads of the given segments to bytes_per_second"""
+    if not bytes_per_second:
+        return []
+
+    total_bytes = sum(s['size'] for s in segments)
+    media_seconds = sum(s['duration'] or (s['end_ts'] - s['start_ts']) for s in segments)
+    if total_bytes <= 0 or media_seconds <= 0:
+        return []
+
+    # -readrate is relative to real time, so convert bytes/s into a speed factor
+    readrate = bytes_per_second / (total_bytes / media_seconds)
+    if readrate < 1:
+        # Slower than real time is still honoured, the job just takes longer than the footage it reads
+        readrate = max(readrate, MIN_READRATE)
+        logger.warning(f"Bandwidth cap is below the recording bitrate, reading at {readrate:.2f}x real time")
+    return ['-readrate', f"{readrate:.2f}"]
+
+def transcode_segment(segment, output_args, segment_index, input_args=()):
+    """Re-encode a segment at idle priority and atomically swap it in.
+
+    The result must have the same duration as the original (within 2%) before
+    it replaces the file; the index row is refreshed and the new size returned.
+    """
+    path = segment['path']
+    # Unique per job, so concurrent jobs on the same file never clobber each other's output
+    fd, partial_file = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f"{os.path.basename(path)}.",
+                                        suffix='.part')
+    os.close(fd)
+    cmd = LOW_PRIORITY + [
+        'ffmpeg', '-hide_banner', '-y', '-loglevel', 'error',
+        *input_args,
+        '-i', path,
+        *output_args,
+        '-movflags', '+frag_keyframe+empty_moov+default_base_moof',
+        '-f', 'mp4',
+        partial_file
+    ]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True)
+        duration, codec = probe_segment(partial_file)
+        expected = segment['duration'] or (segment['end_ts'] - segment['start_ts'])
+        if not duration or abs(duration - expected) > max(2, expected * 0.02):
+            raise RuntimeError(f"transcoded duration {duration} does not match {expected:.1f}s")
+        os.replace(partial_file, path)
+    finally:
+        if os.path.exists(partial_file):
+            os.remove(partial_file)
+
+    segment_index.add_segment(segment['camera'], path, duration=duration, codec=codec)
+    return os.path.getsize(path)
+
+def plan_transcodes(cameras, profiles, cpu_budget):
+    """Decide how many encoder threads every transcoding camera gets within cpu_budget cores.
+
+    Substream encodes take one core each off the budget first. If the
+    requested threads do not fit, they are scaled down proportionally (at
+    least one each); cameras that do not fit even with one thread fall back
+    to copy mode. Returns {camera name: (profile or None, threads)}.
+    """
+    available = cpu_budget - sum(1 for camera in cameras if camera.get('substream_width'))
+    plan = {}
+    requested = {}
+    for camera in cameras:
+        profile = resolve_profile(camera, profiles)
+        plan[camera['name']] = (profile, 0)
+        if profile is not None:
+            requested[camera['name']] = profile['threads']
+
+    admitted = {}
+    for name, threads in requested.items():
+        if len(admitted) + 1 > available:
+            logger.warning(f"CPU budget of {cpu_budget} core(s) exhausted, camera {name} records in copy mode")
+            plan[name] = (None, 0)
+            continue
+        admitted[name] = threads
+
+    total = sum(admitted.values())
+    scale = min(1, available / total) if total else 1
+    for name, threads in admitted.items():
+        plan[name] = (plan[name][0], max(1, int(threads * scale)))
+        logger.info(f"Camera {name} transcodes with {plan[name][0]['codec']} on {plan[name][1]} thread(s)")
+    return plan
+
+def process_cpu_seconds(pid):
+    """User plus system CPU time consumed by a process, from /proc/<pid>/stat"""
+    with open(f'/proc/{pid}/stat') as f:
+        # The command name may contain spaces, fields are counted after it
+        fields = f.read().rpartition(')')[2].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+class CpuMeter:
+    """Average cores used by a process between two samples"""
+
+    def __init__(self):
+        self.pid = None
+        self.last = None
+
+    def sample(self, pid):
+        try:
+            cpu = process_cpu_seconds(pid)
+        except (OSError, ValueError, IndexError):
+            return None
+        now = time.monotonic()
+        previous, self.last = self.last, (cpu, now)
+        if pid != self.pid or previous is None:
+            self.pid = pid
+            return None
+        elapsed = now - previous[1]
+        return (cpu - previous[0]) / elapsed if elapsed > 0 else None
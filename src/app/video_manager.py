@@ -1,47 +1,138 @@
 import os
+import time
 import subprocess
 import logging
+import threading
 from datetime import datetime, timedelta
-import glob
+from metrics import CONCATENATION_SECONDS, CLEANUP_SECONDS
+from segment_index import recorded_spans, remove_sidecars
+from retention import RetentionEngine
+from transcoding import readrate_args, transcode_segment
 
 logger = logging.getLogger(__name__)
 
+def is_rollup(camera_name, path):
+    """Hourly and daily concatenations are prefixed with the camera name"""
+    return os.path.basename(path).startswith(f"{camera_name}_")
+
 class VideoManager:
-    def __init__(self, config):
-        self.retention_days = config['retention_days']
-        self.storage_path = config['storage_path']
-        self.recorders = {}
+    # Proxy transcodes per retention run; the rest stay in the index for the next day's run
+    TIER_PROXY_BATCH = 200
+    TIER_PROXY_SECONDS = 3600
 
-    def set_recorders(self, recorders):
-        self.recorders = recorders
+    def __init__(self, config, segment_index):
+        self.retention_days = config['retention_days']
+        # Full quality retention defaults to the overall retention, i.e. no tiering
+        self.full_retention_days = min(config.get('full_retention_days') or self.retention_days,
+                                       self.retention_days)
+        self.tier_mode = config['retention_tier_mode']
+        self.activity_threshold = config['activity_threshold']
+        self.storage_volumes = config['storage_volumes']
+        self.segment_index = segment_index
+        self.bandwidth_limit = config['concatenation_bandwidth_mb'] * 1024 * 1024
+        # Segment interval per camera, so roll-ups know when an hour is complete
+        self.intervals = {camera['name']: camera['interval'] for camera in config['cameras']}
+        self.stop_event = threading.Event()
+        self.rollup_thread = None
+        self.retention = RetentionEngine(self.storage_volumes, segment_index,
+                                         max_workers=config['cleanup_workers'],
+                                         unlink_rate_mb=config['cleanup_unlink_rate_mb'],
+                                         stop_event=self.stop_event)
 
+    @CONCATENATION_SECONDS.time()
     def concatenate_daily_videos(self, camera_name):
         yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-        date_dir = f"{self.storage_path}/{camera_name}/{yesterday}"
 
-        if not os.path.exists(date_dir):
-            logger.info(f"No directory found for {camera_name} on {yesterday}")
+        # Get all individual segment files and hourly roll-ups
+        segments = self.segment_index.list_segments(camera_name, yesterday)
+        if not segments:
+            logger.info(f"No recordings found for {camera_name} on {yesterday}")
             return
 
-        input_pattern = f"{date_dir}/*.mkv"
-        output_file = f"{date_dir}/{camera_name}_{yesterday}.mkv"
+        # A day can be split across storage volumes, the result goes next to its first segment
+        output_file = f"{os.path.dirname(segments[0]['path'])}/{camera_name}_{yesterday}.mp4"
+        video_segments = [s for s in segments if s['path'] != output_file]
 
-        # Get all individual segment files (exclude already concatenated files)
-        all_files = sorted(glob.glob(input_pattern))
-        video_files = [f for f in all_files
-                      if not f.endswith(f"{camera_name}_{yesterday}.mkv")]
+        logger.debug(f"Found {len(segments)} total files, {len(video_segments)} segment files to process")
 
-        logger.debug(f"Found {len(all_files)} total files, {len(video_files)} segment files to process")
-
-        if not video_files:
+        if not video_segments:
             logger.info(f"No videos to concatenate for {camera_name} on {yesterday}")
             return
 
+        if self._concatenate(camera_name, video_segments, output_file):
+            logger.info(f"Successfully concatenated videos for {camera_name} on {yesterday}")
+
+    def rollup_completed_hours(self, camera_name):
+        """Concatenate each finished hour of segments into an hourly roll-up file"""
+        interval = self.intervals.get(camera_name, 300)
+        # Only hours whose last segment has certainly closed are rolled up
+        cutoff = datetime.now() - timedelta(seconds=interval + 60)
+        cutoff_hour = cutoff.replace(minute=0, second=0, microsecond=0)
+
+        hours = {}
+        for segment in self.segment_index.segments_before(cutoff_hour.timestamp(), camera_name):
+            if is_rollup(camera_name, segment['path']):
+                continue
+            hour = datetime.fromtimestamp(segment['start_ts']).strftime('%H')
+            hours.setdefault((segment['date'], hour), []).append(segment)
+
+        for (date, hour), video_segments in sorted(hours.items()):
+            if self.stop_event.is_set():
+                return
+            output_file = f"{os.path.dirname(video_segments[0]['path'])}/{camera_name}_{date}_{hour}-00-00.mp4"
+            if self._concatenate(camera_name, video_segments, output_file):
+                logger.info(f"Rolled up {len(video_segments)} segment(s) for {camera_name} on {date} {hour}:00")
+
+    def start_incremental_concatenation(self, check_interval=300):
+        """Roll up finished hours for all cameras on a background thread"""
+        self.rollup_thread = threading.Thread(
+            target=self._run_incremental_concatenation, args=(check_interval,),
+            name='incremental-concatenation', daemon=True
+        )
+        self.rollup_thread.start()
+        logger.info("Incremental hourly concatenation started")
+
+    def _run_incremental_concatenation(self, check_interval):
+        self.resume_concatenation()
+        while not self.stop_event.is_set():
+            for camera_name in self.intervals:
+                try:
+                    self.rollup_completed_hours(camera_name)
+                except Exception as e:
+                    logger.error(f"Hourly roll-up failed for {camera_name}: {str(e)}")
+            self.stop_event.wait(check_interval)
+
+    def resume_concatenation(self):
+        """Finish concatenations that were interrupted after ffmpeg completed"""
+        for rollup in self.segment_index.pending_rollups():
+            output_file = rollup['output']
+            partial_file = f"{output_file}.part"
+            logger.info(f"Resuming interrupted concatenation: {output_file}")
+            if os.path.exists(partial_file):
+                os.replace(partial_file, output_file)
+            if os.path.exists(output_file):
+                self._finish_concatenation(rollup['camera'], rollup['sources'], output_file)
+            else:
+                self.segment_index.finish_rollup(output_file)
+
+    def _concatenate(self, camera_name, video_segments, output_file):
+        """Stream-copy segments into output_file, then replace the sources with it.
+
+        ffmpeg writes to a .part file which is journalled in the segment index
+        before being renamed, so a crash at any point either leaves the
+        sources untouched or is completed by resume_concatenation().
+        """
+        sources = [s['path'] for s in video_segments]
+        if os.path.exists(output_file):
+            # Extend an existing roll-up instead of overwriting it
+            sources.insert(0, output_file)
+        partial_file = f"{output_file}.part"
+        filelist_path = f"/tmp/filelist_{camera_name}_{os.path.basename(output_file)}.txt"
+
         try:
             # Create file list for ffmpeg
-            filelist_path = f"/tmp/filelist_{camera_name}_{yesterday}.txt"
             with open(filelist_path, 'w') as f:
-                for video in video_files:
+                for video in sources:
                     f.write(f"file '{os.path.abspath(video)}'\n")
 
             # Concatenate videos with low I/O priority
@@ -52,67 +143,134 @@ class VideoManager:
                 'ffmpeg',
                 '-hide_banner', '-y',
                 '-loglevel', 'error',
+                *readrate_args(video_segments, self.bandwidth_limit),
                 '-f', 'concat',
                 '-safe', '0',
                 '-i', filelist_path,
                 '-c', 'copy',
-                output_file
+                '-movflags', '+frag_keyframe+empty_moov+default_base_moof',
+                '-f', 'mp4',
+                partial_file
             ]
 
             logger.debug(f"FFmpeg concatenation command: {' '.join(cmd)}")
 
             subprocess.run(cmd, check=True)
-            logger.info(f"Successfully concatenated videos for {camera_name} on {yesterday}")
 
-            # Clean up individual segments after successful concatenation
-            logger.debug(f"Cleaning up {len(video_files)} individual segment files")
-            for video in video_files:
-                os.remove(video)
-
-            # Clean up filelist
-            os.remove(filelist_path)
+            self.segment_index.begin_rollup(output_file, camera_name, sources)
+            os.replace(partial_file, output_file)
+            self._finish_concatenation(camera_name, sources, output_file)
+            return True
 
         except Exception as e:
             logger.error(f"Failed to concatenate videos for {camera_name}: {str(e)}")
-            # Clean up filelist on error
+            if os.path.exists(partial_file):
+                os.remove(partial_file)
+            return False
+
+        finally:
+            # Clean up filelist
             if os.path.exists(filelist_path):
                 os.remove(filelist_path)
 
+    def _finish_concatenation(self, camera_name, sources, output_file):
+        # Keep when each joined recording was made, gaps between them are not in the file
+        spans = []
+        for video in sources:
+            row = self.segment_index.get_segment(video)
+            if row:
+                spans += recorded_spans(row)
+
+        # Clean up individual segments after successful concatenation
+        sources = [video for video in sources if video != output_file]
+        duration = self.segment_index.total_duration(sources + [output_file])
+        activity = self.segment_index.max_activity(sources + [output_file])
+        logger.debug(f"Cleaning up {len(sources)} individual segment files")
+        for video in sources:
+            if os.path.exists(video):
+                os.remove(video)
+            remove_sidecars(video)
+        self.segment_index.remove_segments(sources)
+        self.segment_index.add_segment(camera_name, output_file, duration=duration)
+        if activity is not None:
+            self.segment_index.set_activity(output_file, activity)
+        if spans:
+            self.segment_index.set_spans(output_file, spans)
+        self.segment_index.finish_rollup(output_file)
+
+    @CLEANUP_SECONDS.time()
     def cleanup_old_recordings(self):
         cutoff_date = datetime.now() - timedelta(days=self.retention_days)
         logger.info(f"Cleaning up recordings older than {cutoff_date.strftime('%Y-%m-%d')}")
 
-        removed_count = 0
-        storage_dirs = glob.glob('{self.storage_path}/*/')
-        logger.debug(f"Found {len(storage_dirs)} camera directories in {self.storage_path}/")
+        report = self.retention.sweep(cutoff_date)
+
+        if not self.stop_event.is_set():
+            # Drop index rows of expired segments whose files were already gone
+            cutoff_day = cutoff_date.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+            stale = self.segment_index.segments_before(cutoff_day.timestamp())
+            self.segment_index.remove_segments([segment['path'] for segment in stale])
 
-        for camera_dir in storage_dirs:
-            camera_name = os.path.basename(camera_dir.rstrip('/'))
-            logger.debug(f"Processing camera directory: {camera_dir} (camera: {camera_name})")
+        if report['files'] == 0:
+            logger.info("No old recordings found to delete")
+        else:
+            logger.info(f"Removed {report['files']} expired file(s), "
+                        f"{report['bytes'] / (1024 * 1024):.1f} MB from {report['cameras']} camera(s) "
+                        f"in {report['seconds']:.1f}s")
 
-            date_dirs = glob.glob(f"{camera_dir}*/")
-            logger.debug(f"Found {len(date_dirs)} date directories for camera {camera_name}")
+        if self.full_retention_days < self.retention_days:
+            self.apply_retention_tiers()
 
-            for date_dir in date_dirs:
-                dir_name = os.path.basename(date_dir.rstrip('/'))
-                logger.debug(f"Processing date directory: {date_dir} (date: {dir_name})")
+    def apply_retention_tiers(self):
+        """Thin out footage older than full_retention_days that showed no activity.
 
-                try:
-                    dir_date = datetime.strptime(dir_name, '%Y-%m-%d')
-                    if dir_date < cutoff_date:
-                        logger.debug(f"Directory {date_dir} is older than cutoff, removing")
-                        # Remove all files in the directory
-                        for file_path in glob.glob(f"{date_dir}*"):
-                            os.remove(file_path)
-                        # Remove the directory
-                        os.rmdir(date_dir)
-                        logger.info(f"Removed old recordings: {date_dir}")
-                        removed_count += 1
-                    else:
-                        logger.debug(f"Directory {date_dir} is within retention period, keeping")
-                except (ValueError, OSError) as e:
-                    logger.warning(f"Could not process directory {date_dir}: {str(e)}")
-                    continue
-
-        if removed_count == 0:
-            logger.info("No old recordings found to delete")
+        Segments whose analysed peak activity stayed below the threshold are
+        either deleted or replaced by a low-bitrate proxy, depending on
+        retention_tier_mode. Segments with activity, and segments that were
+        never analysed, keep full quality until retention_days.
+
+        Proxy transcodes are bounded per run by TIER_PROXY_BATCH and
+        TIER_PROXY_SECONDS so a large backlog (e.g. right after tiering is
+        enabled) is worked off over several days instead of in one run.
+        """
+        tier_date = datetime.now() - timedelta(days=self.full_retention_days)
+        tier_cutoff = tier_date.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        proxy = self.tier_mode == 'proxy'
+        candidates = self.segment_index.inactive_segments_before(tier_cutoff.timestamp(), self.activity_threshold,
+                                                                 limit=self.TIER_PROXY_BATCH if proxy else -1)
+        logger.info(f"Applying retention tier to {len(candidates)} inactive segment(s) "
+                    f"older than {tier_date.strftime('%Y-%m-%d')} ({self.tier_mode})")
+
+        freed = 0
+        deadline = time.monotonic() + self.TIER_PROXY_SECONDS
+        for i, segment in enumerate(candidates):
+            if self.stop_event.is_set():
+                break
+            if proxy and time.monotonic() >= deadline:
+                logger.info(f"Retention tier time budget used, {len(candidates) - i} segment(s) left for the next run")
+                break
+            try:
+                if proxy:
+                    freed += segment['size'] - self._replace_with_proxy(segment)
+                else:
+                    os.remove(segment['path'])
+                    remove_sidecars(segment['path'])
+                    self.segment_index.remove_segment(segment['path'])
+                    freed += segment['size']
+            except Exception as e:
+                logger.warning(f"Could not apply retention tier to {segment['path']}: {str(e)}")
+
+        logger.info(f"Retention tiering freed {freed / (1024 * 1024):.1f} MB")
+
+    def _replace_with_proxy(self, segment):
+        """Transcode a segment to a small proxy and atomically swap it in, returning the new size"""
+        size = transcode_segment(segment, [
+            '-an',
+            '-vf', 'scale=-2:360,fps=5',
+            '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '32', '-threads', '1'
+        ], self.segment_index)
+        self.segment_index.set_proxy(segment['path'])
+        return size
+
+    def stop(self):
+        self.stop_event.set()
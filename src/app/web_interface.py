@@ -2,9 +2,22 @@ import os
 import logging
 import hashlib
 import secrets
+import time
+import json
+import base64
+from flask import Flask, Response, g, jsonify, send_from_directory, render_template_string, abort, request, redirect, url_for, session, flash
 from datetime import datetime
-from flask import Flask, send_from_directory, render_template_string, abort, request, redirect, url_for, session, flash
 from functools import wraps
+from metrics import REQUEST_SECONDS, VIDEO_BYTES_SERVED, render_metrics
+from playlist import build_hls_playlist, read_init_section
+from streaming import send_video
+from thumbnails import poster_path, sprite_path
+from activity import query_activity, day_profile
+from config import LIVE_SOCKET_PATH
+from live import codec_string, open_live_stream, trigger_event
+from storage_pool import StoragePool
+from api_cache import IndexCache
+from clip_export import ClipExporter, export_filename, local_time
 
 logger = logging.getLogger(__name__)
 
@@ -127,7 +140,7 @@ HTML_TEMPLATES = {
                 {% if cameras %}
                 <ul>
                     {% for camera in cameras %}
-                    <li><a href="/{{ camera }}/">{{ camera }}</a></li>
+                    <li><a href="/{{ camera }}/">{{ camera }}</a> &middot; <a href="/live/{{ camera }}">Live</a></li>
                     {% endfor %}
                 </ul>
                 {% else %}
@@ -205,12 +218,19 @@ HTML_TEMPLATES = {
                 .video-item { padding: 20px; background: #f8f9fa; border-radius: 8px; transition: all 0.2s ease; border: 1px solid #e9ecef; }
                 .video-item:hover { background: #e9ecef; transform: translateY(-2px); box-shadow: 0 2px 8px rgba(0,0,0,0.1); }
                 .video-link { color: #1a73e8; text-decoration: none; display: block; }
+                .poster { width: 100%; aspect-ratio: 16 / 9; object-fit: cover; border-radius: 4px; background: #dde1e6; margin-bottom: 8px; display: block; }
+                .sprite { width: 100%; border-radius: 4px; margin-bottom: 8px; display: block; }
                 .video-title {font-weight: 600; font-size: 1.1em; margin-bottom: 8px; color: #2c3e50; }
                 .timestamp { color: #666; font-size: 0.9em; margin-bottom: 8px; }
                 .filename { color: #888; font-size: 0.8em; word-break: break-all; font-family: monospace; background: #fff; padding: 4px; border-radius: 4px; }
                 .empty-message {  text-align: center;  color: #666;  padding: 40px; background: #f8f9fa; border-radius: 8px; }
                 .video-icon { display: inline-block; width: 24px; height: 24px; margin-right: 8px; vertical-align: middle; }
                 .meta-info { display: flex; align-items: center; margin-bottom: 8px; }
+                .play-day { display: inline-block; margin-bottom: 20px; padding: 10px 16px; background: #1a73e8; color: white; border-radius: 4px; text-decoration: none; font-weight: 500; }
+                .play-day:hover { background: #0f62fe; }
+                .activity { margin-bottom: 20px; }
+                .activity canvas { width: 100%; height: 40px; background: #f8f9fa; border-radius: 4px; cursor: pointer; display: block; }
+                .activity-scale { display: flex; justify-content: space-between; color: #888; font-size: 0.8em; margin-top: 4px; }
             </style>
         </head>
         <body>
@@ -226,10 +246,39 @@ HTML_TEMPLATES = {
 
                 <h1>{{ camera }} - {{ date }}</h1>
                 {% if videos %}
+                <a href="/{{ camera }}/{{ date }}/play" class="play-day">&#9654; Play whole day</a>
+                {% if activity_enabled %}
+                <div class="activity">
+                    <canvas id="activity" width="1440" height="40" title="Click to jump to activity"></canvas>
+                    <div class="activity-scale"><span>00:00</span><span>06:00</span><span>12:00</span><span>18:00</span><span>24:00</span></div>
+                </div>
+                <script>
+                    var starts = {{ starts | tojson }};
+                    var canvas = document.getElementById('activity');
+                    fetch('/api/activity/{{ camera }}/{{ date }}/profile').then(function (r) { return r.json(); }).then(function (data) {
+                        var ctx = canvas.getContext('2d');
+                        data.profile.forEach(function (peak, minute) {
+                            if (peak < 0) { return; }
+                            var h = Math.max(2, peak / 254 * canvas.height);
+                            ctx.fillStyle = peak >= data.threshold ? '#d93025' : '#9aa0a6';
+                            ctx.fillRect(minute, canvas.height - h, 1, h);
+                        });
+                    });
+                    canvas.addEventListener('click', function (e) {
+                        // Open the last segment that started before the clicked second
+                        var second = Math.floor((e.offsetX / canvas.clientWidth) * 86400);
+                        var target = null;
+                        starts.forEach(function (s) { if (s[0] <= second) { target = s[1]; } });
+                        if (target) { window.location = '/{{ camera }}/{{ date }}/' + target; }
+                    });
+                </script>
+                {% endif %}
                 <ul class="video-grid">
                     {% for video in videos %}
                     <li class="video-item">
                         <a href="/{{ camera }}/{{ date }}/{{ video }}" class="video-link">
+                            <img class="poster" src="/poster/{{ camera }}/{{ date }}/{{ video }}" loading="lazy" alt="" onerror="this.style.visibility='hidden'">
+                            <img class="sprite" src="/sprite/{{ camera }}/{{ date }}/{{ video }}" loading="lazy" alt="" onerror="this.remove()">
                             <div class="meta-info">
                                 <svg class="video-icon" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
                                     <path d="M15 10l4.553-2.276A1 1 0 0121 8.618v6.764a1 1 0 01-1.447.894L15 14M5 18h8a2 2 0 002-2V8a2 2 0 00-2-2H5a2 2 0 00-2 2v8a2 2 0 002 2z" />
@@ -237,7 +286,7 @@ HTML_TEMPLATES = {
                                 <div class="video-title">Recording {{ loop.index }}</div>
                             </div>
                             <div class="timestamp">
-                                {% set time = video.split('_')[1].split('.')[0].replace('-', ':') %}
+                                {% set time = video.split('.')[0].rsplit('_', 1)[-1].replace('-', ':') %}
                                 {{ time }}
                             </div>
                             <div class="filename">{{ video }}</div>
@@ -253,6 +302,286 @@ HTML_TEMPLATES = {
         </html>
     ''',
 
+    'live_player': '''
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <title>{{ camera }} - Live</title>
+            <style>
+                body { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; margin: 20px; background-color: #f0f2f5; }
+                .container { max-width: 1000px; margin: 0 auto; background: white; padding: 30px; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
+                .header { display: flex; justify-content: space-between; align-items: center; margin-bottom: 20px; }
+                .logout { color: #666; text-decoration: none; font-size: 0.9em; }
+                .logout:hover { text-decoration: underline; }
+                .breadcrumb { color: #666; margin-bottom: 20px; font-size: 0.95em; }
+                .breadcrumb a { color: #1a73e8; text-decoration: none; }
+                .breadcrumb a:hover { text-decoration: underline; }
+                h1 { color: #1a73e8; margin-bottom: 25px; }
+                .video-container { margin-top: 20px; display: flex; justify-content: center; }
+                video { width: 100%; max-width: 800px; border-radius: 4px; background: black; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
+                .status { text-align: center; color: #666; margin-top: 10px; font-size: 0.9em; }
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <div class="breadcrumb">
+                        <a href="/">Cameras</a> &gt;
+                        <a href="/{{ camera }}/">{{ camera }}</a> &gt;
+                        Live
+                    </div>
+                    <a href="/logout" class="logout">Logout</a>
+                </div>
+
+                <h1>{{ camera }} - Live</h1>
+                <div class="video-container">
+                    <video id="player" autoplay muted playsinline></video>
+                </div>
+                <div class="status" id="status">Connecting...</div>
+            </div>
+            <script>
+                var video = document.getElementById('player');
+                var statusEl = document.getElementById('status');
+
+                function connect() {
+                    fetch('{{ stream_url }}').then(function(response) {
+                        var codecs = response.headers.get('X-Codecs');
+                        if (!response.ok || !codecs) {
+                            throw new Error('Live view not available');
+                        }
+                        var mediaSource = new MediaSource();
+                        video.src = URL.createObjectURL(mediaSource);
+                        mediaSource.addEventListener('sourceopen', function() {
+                            var buffer = mediaSource.addSourceBuffer('video/mp4; codecs="' + codecs + '"');
+                            var reader = response.body.getReader();
+                            var queue = [];
+                            function append() {
+                                if (buffer.updating || !queue.length) return;
+                                // Stay close to the live edge and drop what has been played
+                                if (buffer.buffered.length) {
+                                    var end = buffer.buffered.end(buffer.buffered.length - 1);
+                                    if (end - video.currentTime > 3) video.currentTime = end - 0.5;
+                                    if (video.currentTime - buffer.buffered.start(0) > 30) {
+                                        buffer.remove(0, video.currentTime - 10);
+                                        return;
+                                    }
+                                }
+                                buffer.appendBuffer(queue.shift());
+                            }
+                            buffer.addEventListener('updateend', append);
+                            function read() {
+                                reader.read().then(function(result) {
+                                    if (result.done) throw new Error('Stream ended');
+                                    queue.push(result.value);
+                                    append();
+                                    statusEl.textContent = 'Live';
+                                    read();
+                                }).catch(retry);
+                            }
+                            read();
+                        });
+                    }).catch(retry);
+                }
+
+                function retry(error) {
+                    statusEl.textContent = error.message + ', reconnecting...';
+                    setTimeout(connect, 2000);
+                }
+
+                connect();
+            </script>
+        </body>
+        </html>
+    ''',
+    'day_player': '''
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <title>{{ camera }} - {{ date }}</title>
+            <style>
+                body { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; margin: 20px; background-color: #f0f2f5; }
+                .container { max-width: 1000px; margin: 0 auto; background: white; padding: 30px; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
+                .header { display: flex; justify-content: space-between; align-items: center; margin-bottom: 20px; }
+                .logout { color: #666; text-decoration: none; font-size: 0.9em; }
+                .logout:hover { text-decoration: underline; }
+                .breadcrumb { color: #666; margin-bottom: 20px; font-size: 0.95em; }
+                .breadcrumb a { color: #1a73e8; text-decoration: none; }
+                .breadcrumb a:hover { text-decoration: underline; }
+                h1 { color: #1a73e8; margin-bottom: 25px; }
+                .back-link { display: inline-block; margin-bottom: 20px; color: #1a73e8; text-decoration: none; font-weight: 500; }
+                .back-link:hover { text-decoration: underline; }
+                .video-container { margin-top: 20px; display: flex; justify-content: center; }
+                video { width: 100%; max-width: 800px; border-radius: 4px; background: black; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
+                .status { text-align: center; color: #666; margin-top: 10px; font-size: 0.9em; }
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <div class="breadcrumb">
+                        <a href="/">Cameras</a> &gt;
+                        <a href="/{{ camera }}/">{{ camera }}</a> &gt;
+                        <a href="/{{ camera }}/{{ date }}/">{{ date }}</a> &gt;
+                        Whole day
+                    </div>
+                    <a href="/logout" class="logout">Logout</a>
+                </div>
+
+                <a href="/{{ camera }}/{{ date }}/" class="back-link">&larr; Back to list</a>
+
+                <h1>{{ camera }} - {{ date }}</h1>
+                <div class="video-container">
+                    <video id="player" controls preload="metadata"></video>
+                </div>
+                <div class="status" id="status"></div>
+            </div>
+            <script>
+                var video = document.getElementById('player');
+                var statusEl = document.getElementById('status');
+                var source = '{{ playlist_url }}';
+
+                function byteRange(value) {
+                    var parts = value.split('@');
+                    var offset = parseInt(parts[1] || '0', 10);
+                    return 'bytes=' + offset + '-' + (offset + parseInt(parts[0], 10) - 1);
+                }
+
+                // Parts of the playlist with their init section and position on the day's timeline
+                function parsePlaylist(text) {
+                    var parts = [], map = null, range = null, duration = 0, time = 0;
+                    text.split(/\\r?\\n/).forEach(function(line) {
+                        if (line.indexOf('#EXT-X-MAP:') === 0) {
+                            var match = /URI="([^"]+)",BYTERANGE="([^"]+)"/.exec(line);
+                            map = {url: match[1], range: byteRange(match[2])};
+                        } else if (line.indexOf('#EXTINF:') === 0) {
+                            duration = parseFloat(line.substring(8));
+                        } else if (line.indexOf('#EXT-X-BYTERANGE:') === 0) {
+                            range = byteRange(line.substring(17));
+                        } else if (line && line.charAt(0) !== '#') {
+                            parts.push({url: line, range: range, map: map, start: time, duration: duration});
+                            time += duration;
+                        }
+                    });
+                    return parts;
+                }
+
+                function fetchRange(url, range) {
+                    return fetch(url, {headers: {Range: range}}).then(function(response) {
+                        if (!response.ok) throw new Error('Could not load recording (' + response.status + ')');
+                        return response.arrayBuffer();
+                    });
+                }
+
+                // Browsers without native HLS play the same playlist through Media Source Extensions
+                function play(parts, codecs) {
+                    var mediaSource = new MediaSource();
+                    video.src = URL.createObjectURL(mediaSource);
+                    mediaSource.addEventListener('sourceopen', function() {
+                        if (mediaSource.sourceBuffers.length) return;
+                        var buffer = mediaSource.addSourceBuffer('video/mp4; codecs="' + codecs + '"');
+                        // Every file starts its own timeline, sequence mode lays the parts out back to back
+                        buffer.mode = 'sequence';
+                        var last = parts[parts.length - 1];
+                        mediaSource.duration = last.start + last.duration;
+                        var next = 0, map = null, loading = false, seekTo = null;
+
+                        function update(change) {
+                            return new Promise(function(resolve, reject) {
+                                function done(event) {
+                                    buffer.removeEventListener('updateend', done);
+                                    buffer.removeEventListener('error', done);
+                                    if (event.type === 'error') reject(new Error('Could not play recording'));
+                                    else resolve();
+                                }
+                                buffer.addEventListener('updateend', done);
+                                buffer.addEventListener('error', done);
+                                change();
+                            });
+                        }
+
+                        function appendPart() {
+                            var part = parts[next];
+                            var init = part.map === map ? Promise.resolve() :
+                                fetchRange(part.map.url, part.map.range).then(function(data) {
+                                    return update(function() { buffer.appendBuffer(data); });
+                                });
+                            return init.then(function() {
+                                map = part.map;
+                                return fetchRange(part.url, part.range);
+                            }).then(function(data) {
+                                return update(function() { buffer.appendBuffer(data); });
+                            }).then(function() {
+                                next++;
+                            });
+                        }
+
+                        function reposition() {
+                            var target = seekTo;
+                            seekTo = null;
+                            next = 0;
+                            while (next < parts.length - 1 && parts[next].start + parts[next].duration <= target) next++;
+                            map = null;
+                            return update(function() { buffer.remove(0, mediaSource.duration); }).then(function() {
+                                buffer.timestampOffset = parts[next].start;
+                            });
+                        }
+
+                        // Keep about 30 seconds buffered ahead of the playhead
+                        function load() {
+                            if (loading || buffer.updating) return;
+                            if (seekTo === null) {
+                                if (next >= parts.length) {
+                                    if (mediaSource.readyState === 'open') mediaSource.endOfStream();
+                                    return;
+                                }
+                                var ranges = buffer.buffered;
+                                if (ranges.length && ranges.end(ranges.length - 1) - video.currentTime > 30) return;
+                            }
+                            loading = true;
+                            (seekTo === null ? appendPart() : reposition()).then(function() {
+                                loading = false;
+                                load();
+                            }, function(error) {
+                                loading = false;
+                                statusEl.textContent = error.message;
+                            });
+                        }
+
+                        video.addEventListener('timeupdate', load);
+                        video.addEventListener('seeking', function() {
+                            var ranges = buffer.buffered;
+                            for (var i = 0; i < ranges.length; i++) {
+                                if (video.currentTime >= ranges.start(i) && video.currentTime < ranges.end(i)) return;
+                            }
+                            seekTo = video.currentTime;
+                            load();
+                        });
+                        load();
+                    });
+                }
+
+                if (video.canPlayType('application/vnd.apple.mpegurl')) {
+                    video.src = source;
+                } else if (!window.MediaSource) {
+                    statusEl.textContent = 'This browser cannot play recordings';
+                } else {
+                    fetch(source).then(function(response) {
+                        var codecs = response.headers.get('X-Codecs');
+                        if (!response.ok || !codecs) throw new Error('No recordings to play');
+                        return response.text().then(function(text) {
+                            var parts = parsePlaylist(text);
+                            if (!parts.length) throw new Error('No recordings to play');
+                            play(parts, codecs);
+                        });
+                    }).catch(function(error) {
+                        statusEl.textContent = error.message;
+                    });
+                }
+            </script>
+        </body>
+        </html>
+    ''',
+
     'video_player': '''
         <!DOCTYPE html>
         <html>
@@ -301,17 +630,67 @@ HTML_TEMPLATES = {
     '''
 }
 
-def create_web_server(config):
+def load_secret_key(secret_key_file):
+    try:
+        with open(secret_key_file, 'r') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        secret_key = secrets.token_hex(16)
+        os.makedirs(os.path.dirname(secret_key_file), exist_ok=True)
+        # O_EXCL so concurrently starting workers agree on the first key written
+        try:
+            fd = os.open(secret_key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            return load_secret_key(secret_key_file)
+        with os.fdopen(fd, 'w') as f:
+            f.write(secret_key)
+        return secret_key
+
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+
+def encode_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor, raises ValueError for a malformed cursor"""
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def decode_date_cursor(cursor):
+    """Cursor of the date listing: the last date of the previous page"""
+    date = decode_cursor(cursor)
+    if not isinstance(date, str):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return date
+
+def decode_segment_cursor(cursor):
+    """Cursor of the segment listing: (start_ts, path) of the last segment of the previous page"""
+    value = decode_cursor(cursor)
+    if (not isinstance(value, list) or len(value) != 2 or isinstance(value[0], bool)
+            or not isinstance(value[0], (int, float)) or not isinstance(value[1], str)):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return value[0], value[1]
+
+def create_web_server(config, segment_index):
     app = Flask(__name__)
     base_storage = config['storage_path']
+    storage = StoragePool(config['storage_volumes'])
+    api_cache = IndexCache(segment_index)
+    exporter = ClipExporter(segment_index, max_concurrent=config['export_max_concurrent'])
+    configured_cameras = [camera['name'] for camera in config['cameras']]
     config_dir = config['config_path']
 
     # Store auth files in persistent config directory
     auth_file = os.path.join(config_dir, 'auth.dat')
     reset_key_file = os.path.join(config_dir, 'password_reset.key')
 
-    # Set secret key for session
-    app.secret_key = secrets.token_hex(16)
+    # Set secret key for session, persisted so every web worker accepts the same sessions
+    app.secret_key = load_secret_key(os.path.join(config_dir, 'secret.key'))
+    # Lets doorbells and other webhooks trigger event clips without a browser session
+    event_token = load_secret_key(os.path.join(config_dir, 'event_token.key'))
 
     # Suppress Flask internal logs and development server warning
     app.logger.disabled = True
@@ -319,10 +698,11 @@ def create_web_server(config):
     app.config['PROPAGATE_EXCEPTIONS'] = True
 
     def get_safe_path(*parts):
-        sanitized = os.path.normpath(os.path.join(*parts)).lstrip('/')
-        if '..' in sanitized or not sanitized.startswith('storage/'):
+        # Anything resolving outside the storage volumes is rejected
+        path = storage.resolve(os.path.join(*parts))
+        if path is None:
             abort(404)
-        return os.path.join('./', sanitized)
+        return path
 
     def is_setup_required():
         return not os.path.exists(auth_file)
@@ -361,6 +741,19 @@ def create_web_server(config):
             return f(*args, **kwargs)
         return decorated_function
 
+    def token_or_login_required(f):
+        """Accept a logged-in session, or the event token as a Bearer header or ?token= parameter"""
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if 'authenticated' in session:
+                return f(*args, **kwargs)
+            header = request.headers.get('Authorization', '')
+            token = header[7:] if header.startswith('Bearer ') else request.args.get('token', '')
+            if not secrets.compare_digest(token.encode('utf-8'), event_token.encode('utf-8')):
+                abort(401)
+            return f(*args, **kwargs)
+        return decorated_function
+
     @app.route('/forgot_password')
     def forgot_password():
         # Generate a random reset key
@@ -455,41 +848,37 @@ def create_web_server(config):
     @app.route('/')
     @login_required
     def root():
-        cameras = [name for name in os.listdir(base_storage)
-                 if os.path.isdir(os.path.join(base_storage, name)) and name != 'auth.dat']
+        cameras = sorted(set(configured_cameras) | set(segment_index.list_cameras()))
         return render_template_string(HTML_TEMPLATES['camera_list'], cameras=cameras)
 
     @app.route('/<camera>/')
     @login_required
     def camera_dates(camera):
-        path = get_safe_path(base_storage, camera)
-        all_items = os.listdir(path)
-        # Filter and sort dates
-        dates = sorted(
-            [d for d in all_items
-             if os.path.isdir(os.path.join(path, d)) and d != 'raw'],
-            key=lambda x: datetime.strptime(x, '%Y-%m-%d'),
-            reverse=True
-        )
+        get_safe_path(camera)
+        # Dates come back newest first from the segment index
+        dates = segment_index.list_dates(camera)
         return render_template_string(HTML_TEMPLATES['date_list'], camera=camera, dates=dates)
 
     @app.route('/<camera>/<date>/')
     @login_required
     def date_videos(camera, date):
-        path = get_safe_path(base_storage, camera, date)
-        videos = sorted(
-            [v for v in os.listdir(path) if v.endswith('.mp4')],
-            key=lambda x: x.split('.')[0],
-            reverse=False
-        )
+        get_safe_path(camera, date)
+        try:
+            day_start = datetime.strptime(date, '%Y-%m-%d').timestamp()
+        except ValueError:
+            abort(404)
+        segments = segment_index.list_segments(camera, date)
+        videos = [os.path.basename(s['path']) for s in segments]
+        starts = [[int(s['start_ts'] - day_start), os.path.basename(s['path'])] for s in segments]
         return render_template_string(HTML_TEMPLATES['video_list'],
-                                    camera=camera, date=date, videos=videos)
+                                    camera=camera, date=date, videos=videos, starts=starts,
+                                    activity_enabled=config['activity_analysis'])
 
     @app.route('/<camera>/<date>/<video>')
     @login_required
     def play_video(camera, date, video):
         # Verify path validity
-        path = get_safe_path(base_storage, camera, date, video)
+        path = get_safe_path(camera, date, video)
 
         if not os.path.isfile(path):
             abort(404)
@@ -501,13 +890,266 @@ def create_web_server(config):
             video=video
         )
 
+    @app.route('/<camera>/<date>/play')
+    @login_required
+    def play_day(camera, date):
+        get_safe_path(camera, date)
+        return render_template_string(
+            HTML_TEMPLATES['day_player'],
+            camera=camera,
+            date=date,
+            playlist_url=url_for('day_playlist', camera=camera, date=date)
+        )
+
+    def segment_url(path):
+        return '/video/' + storage.relative(path)
+
+    def playlist_codecs(segments):
+        """MSE codec string of a playlist, from the first segment with an init section"""
+        for segment in segments:
+            try:
+                init = read_init_section(segment)
+            except OSError:
+                continue
+            if init:
+                return codec_string(init)
+        return None
+
+    def playlist_response(segments, complete):
+        response = Response(build_hls_playlist(segments, segment_url, complete),
+                            mimetype='application/vnd.apple.mpegurl')
+        # For the day player's Media Source Extensions fallback
+        codecs = playlist_codecs(segments)
+        if codecs:
+            response.headers['X-Codecs'] = codecs
+        return response
+
+    @app.route('/playlist/<camera>/<date>.m3u8')
+    @login_required
+    def day_playlist(camera, date):
+        get_safe_path(camera, date)
+        # Today's playlist keeps growing as segments close
+        complete = date != datetime.now().strftime('%Y-%m-%d')
+        return playlist_response(segment_index.list_segments(camera, date), complete)
+
+    @app.route('/playlist/<camera>.m3u8')
+    @login_required
+    def range_playlist(camera):
+        get_safe_path(camera)
+        try:
+            start = local_time(datetime.fromisoformat(request.args['start']))
+            end = local_time(datetime.fromisoformat(request.args['end']))
+        except (KeyError, ValueError):
+            abort(400)
+        segments = segment_index.list_segments(camera, start_ts=start.timestamp(), end_ts=end.timestamp())
+        return playlist_response(segments, end < datetime.now())
+
+    @app.route('/live/<camera>')
+    @login_required
+    def live_view(camera):
+        get_safe_path(camera)
+        sink = 'substream' if request.args.get('quality') == 'low' else 'live'
+        return render_template_string(
+            HTML_TEMPLATES['live_player'],
+            camera=camera,
+            stream_url=url_for('live_stream', camera=camera, sink=sink)
+        )
+
+    @app.route('/live/<camera>/<sink>.mp4')
+    @login_required
+    def live_stream(camera, sink):
+        """Endless fMP4 stream from the recorder's live buffer, for Media Source Extensions"""
+        get_safe_path(camera)
+        codecs, chunks = open_live_stream(LIVE_SOCKET_PATH, camera, sink)
+        if chunks is None:
+            abort(404)
+        return Response(chunks, mimetype='video/mp4', direct_passthrough=True,
+                        headers={'X-Codecs': codecs, 'Cache-Control': 'no-store'})
+
+    @app.route('/api/events/<camera>', methods=['POST'])
+    @token_or_login_required
+    def record_event(camera):
+        """Record a clip around now, including the configured pre-roll"""
+        get_safe_path(camera)
+        reason = request.args.get('reason', 'api')
+        path = trigger_event(LIVE_SOCKET_PATH, camera, reason)
+        if path is None:
+            abort(404)
+        return jsonify({'camera': camera, 'reason': reason, 'clip': segment_url(path)}), 202
+
+    @app.route('/poster/<camera>/<date>/<video>')
+    @login_required
+    def serve_poster(camera, date, video):
+        return send_video(poster_path(get_safe_path(camera, date, video)))
+
+    @app.route('/sprite/<camera>/<date>/<video>')
+    @login_required
+    def serve_sprite(camera, date, video):
+        return send_video(sprite_path(get_safe_path(camera, date, video)))
+
+    @app.route('/api/activity/<camera>')
+    @login_required
+    def activity_search(camera):
+        """Periods and segments with activity between start and end (ISO datetimes)"""
+        get_safe_path(camera)
+        try:
+            # Activity is stored per local day, so bounds with and without a UTC offset both work
+            start = local_time(datetime.fromisoformat(request.args['start']))
+            end = local_time(datetime.fromisoformat(request.args['end']))
+            threshold = int(request.args.get('threshold', config['activity_threshold']))
+        except (KeyError, ValueError):
+            abort(400)
+
+        periods = query_activity(base_storage, camera, start, end, threshold)
+        spans = [(datetime.fromisoformat(p['start']).timestamp(), datetime.fromisoformat(p['end']).timestamp())
+                 for p in periods]
+        segments = [
+            {
+                'url': segment_url(s['path']),
+                'start': datetime.fromtimestamp(s['start_ts']).isoformat(),
+                'end': datetime.fromtimestamp(s['end_ts']).isoformat(),
+                'activity': s['activity']
+            }
+            for s in segment_index.list_segments(camera, start_ts=start.timestamp(), end_ts=end.timestamp())
+            if any(s['start_ts'] < span_end and s['end_ts'] > span_start for span_start, span_end in spans)
+        ]
+        return jsonify({'camera': camera, 'threshold': threshold, 'periods': periods, 'segments': segments})
+
+    @app.route('/api/activity/<camera>/<date>/profile')
+    @login_required
+    def activity_profile(camera, date):
+        get_safe_path(camera, date)
+        return jsonify({
+            'camera': camera,
+            'date': date,
+            'threshold': config['activity_threshold'],
+            'profile': day_profile(base_storage, camera, date)
+        })
+
+    def cached_json(build):
+        """JSON response memoised per URL until the segment index changes, answering If-None-Match with 304"""
+        body, etag = api_cache.get(request.full_path, build)
+        response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+
+    def page_limit():
+        limit = int(request.args.get('limit', API_PAGE_SIZE))
+        if limit < 1:
+            raise ValueError(f"Invalid page size: {limit}")
+        return min(limit, API_MAX_PAGE_SIZE)
+
+    def iso_time(ts):
+        return datetime.fromtimestamp(ts).isoformat() if ts is not None else None
+
+    @app.route('/api/cameras')
+    @login_required
+    def api_cameras():
+        """Configured and recorded cameras with the totals of their indexed footage"""
+        def build():
+            summary = {row['camera']: row for row in segment_index.camera_summary()}
+            cameras = []
+            for camera in sorted(set(configured_cameras) | set(summary)):
+                row = summary.get(camera, {})
+                cameras.append({
+                    'name': camera,
+                    'segments': row.get('segments', 0),
+                    'size': row.get('size') or 0,
+                    'duration': row.get('duration') or 0,
+                    'start': iso_time(row.get('start_ts')),
+                    'end': iso_time(row.get('end_ts'))
+                })
+            return {'cameras': cameras}
+        return cached_json(build)
+
+    @app.route('/api/cameras/<camera>/dates')
+    @login_required
+    def api_dates(camera):
+        """Recording days of a camera newest first, paged with ?limit= and ?cursor="""
+        get_safe_path(camera)
+        try:
+            limit = page_limit()
+            before = decode_date_cursor(request.args['cursor']) if 'cursor' in request.args else None
+        except ValueError:
+            abort(400)
+
+        def build():
+            rows = segment_index.date_summary(camera, before=before, limit=limit + 1)
+            dates = [{
+                'date': row['date'],
+                'segments': row['segments'],
+                'size': row['size'],
+                'duration': row['duration'] or 0,
+                'start': iso_time(row['start_ts']),
+                'end': iso_time(row['end_ts'])
+            } for row in rows[:limit]]
+            next_cursor = encode_cursor(dates[-1]['date']) if len(rows) > limit else None
+            return {'camera': camera, 'dates': dates, 'next_cursor': next_cursor}
+        return cached_json(build)
+
+    @app.route('/api/cameras/<camera>/segments')
+    @login_required
+    def api_segments(camera):
+        """Segments of a camera oldest first, filtered by ?date= or ?start=/?end= (ISO datetimes)
+        and paged with ?limit= and ?cursor="""
+        get_safe_path(camera)
+        try:
+            limit = page_limit()
+            start = local_time(datetime.fromisoformat(request.args['start'])).timestamp() if 'start' in request.args else None
+            end = local_time(datetime.fromisoformat(request.args['end'])).timestamp() if 'end' in request.args else None
+            after = decode_segment_cursor(request.args['cursor']) if 'cursor' in request.args else None
+        except ValueError:
+            abort(400)
+        date = request.args.get('date')
+
+        def build():
+            rows = segment_index.list_segments(camera, date, start_ts=start, end_ts=end,
+                                               after=after, limit=limit + 1)
+            segments = [{
+                'name': os.path.basename(row['path']),
+                'url': segment_url(row['path']),
+                'date': row['date'],
+                'start': iso_time(row['start_ts']),
+                'end': iso_time(row['end_ts']),
+                'size': row['size'],
+                'duration': row['duration'],
+                'codec': row['codec']
+            } for row in rows[:limit]]
+            last = rows[limit - 1] if len(rows) > limit else None
+            next_cursor = encode_cursor([last['start_ts'], last['path']]) if last else None
+            return {'camera': camera, 'segments': segments, 'next_cursor': next_cursor}
+        return cached_json(build)
+
+    @app.route('/export/<camera>.mp4')
+    @login_required
+    def export_clip(camera):
+        """Download start..end (ISO datetimes) as one MP4, streamed while ffmpeg cuts it"""
+        get_safe_path(camera)
+        try:
+            start = local_time(datetime.fromisoformat(request.args['start']))
+            end = local_time(datetime.fromisoformat(request.args['end']))
+        except (KeyError, ValueError):
+            abort(400)
+        if end <= start:
+            abort(400)
+
+        segments = exporter.covering_segments(camera, start, end)
+        if not segments:
+            abort(404)
+        chunks = exporter.stream(segments, start, end)
+        if chunks is None:
+            return Response('Too many exports in progress, try again later', status=503,
+                            headers={'Retry-After': '30'})
+        return Response(chunks, mimetype='video/mp4', direct_passthrough=True, headers={
+            'Content-Disposition': f'attachment; filename="{export_filename(camera, start, end)}"',
+            'Cache-Control': 'no-store'
+        })
+
     @app.route('/video/<path:filename>')
     @login_required
     def serve_video(filename):
-        safe_path = get_safe_path(base_storage, filename)
-        directory = os.path.dirname(safe_path)
-        file_name = os.path.basename(safe_path)
-        return send_from_directory(directory, file_name)
+        return send_video(get_safe_path(filename))
 
     @app.route('/favicon.ico')
     def favicon():
@@ -517,11 +1159,32 @@ def create_web_server(config):
             mimetype='image/vnd.microsoft.icon'
         )
 
+    if config['metrics']:
+        @app.route('/metrics')
+        def metrics():
+            body, content_type = render_metrics()
+            return Response(body, content_type=content_type)
+
+    @app.after_request
+    def record_request_metrics(response):
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.labels(route, request.method, response.status_code).observe(
+            time.monotonic() - g.get('request_started', time.monotonic())
+        )
+        if request.endpoint == 'serve_video' and response.content_length:
+            VIDEO_BYTES_SERVED.inc(response.content_length)
+        return response
+
     # Redirect all requests to login if not authenticated
     @app.before_request
     def before_request():
-        # Skip authentication for login page, password reset and static files
-        if request.endpoint in ['login', 'forgot_password', 'reset_password', 'favicon', 'static']:
+        g.request_started = time.monotonic()
+
+        # Skip authentication for login page, password reset, metrics and static files
+        if request.endpoint in ['login', 'forgot_password', 'reset_password', 'favicon', 'static', 'metrics']:
+            return
+        # Event triggers check the session or the event token themselves
+        if request.endpoint == 'record_event':
             return
 
         if 'authenticated' not in session:
@@ -0,0 +1,84 @@
+import os
+import sys
+import signal
+import logging
+import threading
+import subprocess
+from werkzeug.serving import make_server
+
+logger = logging.getLogger(__name__)
+
+class WebServer:
+    """Run the web interface on the configured serving backend.
+
+    'builtin' serves the Flask app from a thread of the NVR process, which is
+    fine for a handful of viewers. 'gunicorn' runs a pre-forked pool of
+    threaded workers in separate processes (see wsgi.py), so UI load no longer
+    shares the GIL with recorder supervision.
+    """
+
+    def __init__(self, config, app_factory, host='0.0.0.0', port=5000):
+        self.backend = config['web_backend']
+        self.workers = config['web_workers']
+        self.threads = config['web_threads']
+        self.max_connections = config['web_max_connections']
+        self.config_path = config['config_path']
+        self.app_factory = app_factory
+        self.host = host
+        self.port = port
+        self.server = None
+        self.process = None
+
+    def start(self):
+        if self.backend == 'gunicorn':
+            self._start_gunicorn()
+        else:
+            self._start_builtin()
+
+    def _start_builtin(self):
+        self.server = make_server(self.host, self.port, self.app_factory(), threaded=True)
+        server_thread = threading.Thread(target=self.server.serve_forever, name='web-server', daemon=True)
+        server_thread.start()
+        logger.info(f"Web server started on port {self.port} (builtin)")
+
+    def _start_gunicorn(self):
+        cmd = [
+            sys.executable, '-m', 'gunicorn',
+            '--bind', f'{self.host}:{self.port}',
+            '--workers', str(self.workers),
+            '--worker-class', 'gthread',
+            '--threads', str(self.threads),
+            # gthread caps simultaneous connections per worker with this setting
+            '--worker-connections', str(self.max_connections),
+            '--graceful-timeout', '10',
+            '--timeout', '120',
+            '--log-level', 'warning',
+            '--config', 'gunicorn_conf.py',
+            'wsgi:app'
+        ]
+        env = {**os.environ, 'ONENVR_CONFIG_PATH': self.config_path}
+        self.process = subprocess.Popen(cmd, cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+        logger.info(f"Web server started on port {self.port} (gunicorn, {self.workers} workers "
+                    f"x {self.threads} threads, PID: {self.process.pid})")
+
+    def is_running(self):
+        if self.process is not None:
+            return self.process.poll() is None
+        return self.server is not None
+
+    def stop(self, timeout=15):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+            logger.info("Web server stopped")
+        if self.process is not None:
+            # SIGTERM lets gunicorn finish in-flight requests within --graceful-timeout
+            self.process.send_signal(signal.SIGTERM)
+            try:
+                self.process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                logger.warning("Web server did not stop in time, killing it")
+                self.process.kill()
+            self.process = None
+            logger.info("Web server stopped")
@@ -0,0 +1,9 @@
+import os
+from config import CONFIG_PATH, load_config, setup_logging
+from segment_index import SegmentIndex
+from web_interface import create_web_server
+
+# Entry point for the gunicorn web backend, started by WebServer
+setup_logging()
+config = load_config(os.environ.get('ONENVR_CONFIG_PATH', CONFIG_PATH))
+app = create_web_server(config, SegmentIndex(config['storage_path'], volumes=config['storage_volumes']))
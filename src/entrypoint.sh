@@ -11,18 +11,10 @@ if [ ! -d "/config" ] || [ ! -d "/storage" ]; then
     exit 1
 fi
 
-# Quick initial network check (3 attempts only)
-echo "Performing initial network check"
-MAX_ATTEMPTS=3
-for attempt in $(seq 1 $MAX_ATTEMPTS); do
-    if ping -c 1 -W 2 "8.8.8.8" >/dev/null 2>&1; then
-        echo "Network connectivity confirmed"
-        exec python /app/main.py
-        exit 0
-    fi
-    echo "Network check attempt $attempt/$MAX_ATTEMPTS failed - retrying..."
-    sleep 2
-done
+# Shared directory for metrics from the recorder and web worker processes
+export PROMETHEUS_MULTIPROC_DIR=/tmp/onenvr-metrics
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
 
-echo "WARNING: Starting OneNVR despite network check failure - Runtime recovery will handle camera reconnection"
+# No network check here: recorders start in parallel and keep retrying unreachable cameras
 exec python /app/main.py
@@ -0,0 +1,28 @@
+"""Builders for minimal synthetic fragmented MP4 files"""
+import struct
+
+SAMPLE_IS_NON_SYNC = 0x10000
+
+def box(box_type, payload=b''):
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+def full_box(box_type, payload=b'', version=0, flags=0):
+    return box(box_type, bytes([version]) + flags.to_bytes(3, 'big') + payload)
+
+def init_section(track_id=1, timescale=90000, handler=b'vide'):
+    """ftyp and moov with a single track"""
+    tkhd = full_box(b'tkhd', struct.pack('>III', 0, 0, track_id) + bytes(68))
+    mdhd = full_box(b'mdhd', struct.pack('>III', 0, 0, timescale) + bytes(8))
+    hdlr = full_box(b'hdlr', bytes(4) + handler + bytes(13))
+    trak = box(b'trak', tkhd + box(b'mdia', mdhd + hdlr))
+    return box(b'ftyp', b'isom' + bytes(4) + b'isom') + box(b'moov', full_box(b'mvhd', bytes(96)) + trak)
+
+def moof(decode_time, track_id=1, keyframe=True, sequence=1):
+    """moof whose track run flags its first sample as a keyframe or not"""
+    tfhd = full_box(b'tfhd', struct.pack('>I', track_id), flags=0x20000)
+    tfdt = full_box(b'tfdt', struct.pack('>Q', decode_time), version=1)
+    trun = full_box(b'trun', struct.pack('>II', 1, 0 if keyframe else SAMPLE_IS_NON_SYNC), flags=0x4)
+    return box(b'moof', full_box(b'mfhd', struct.pack('>I', sequence)) + box(b'traf', tfhd + tfdt + trun))
+
+def fragment(decode_time, track_id=1, keyframe=True, sequence=1, media=bytes(16)):
+    return moof(decode_time, track_id, keyframe, sequence) + box(b'mdat', media)
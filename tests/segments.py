@@ -0,0 +1,11 @@
+"""Helpers for building a storage tree of fake segment files"""
+import os
+
+def write_segment(root, camera, date, time='00-00-00', size=100, name=None):
+    """Create <root>/<camera>/<date>/<date>_<time>.mp4 filled with size bytes and return its path"""
+    directory = os.path.join(str(root), camera, date)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name or f'{date}_{time}.mp4')
+    with open(path, 'wb') as f:
+        f.write(bytes(size))
+    return path
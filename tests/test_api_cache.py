@@ -0,0 +1,52 @@
+from api_cache import IndexCache
+from segment_index import SegmentIndex
+from segments import write_segment
+
+def cache(tmp_path, max_entries=256):
+    index = SegmentIndex(str(tmp_path))
+    return index, IndexCache(index, max_entries)
+
+def test_cached_until_index_changes(tmp_path):
+    index, api_cache = cache(tmp_path)
+    builds = []
+    def build():
+        builds.append(1)
+        return index.list_cameras()
+
+    body, etag = api_cache.get('cameras', build)
+    assert body == '[]'
+    assert api_cache.get('cameras', build) == (body, etag)
+    assert len(builds) == 1
+
+    index.add_segment('front', write_segment(tmp_path, 'front', '2024-01-01'), duration=60)
+    body, new_etag = api_cache.get('cameras', build)
+    assert body == '["front"]'
+    assert new_etag != etag
+    assert len(builds) == 2
+
+def test_updates_and_deletes_invalidate(tmp_path):
+    index, api_cache = cache(tmp_path)
+    path = write_segment(tmp_path, 'front', '2024-01-01')
+    index.add_segment('front', path, duration=60)
+    version = index.version()
+    index.set_activity(path, 10)
+    assert index.version() > version
+    version = index.version()
+    index.remove_segment(path)
+    assert index.version() > version
+
+def test_changes_from_another_connection_invalidate(tmp_path):
+    index, api_cache = cache(tmp_path)
+    api_cache.get('cameras', index.list_cameras)
+    # A second SegmentIndex on the same file stands in for the recorder process
+    writer = SegmentIndex(str(tmp_path))
+    writer.add_segment('back', write_segment(tmp_path, 'back', '2024-01-01'), duration=60)
+    assert api_cache.get('cameras', index.list_cameras)[0] == '["back"]'
+
+def test_least_recently_used_entries_are_dropped(tmp_path):
+    index, api_cache = cache(tmp_path, max_entries=2)
+    api_cache.get('a', lambda: 'a')
+    api_cache.get('b', lambda: 'b')
+    api_cache.get('a', lambda: 'a')
+    api_cache.get('c', lambda: 'c')
+    assert list(api_cache.entries) == ['a', 'c']
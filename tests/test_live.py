@@ -0,0 +1,79 @@
+import struct
+from fmp4 import SAMPLE_IS_NON_SYNC, box, full_box, init_section, fragment, moof
+from live import LiveBuffer, fragment_starts_with_keyframe, codec_string
+
+def buffer(max_bytes=1024 * 1024):
+    return LiveBuffer('front', 'live', max_bytes)
+
+def test_keyframe_from_first_sample_flags():
+    assert fragment_starts_with_keyframe(moof(0, keyframe=True))
+    assert not fragment_starts_with_keyframe(moof(0, keyframe=False))
+
+def test_keyframe_from_default_sample_flags():
+    tfhd = full_box(b'tfhd', struct.pack('>II', 1, SAMPLE_IS_NON_SYNC), flags=0x20)
+    trun = full_box(b'trun', struct.pack('>I', 1))
+    data = box(b'moof', box(b'traf', tfhd + trun))
+    assert not fragment_starts_with_keyframe(data)
+
+def test_fragment_without_track_counts_as_keyframe():
+    assert fragment_starts_with_keyframe(box(b'moof', full_box(b'mfhd', bytes(4))))
+
+def test_codec_string():
+    assert codec_string(b'....avcC\x01\x64\x00\x28') == 'avc1.640028'
+    assert codec_string(b'....avcC\x01\x4d\x40\x1f') == 'avc1.4d401f'
+
+def test_hevc_codec_string():
+    main = b'hvc1....hvcC' + bytes([1, 0x01, 0x60, 0, 0, 0, 0xb0, 0, 0, 0, 0, 0, 93])
+    assert codec_string(main) == 'hvc1.1.6.L93.B0'
+    main10_high_tier = b'hev1....hvcC' + bytes([1, 0x22, 0x20, 0, 0, 0, 0x90, 0, 0, 0, 0, 0, 153])
+    assert codec_string(main10_high_tier) == 'hev1.2.4.H153.90'
+
+def test_boxes_split_across_chunks():
+    init = init_section()
+    data = init + fragment(0, sequence=1) + fragment(1000, keyframe=False, sequence=2)
+    live = buffer()
+    for i in range(0, len(data), 7):
+        live.on_chunk(data[i:i + 7])
+
+    assert live.init == init
+    assert [(sequence, keyframe) for sequence, keyframe, _, _ in live.fragments] == [(1, True), (2, False)]
+    assert live.pending == bytearray()
+
+def test_viewers_start_at_newest_keyframe():
+    live = buffer()
+    live.on_chunk(init_section())
+    for sequence, keyframe in ((1, True), (2, False), (3, True), (4, False)):
+        live.on_chunk(fragment(sequence * 1000, keyframe=keyframe, sequence=sequence))
+
+    generation, init, first = live.open(timeout=0)
+    assert (init, first) == (live.init, 3)
+    fragments, next_sequence = live.read(generation, first, timeout=0)
+    assert len(fragments) == 2
+    assert next_sequence == 5
+    assert live.read(generation, next_sequence, timeout=0) == ([], 5)
+
+def test_open_waits_for_a_keyframe():
+    live = buffer()
+    live.on_chunk(init_section() + fragment(0, keyframe=False))
+    assert live.open(timeout=0) is None
+
+def test_reset_ends_readers():
+    live = buffer()
+    live.on_chunk(init_section() + fragment(0))
+    generation, _, first = live.open(timeout=0)
+    live.on_chunk(None)
+    assert live.init is None
+    assert live.read(generation, first, timeout=0) == (None, first)
+
+def test_ring_drops_oldest_fragments():
+    size = len(fragment(0))
+    live = buffer(max_bytes=2 * size)
+    live.on_chunk(init_section())
+    for sequence in range(1, 6):
+        live.on_chunk(fragment(sequence, sequence=sequence))
+
+    assert [sequence for sequence, _, _, _ in live.fragments] == [4, 5]
+    assert live.buffered_bytes == 2 * size
+    # A reader that fell behind skips ahead to the newest keyframe
+    fragments, next_sequence = live.read(live.generation, 1, timeout=0)
+    assert (len(fragments), next_sequence) == (1, 6)
@@ -0,0 +1,97 @@
+import io
+import struct
+from fmp4 import box, full_box, init_section, fragment
+from playlist import iter_boxes, find_box, read_full_box, scan_fragments, segment_parts, read_init_section
+
+def boxes(data):
+    return list(iter_boxes(io.BytesIO(data), 0, len(data)))
+
+def test_iter_boxes_lists_top_level_boxes():
+    data = box(b'ftyp', b'isom') + box(b'free') + box(b'mdat', bytes(10))
+    assert boxes(data) == [('ftyp', 0, 8, 12), ('free', 12, 8, 8), ('mdat', 20, 8, 18)]
+
+def test_iter_boxes_reads_64_bit_sizes():
+    data = struct.pack('>I4sQ', 1, b'mdat', 20) + bytes(4) + box(b'free')
+    assert boxes(data) == [('mdat', 0, 16, 20), ('free', 20, 8, 8)]
+
+def test_iter_boxes_size_zero_extends_to_end():
+    data = box(b'ftyp') + struct.pack('>I4s', 0, b'mdat') + bytes(100)
+    assert boxes(data)[-1] == ('mdat', 8, 8, 108)
+
+def test_iter_boxes_stops_at_invalid_size():
+    data = box(b'ftyp') + struct.pack('>I4s', 4, b'junk') + box(b'free')
+    assert boxes(data) == [('ftyp', 0, 8, 8)]
+
+def test_iter_boxes_stops_at_truncated_header():
+    data = box(b'ftyp') + b'\x00\x00\x00'
+    assert boxes(data) == [('ftyp', 0, 8, 8)]
+
+def test_find_box_returns_payload_range():
+    data = box(b'moov', box(b'mvhd', bytes(4)) + box(b'trak', bytes(2)))
+    f = io.BytesIO(data)
+    moov = find_box(f, 0, len(data), 'moov')
+    assert moov == (8, len(data))
+    assert find_box(f, *moov, 'trak') == (28, 30)
+    assert find_box(f, *moov, 'mdia') is None
+
+def test_read_full_box_splits_version_and_payload():
+    data = full_box(b'tfdt', struct.pack('>Q', 42), version=1, flags=0x123)
+    f = io.BytesIO(data)
+    version, payload = read_full_box(f, find_box(f, 0, len(data), 'tfdt'))
+    assert version == 1
+    assert struct.unpack('>Q', payload)[0] == 42
+
+def write(tmp_path, data):
+    path = tmp_path / 'segment.mp4'
+    path.write_bytes(data)
+    return str(path)
+
+def test_scan_fragments_locates_init_and_fragments(tmp_path):
+    init = init_section(track_id=1, timescale=1000)
+    fragments = [fragment(t, sequence=i + 1) for i, t in enumerate((0, 2000, 4000))]
+    data = init + b''.join(fragments)
+
+    init_size, scanned, timescale = scan_fragments(write(tmp_path, data), len(data))
+
+    assert init_size == len(init)
+    assert timescale == 1000
+    offsets = [len(init) + sum(len(f) for f in fragments[:i]) for i in range(3)]
+    assert scanned == [(offset, len(fragments[0]), t) for offset, t in zip(offsets, (0, 2000, 4000))]
+
+def test_scan_fragments_ignores_other_tracks(tmp_path):
+    data = init_section(track_id=2) + fragment(500, track_id=1)
+    assert scan_fragments(write(tmp_path, data), len(data))[1][0][2] is None
+
+def test_scan_fragments_rejects_unfragmented_files(tmp_path):
+    data = init_section() + box(b'mdat', bytes(32))
+    assert scan_fragments(write(tmp_path, data), len(data)) is None
+
+def test_scan_fragments_needs_a_video_track(tmp_path):
+    data = init_section(handler=b'soun') + fragment(0)
+    assert scan_fragments(write(tmp_path, data), len(data)) is None
+
+def test_segment_parts_groups_fragments(tmp_path):
+    # Nine two-second fragments make three six-second parts
+    init = init_section(timescale=90000)
+    fragments = [fragment(i * 2 * 90000, sequence=i + 1) for i in range(9)]
+    data = init + b''.join(fragments)
+    segment = {'path': write(tmp_path, data), 'size': len(data), 'duration': 18.0,
+               'start_ts': 1000.0, 'end_ts': 1018.0}
+
+    init_size, parts = segment_parts(segment)
+
+    assert init_size == len(init)
+    length = 3 * len(fragments[0])
+    assert parts == [(len(init), length, 6.0), (len(init) + length, length, 6.0),
+                     (len(init) + 2 * length, length, 6.0)]
+
+def test_segment_parts_of_unparsable_file(tmp_path):
+    data = b'not an mp4 file'
+    segment = {'path': write(tmp_path, data), 'size': len(data), 'duration': 10.0,
+               'start_ts': 0.0, 'end_ts': 10.0}
+    assert segment_parts(segment) == (None, [])
+
+def test_read_init_section(tmp_path):
+    init = init_section()
+    data = init + fragment(0)
+    assert read_init_section({'path': write(tmp_path, data), 'size': len(data)}) == init
@@ -0,0 +1,42 @@
+import os
+from recorder import StreamRecorder, parse_progress
+from schema import config_schema
+from segment_index import SegmentIndex
+from segments import write_segment
+
+def test_parse_progress_converts_values():
+    stats = parse_progress({
+        'frame': '250', 'fps': '25.00', 'bitrate': '2048.5kbits/s', 'total_size': '1048576',
+        'out_time_us': '10000000', 'dup_frames': '0', 'drop_frames': '3', 'speed': '1.01x',
+        'progress': 'continue'
+    })
+    assert stats == {
+        'frame': 250.0, 'fps': 25.0, 'bitrate_kbps': 2048.5, 'total_size': 1048576.0,
+        'out_time_seconds': 10.0, 'dup_frames': 0.0, 'drop_frames': 3.0, 'speed': 1.01
+    }
+
+def test_parse_progress_tolerates_missing_and_unknown_values():
+    stats = parse_progress({'bitrate': 'N/A', 'speed': 'N/A', 'out_time_us': 'N/A', 'frame': '12'})
+    assert stats['frame'] == 12.0
+    assert stats['bitrate_kbps'] is None
+    assert stats['speed'] is None
+    assert stats['fps'] is None
+    assert stats['out_time_seconds'] == 0
+
+def test_segment_list_entries_close_segments(tmp_path):
+    index = SegmentIndex(str(tmp_path))
+    camera = config_schema({'cameras': [{'name': 'front', 'rtsp_url': 'rtsp://camera/stream'}]})['cameras'][0]
+    recorder = StreamRecorder(camera, str(tmp_path), index)
+    recorder.video_codec = 'h264'
+    closed = []
+    recorder.segment_listeners.append(closed.append)
+    path = write_segment(tmp_path, 'front', '2024-01-01', '10-00-00', size=64)
+
+    read_fd, write_fd = os.pipe()
+    with os.fdopen(write_fd, 'w') as segment_list:
+        segment_list.write('2024-01-01_10-00-00.mp4,0.000000,299.500000\n')
+        segment_list.write('garbage\n')
+    recorder._read_segment_list(read_fd, str(tmp_path))
+
+    assert [(event['path'], event['size'], event['duration']) for event in closed] == [(path, 64, 299.5)]
+    assert index.get_segment(path)['duration'] == 299.5
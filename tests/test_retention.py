@@ -0,0 +1,46 @@
+import os
+import threading
+from datetime import datetime
+from retention import RetentionEngine, UnlinkThrottle
+from segment_index import SegmentIndex
+from segments import write_segment
+
+def test_sweep_removes_expired_days(tmp_path):
+    index = SegmentIndex(str(tmp_path))
+    expired = write_segment(tmp_path, 'front', '2024-01-01', size=10)
+    index.add_segment('front', expired)
+    write_segment(tmp_path, 'front', '2024-01-01/events', name='2024-01-01_10-00-00.mp4', size=5)
+    kept = write_segment(tmp_path, 'front', '2024-01-05')
+    index.add_segment('front', kept)
+    write_segment(tmp_path, 'back', '2023-12-31', size=20)
+    os.makedirs(tmp_path / 'front' / 'exports')
+    os.makedirs(tmp_path / '.hidden' / '2020-01-01')
+
+    report = RetentionEngine([str(tmp_path)], index, unlink_rate_mb=0).sweep(datetime(2024, 1, 3))
+
+    assert (report['cameras'], report['files'], report['bytes']) == (2, 3, 35)
+    assert not os.path.exists(tmp_path / 'front' / '2024-01-01')
+    assert not os.path.exists(tmp_path / 'back' / '2023-12-31')
+    assert os.path.exists(kept) and os.path.isdir(tmp_path / 'front' / 'exports')
+    assert os.path.isdir(tmp_path / '.hidden' / '2020-01-01')
+    assert [s['path'] for s in index.list_segments('front')] == [kept]
+
+def test_sweep_stops_when_asked(tmp_path):
+    index = SegmentIndex(str(tmp_path))
+    path = write_segment(tmp_path, 'front', '2024-01-01')
+    stop_event = threading.Event()
+    stop_event.set()
+    RetentionEngine([str(tmp_path)], index, stop_event=stop_event).sweep(datetime(2024, 1, 3))
+    assert os.path.exists(path)
+
+def test_throttle_spaces_unlinks_by_size():
+    throttle = UnlinkThrottle(1000, threading.Event())
+    throttle.wait(0)
+    first = throttle.next_free
+    throttle.wait(20)
+    throttle.wait(30)
+    assert throttle.next_free - first >= 0.05
+
+def test_throttle_disabled_without_rate():
+    throttle = UnlinkThrottle(0, threading.Event())
+    throttle.wait(10 ** 12)
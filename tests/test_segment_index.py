@@ -0,0 +1,99 @@
+import os
+import sqlite3
+from datetime import datetime
+from segment_index import SegmentIndex, get_index_path
+from segments import write_segment
+
+def ts(value):
+    return datetime.fromisoformat(value).timestamp()
+
+def test_add_segment_reads_times_from_the_name(tmp_path):
+    index = SegmentIndex(str(tmp_path))
+    path = write_segment(tmp_path, 'front', '2024-01-01', '10-00-00', size=123)
+    row = index.add_segment('front', path, duration=300, codec='h264')
+
+    assert row['date'] == '2024-01-01'
+    assert row['start_ts'] == ts('2024-01-01T10:00:00')
+    assert row['end_ts'] == ts('2024-01-01T10:05:00')
+    assert index.get_segment(path)['size'] == 123
+
+def test_add_segment_skips_other_files(tmp_path):
+    index = SegmentIndex(str(tmp_path))
+    assert index.add_segment('front', write_segment(tmp_path, 'front', '2024-01-01', name='notes.mp4')) is None
+    assert index.add_segment('front', str(tmp_path / 'front' / '2024-01-01' / '2024-01-01_01-00-00.mp4')) is None
+    assert index.list_cameras() == []
+
+def test_refresh_keeps_analysis_and_duration(tmp_path):
+    index = SegmentIndex(str(tmp_path))
+    path = write_segment(tmp_path, 'front', '2024-01-01')
+    index.add_segment('front', path, duration=300, codec='h264')
+    index.set_activity(path, 42)
+    index.set_proxy(path)
+
+    index.add_segment('front', path, size=50)
+
+    row = index.get_segment(path)
+    assert (row['activity'], row['proxy'], row['size']) == (42, 1, 50)
+    assert (row['duration'], row['codec']) == (300, 'h264')
+    assert row['end_ts'] == row['start_ts'] + 300
+
+def test_sync_directory_adds_and_drops_files(tmp_path):
+    index = SegmentIndex(str(tmp_path))
+    first = write_segment(tmp_path, 'front', '2024-01-01', '00-00-00')
+    second = write_segment(tmp_path, 'front', '2024-01-01', '00-05-00')
+    date_dir = os.path.dirname(first)
+    assert index.sync_directory('front', date_dir) == 2
+    # Unchanged files are not touched again
+    assert index.sync_directory('front', date_dir) == 0
+
+    os.remove(second)
+    index.sync_directory('front', date_dir)
+    assert [s['path'] for s in index.list_segments('front')] == [first]
+
+def test_rebuild_reconciles_the_tree(tmp_path):
+    index = SegmentIndex(str(tmp_path))
+    kept = write_segment(tmp_path, 'front', '2024-01-02')
+    index.add_segment('back', write_segment(tmp_path, 'back', '2024-01-01'))
+    os.remove(index.list_segments('back')[0]['path'])
+    os.rmdir(tmp_path / 'back' / '2024-01-01')
+
+    index.rebuild()
+
+    assert index.list_cameras() == ['front']
+    assert [s['path'] for s in index.list_segments('front')] == [kept]
+
+def test_list_segments_pages_with_after(tmp_path):
+    index = SegmentIndex(str(tmp_path))
+    for time in ('00-00-00', '00-05-00', '00-10-00'):
+        index.add_segment('front', write_segment(tmp_path, 'front', '2024-01-01', time), duration=300)
+
+    first_page = index.list_segments('front', limit=2)
+    last = first_page[-1]
+    second_page = index.list_segments('front', after=(last['start_ts'], last['path']), limit=2)
+
+    assert [s['path'][-12:] for s in first_page + second_page] == ['00-00-00.mp4', '00-05-00.mp4', '00-10-00.mp4']
+    window = index.list_segments('front', start_ts=ts('2024-01-01T00:06:00'), end_ts=ts('2024-01-01T00:08:00'))
+    assert [s['path'][-12:] for s in window] == ['00-05-00.mp4']
+
+def test_oldest_segments_per_volume(tmp_path):
+    volumes = [str(tmp_path / 'a'), str(tmp_path / 'b')]
+    index = SegmentIndex(volumes[0], volumes=volumes)
+    index.add_segment('front', write_segment(volumes[0], 'front', '2024-01-01'))
+    on_b = write_segment(volumes[1], 'front', '2024-01-02')
+    index.add_segment('front', on_b)
+    assert [s['path'] for s in index.oldest_segments('front', 10, volumes[1])] == [on_b]
+    assert len(index.oldest_segments('front', 10)) == 2
+
+def test_old_index_files_are_migrated(tmp_path):
+    conn = sqlite3.connect(get_index_path(str(tmp_path)))
+    conn.execute('''CREATE TABLE segments (path TEXT PRIMARY KEY, camera TEXT NOT NULL, date TEXT NOT NULL,
+                    start_ts REAL NOT NULL, end_ts REAL NOT NULL, size INTEGER NOT NULL, duration REAL,
+                    codec TEXT, mtime REAL NOT NULL)''')
+    conn.commit()
+    conn.close()
+
+    index = SegmentIndex(str(tmp_path))
+    path = write_segment(tmp_path, 'front', '2024-01-01')
+    index.add_segment('front', path)
+    index.set_activity(path, 5)
+    assert index.get_segment(path)['activity'] == 5
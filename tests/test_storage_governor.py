@@ -0,0 +1,85 @@
+import os
+import time
+import pytest
+from config import load_config
+from schema import config_schema
+from segment_index import SegmentIndex
+from segments import write_segment
+from storage_governor import StorageGovernor
+
+def governor(tmp_path, cameras, usage, freed_per_segment=1):
+    """Governor whose volume usage drops from usage percent by freed_per_segment points per evicted segment"""
+    config = config_schema({'cameras': [{'name': name, 'rtsp_url': 'rtsp://camera/stream', **options}
+                                        for name, options in cameras.items()],
+                            'storage_path': str(tmp_path)})
+    config['storage_volumes'] = [str(tmp_path)]
+    index = SegmentIndex(str(tmp_path))
+    storage_governor = StorageGovernor(config, index, batch_size=2)
+    evicted = []
+    storage_governor.usage_percent = lambda volume: usage - freed_per_segment * len(evicted)
+    original = storage_governor._evict
+    def evict(segments):
+        removed = original(segments)
+        evicted.extend(segments[:removed])
+        return removed
+    storage_governor._evict = evict
+    return storage_governor, index, evicted
+
+def add(index, tmp_path, camera, date, time='00-00-00', size=100):
+    path = write_segment(tmp_path, camera, date, time, size=size)
+    index.add_segment(camera, path, duration=300)
+    return path
+
+@pytest.fixture(autouse=True)
+def no_pause(monkeypatch):
+    monkeypatch.setattr(time, 'sleep', lambda seconds: None)
+
+def test_below_high_watermark_nothing_is_evicted(tmp_path):
+    storage_governor, index, evicted = governor(tmp_path, {'front': {}}, 89)
+    add(index, tmp_path, 'front', '2024-01-01')
+    storage_governor.enforce()
+    assert evicted == []
+
+def test_evicts_oldest_down_to_low_watermark(tmp_path):
+    storage_governor, index, evicted = governor(tmp_path, {'front': {}}, 91)
+    paths = [add(index, tmp_path, 'front', f'2024-01-0{day}') for day in range(1, 9)]
+
+    storage_governor.enforce()
+
+    # One point freed per segment, eviction stops at the 85% low watermark
+    assert [s['path'] for s in evicted] == paths[:6]
+    assert not any(os.path.exists(s['path']) for s in evicted)
+    # Emptied past date directories are removed as well
+    assert not os.path.isdir(tmp_path / 'front' / '2024-01-01')
+
+def test_weights_keep_footage_of_important_cameras_longer(tmp_path):
+    storage_governor, index, evicted = governor(tmp_path, {'door': {'storage_weight': 10}, 'yard': {}}, 90,
+                                                freed_per_segment=5)
+    door = add(index, tmp_path, 'door', '2024-01-01')
+    yard = add(index, tmp_path, 'yard', '2024-01-03')
+    storage_governor.batch_size = 1
+    storage_governor.enforce()
+    assert [s['path'] for s in evicted] == [yard]
+    assert os.path.exists(door)
+
+def test_quota_evicts_only_the_excess(tmp_path):
+    storage_governor, index, evicted = governor(tmp_path, {'front': {}}, 10)
+    storage_governor.quotas = {'front': 250}
+    paths = [add(index, tmp_path, 'front', f'2024-01-0{day}', size=100) for day in range(1, 5)]
+    storage_governor.enforce()
+    assert [s['path'] for s in evicted] == paths[:2]
+
+def test_gives_up_when_nothing_can_be_evicted(tmp_path, monkeypatch):
+    storage_governor, index, evicted = governor(tmp_path, {'front': {}}, 95)
+    add(index, tmp_path, 'front', '2024-01-01')
+    monkeypatch.setattr(os, 'remove', lambda path: (_ for _ in ()).throw(PermissionError(path)))
+    storage_governor.enforce()
+    assert evicted == []
+
+def test_low_watermark_must_be_below_high(tmp_path):
+    (tmp_path / 'config.yaml').write_text(
+        'cameras: [{name: front, rtsp_url: "rtsp://camera/stream"}]\n'
+        'storage_high_watermark: 80\nstorage_low_watermark: 80\n'
+    )
+    with pytest.raises(ValueError):
+        load_config(str(tmp_path))
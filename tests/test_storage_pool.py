@@ -0,0 +1,60 @@
+import os
+from datetime import datetime
+from retention import RetentionEngine
+from schema import config_schema
+from segment_index import SegmentIndex
+from segments import write_segment
+from storage_governor import StorageGovernor
+from storage_pool import StoragePool
+
+def test_resolve_finds_the_volume_holding_a_file(tmp_path):
+    volumes = [str(tmp_path / 'a'), str(tmp_path / 'b')]
+    pool = StoragePool(volumes)
+    path = write_segment(volumes[1], 'front', '2024-01-01')
+    relative = os.path.join('front', '2024-01-01', os.path.basename(path))
+
+    assert pool.resolve(relative) == path
+    assert pool.relative(path) == relative
+    assert pool.resolve('front/2024-01-02/missing.mp4') == os.path.join(volumes[0], 'front/2024-01-02/missing.mp4')
+    assert pool.resolve('../outside.mp4') is None
+
+def test_missing_volumes_are_not_created(tmp_path):
+    missing = str(tmp_path / 'unmounted')
+    pool = StoragePool([missing, str(tmp_path / 'other')])
+    pool.measure()
+    assert not os.path.exists(missing)
+    assert pool.throughput[missing] == 0
+
+def test_sweep_continues_past_a_missing_volume(tmp_path):
+    volumes = [str(tmp_path / 'unmounted'), str(tmp_path / 'mounted')]
+    index = SegmentIndex(volumes[1], volumes=volumes)
+    expired = write_segment(volumes[1], 'front', '2024-01-01')
+    report = RetentionEngine(volumes, index).sweep(datetime(2024, 1, 3))
+    assert report['files'] == 1
+    assert not os.path.exists(expired)
+
+def test_governor_continues_past_a_missing_volume(tmp_path):
+    volumes = [str(tmp_path / 'unmounted'), str(tmp_path / 'mounted')]
+    os.makedirs(volumes[1])
+    config = config_schema({'cameras': [{'name': 'front', 'rtsp_url': 'rtsp://camera/stream'}], 'storage_path': volumes})
+    config['storage_volumes'] = volumes
+    storage_governor = StorageGovernor(config, SegmentIndex(volumes[1], volumes=volumes))
+    checked = []
+    usage_percent = storage_governor.usage_percent
+    storage_governor.usage_percent = lambda volume: checked.append(volume) or usage_percent(volume)
+
+    storage_governor.enforce()
+
+    assert checked[0] == volumes[0]
+    assert volumes[1] in checked
+
+def test_rebuild_keeps_rows_of_a_missing_volume(tmp_path):
+    volumes = [str(tmp_path / 'a'), str(tmp_path / 'b')]
+    index = SegmentIndex(volumes[0], volumes=volumes)
+    on_b = write_segment(volumes[1], 'front', '2024-01-01')
+    index.rebuild()
+    os.rename(volumes[1], str(tmp_path / 'b-unmounted'))
+
+    index.rebuild()
+
+    assert [s['path'] for s in index.list_segments('front')] == [on_b]
@@ -0,0 +1,61 @@
+import pytest
+from flask import Flask
+from streaming import send_video
+
+DATA = bytes(range(256)) * 4
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / 'clip.mp4'
+    path.write_bytes(DATA)
+    app = Flask(__name__)
+    app.add_url_rule('/video', 'video', lambda: send_video(str(path)))
+    app.add_url_rule('/missing', 'missing', lambda: send_video(str(tmp_path / 'missing.mp4')))
+    return app.test_client()
+
+def test_whole_file(client):
+    response = client.get('/video')
+    assert response.status_code == 200
+    assert response.data == DATA
+    assert response.headers['Content-Length'] == str(len(DATA))
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.mimetype == 'video/mp4'
+
+def test_single_range(client):
+    response = client.get('/video', headers={'Range': 'bytes=10-19'})
+    assert response.status_code == 206
+    assert response.data == DATA[10:20]
+    assert response.headers['Content-Range'] == f'bytes 10-19/{len(DATA)}'
+    assert response.headers['Content-Length'] == '10'
+
+def test_suffix_range(client):
+    response = client.get('/video', headers={'Range': 'bytes=-4'})
+    assert response.status_code == 206
+    assert response.data == DATA[-4:]
+
+def test_unsatisfiable_range(client):
+    response = client.get('/video', headers={'Range': f'bytes={len(DATA)}-'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(DATA)}'
+
+def test_multiple_ranges_get_the_whole_file(client):
+    response = client.get('/video', headers={'Range': 'bytes=0-1,5-6'})
+    assert response.status_code == 200
+    assert response.data == DATA
+
+def test_not_modified(client):
+    headers = client.get('/video').headers
+    assert client.get('/video', headers={'If-None-Match': headers['ETag']}).status_code == 304
+    assert client.get('/video', headers={'If-Modified-Since': headers['Last-Modified']}).status_code == 304
+    assert client.get('/video', headers={'If-None-Match': '"other"'}).status_code == 200
+
+def test_if_range(client):
+    etag = client.get('/video').headers['ETag']
+    current = client.get('/video', headers={'Range': 'bytes=0-9', 'If-Range': etag})
+    assert current.status_code == 206
+    stale = client.get('/video', headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+    assert stale.status_code == 200
+    assert stale.data == DATA
+
+def test_missing_file(client):
+    assert client.get('/missing').status_code == 404
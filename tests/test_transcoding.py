@@ -0,0 +1,37 @@
+import pytest
+from transcoding import plan_transcodes
+
+def camera(name, profile=None, codec='copy', substream_width=None):
+    return {'name': name, 'codec': codec, 'profile': profile, 'substream_width': substream_width}
+
+def threads(plan):
+    return {name: (profile['codec'] if profile else None, count) for name, (profile, count) in plan.items()}
+
+def test_copy_cameras_need_no_threads():
+    assert plan_transcodes([camera('front')], {}, 4) == {'front': (None, 0)}
+
+def test_requested_threads_within_budget():
+    plan = plan_transcodes([camera('front', 'h264-720p'), camera('back', 'h264-720p')], {}, 8)
+    assert threads(plan) == {'front': ('libx264', 2), 'back': ('libx264', 2)}
+
+def test_threads_scaled_down_to_budget():
+    plan = plan_transcodes([camera('front', 'h264-1080p'), camera('back', 'h264-1080p')], {}, 4)
+    assert threads(plan) == {'front': ('libx264', 2), 'back': ('libx264', 2)}
+
+def test_cameras_beyond_budget_fall_back_to_copy():
+    plan = plan_transcodes([camera('front', 'h264-1080p'), camera('back', 'h264-720p')], {}, 1)
+    assert threads(plan) == {'front': ('libx264', 1), 'back': (None, 0)}
+
+def test_substreams_take_a_core_each():
+    cameras = [camera('front', 'h264-720p', substream_width=640), camera('back', 'h264-720p')]
+    plan = plan_transcodes(cameras, {}, 2)
+    assert threads(plan) == {'front': ('libx264', 1), 'back': (None, 0)}
+
+def test_configured_profiles_and_bare_codecs():
+    profiles = {'tiny': {'codec': 'libx265', 'threads': 1}}
+    plan = plan_transcodes([camera('front', 'tiny'), camera('back', codec='libx264')], profiles, 8)
+    assert threads(plan) == {'front': ('libx265', 1), 'back': ('libx264', 2)}
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError):
+        plan_transcodes([camera('front', 'missing')], {}, 4)
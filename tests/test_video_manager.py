@@ -0,0 +1,80 @@
+import os
+from datetime import datetime, timedelta
+from schema import config_schema
+from segment_index import SegmentIndex
+from segments import write_segment
+from transcoding import readrate_args
+from video_manager import VideoManager
+
+def manager(tmp_path):
+    config = config_schema({'cameras': [{'name': 'front', 'rtsp_url': 'rtsp://camera/stream', 'interval': 300}],
+                            'storage_path': str(tmp_path)})
+    config['storage_volumes'] = [str(tmp_path)]
+    index = SegmentIndex(str(tmp_path))
+    return VideoManager(config, index), index
+
+def test_resume_finishes_an_interrupted_rollup(tmp_path):
+    videos, index = manager(tmp_path)
+    sources = []
+    for time in ('10-00-00', '10-05-00'):
+        path = write_segment(tmp_path, 'front', '2024-01-01', time)
+        index.add_segment('front', path, duration=300)
+        index.set_activity(path, 30 if time == '10-05-00' else 5)
+        sources.append(path)
+    output = os.path.join(os.path.dirname(sources[0]), 'front_2024-01-01_10-00-00.mp4')
+    index.begin_rollup(output, 'front', sources)
+    # ffmpeg had finished, the process died before the rename
+    with open(f'{output}.part', 'wb') as f:
+        f.write(bytes(200))
+
+    videos.resume_concatenation()
+
+    assert os.path.exists(output) and not os.path.exists(f'{output}.part')
+    assert not any(os.path.exists(path) for path in sources)
+    assert index.pending_rollups() == []
+    assert [s['path'] for s in index.list_segments('front')] == [output]
+    rollup = index.get_segment(output)
+    assert (rollup['duration'], rollup['activity']) == (600, 30)
+    start = datetime(2024, 1, 1, 10).timestamp()
+    assert (rollup['start_ts'], rollup['end_ts']) == (start, start + 600)
+
+def test_resume_drops_rollups_that_never_finished(tmp_path):
+    videos, index = manager(tmp_path)
+    source = write_segment(tmp_path, 'front', '2024-01-01', '10-00-00')
+    index.add_segment('front', source, duration=300)
+    index.begin_rollup(os.path.join(os.path.dirname(source), 'front_2024-01-01_10-00-00.mp4'), 'front', [source])
+
+    videos.resume_concatenation()
+
+    assert index.pending_rollups() == []
+    assert os.path.exists(source)
+    assert index.get_segment(source) is not None
+
+def test_only_finished_hours_are_rolled_up(tmp_path, monkeypatch):
+    videos, index = manager(tmp_path)
+    now = datetime.now()
+    old = (now - timedelta(hours=3)).replace(minute=0, second=0, microsecond=0)
+    for start in (old, old + timedelta(minutes=5), old + timedelta(hours=1), now.replace(second=0, microsecond=0)):
+        index.add_segment('front', write_segment(tmp_path, 'front', start.strftime('%Y-%m-%d'),
+                                                 start.strftime('%H-%M-%S')), duration=300)
+    rollup = write_segment(tmp_path, 'front', old.strftime('%Y-%m-%d'),
+                           name=f"front_{old.strftime('%Y-%m-%d_%H')}-00-00.mp4")
+    index.add_segment('front', rollup, duration=3600)
+    calls = []
+    monkeypatch.setattr(videos, '_concatenate',
+                        lambda camera, segments, output: calls.append((output, len(segments))) or True)
+
+    videos.rollup_completed_hours('front')
+
+    assert [(os.path.basename(output), count) for output, count in calls] == [
+        (f"front_{old.strftime('%Y-%m-%d_%H')}-00-00.mp4", 2),
+        (f"front_{(old + timedelta(hours=1)).strftime('%Y-%m-%d_%H')}-00-00.mp4", 1),
+    ]
+
+def test_readrate_follows_the_bandwidth_cap():
+    hour = [{'size': 3600 * 1000, 'duration': 3600, 'start_ts': 0, 'end_ts': 3600}]
+    assert readrate_args(hour, 0) == []
+    assert readrate_args(hour, 5000) == ['-readrate', '5.00']
+    # Caps below the recording bitrate still throttle, slower than real time
+    assert readrate_args(hour, 500) == ['-readrate', '0.50']
+    assert readrate_args(hour, 1) == ['-readrate', '0.01']
@@ -0,0 +1,72 @@
+import os
+import pytest
+import web_interface
+from segment_index import SegmentIndex
+from web_interface import encode_cursor, decode_cursor, decode_date_cursor, decode_segment_cursor
+
+def test_cursor_round_trip():
+    value = [1700000000.5, '/storage/front/2024-01-01/front-00-00-00.mp4']
+    cursor = encode_cursor(value)
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == value
+
+@pytest.mark.parametrize('cursor', ['', '!!!', 'bm90IGpzb24'])
+def test_decode_cursor_rejects_garbage(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+def test_date_cursor():
+    assert decode_date_cursor(encode_cursor('2024-01-01')) == '2024-01-01'
+
+@pytest.mark.parametrize('value', [None, 20240101, ['2024-01-01']])
+def test_date_cursor_must_be_a_string(value):
+    with pytest.raises(ValueError):
+        decode_date_cursor(encode_cursor(value))
+
+def test_segment_cursor():
+    assert decode_segment_cursor(encode_cursor([1700000000, 'a.mp4'])) == (1700000000, 'a.mp4')
+
+@pytest.mark.parametrize('value', [
+    'a.mp4', [1700000000], [1700000000, 'a.mp4', 1], ['1700000000', 'a.mp4'], [True, 'a.mp4'], [1700000000, None]
+])
+def test_segment_cursor_shape(value):
+    with pytest.raises(ValueError):
+        decode_segment_cursor(encode_cursor(value))
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    storage = tmp_path / 'storage'
+    os.makedirs(storage / 'front')
+    config = {'activity_analysis': False, 'activity_threshold': 20, 'cameras': [{'name': 'front'}],
+              'config_path': str(tmp_path / 'config'), 'export_max_concurrent': 2, 'metrics': False,
+              'storage_path': str(storage), 'storage_volumes': [str(storage)]}
+    monkeypatch.setattr(web_interface, 'trigger_event', lambda socket_path, camera, reason: f'{storage}/{camera}/clip.mp4')
+    app = web_interface.create_web_server(config, SegmentIndex(str(storage)))
+    client = app.test_client()
+    client.event_token = (tmp_path / 'config' / 'event_token.key').read_text()
+    return client
+
+def test_event_trigger_needs_session_or_token(client):
+    assert client.post('/api/events/front').status_code == 401
+    assert client.post('/api/events/front?token=wrong').status_code == 401
+    assert client.post(f'/api/events/front?token={client.event_token}').status_code == 202
+    response = client.post('/api/events/front?reason=doorbell', headers={'Authorization': f'Bearer {client.event_token}'})
+    assert response.status_code == 202
+    assert response.get_json()['reason'] == 'doorbell'
+    # The token only opens the event endpoint
+    assert client.get(f'/api/cameras?token={client.event_token}').status_code == 302
+
+def test_time_range_playlist_accepts_utc_offsets(client):
+    with client.session_transaction() as session:
+        session['authenticated'] = True
+    response = client.get('/playlist/front.m3u8?start=2024-01-01T00:00:00Z&end=2024-01-01T04:00:00%2B02:00')
+    assert response.status_code == 200
+    assert '#EXT-X-ENDLIST' in response.get_data(as_text=True)
+    assert client.get('/playlist/front.m3u8?start=2024-01-01T00:00Z&end=2024-01-01T04:00').status_code == 200
+
+def test_activity_search_accepts_mixed_offsets(client):
+    with client.session_transaction() as session:
+        session['authenticated'] = True
+    response = client.get('/api/activity/front?start=2024-01-01T00:00:00Z&end=2024-01-01T04:00:00')
+    assert response.status_code == 200
+    assert response.get_json()['periods'] == []